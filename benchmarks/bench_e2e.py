@@ -0,0 +1,133 @@
+"""
+Runs the whole crawl offline against local stand-ins for the websites and the OpenAI API
+(see standins.py), at several concurrency levels.
+
+    python benchmarks/bench_e2e.py --concurrency 1 4 16 --save before.json
+    python benchmarks/bench_e2e.py --concurrency 1 4 16 --baseline before.json
+
+Pages come from the given html files or directories (default: the HTTP cache), topped up
+with synthetic portfolio pages to --pages. Each level runs in a fresh process, so its peak
+memory is measured on its own; the servers stay in this process. Latencies are end-to-end
+per url, from entering the pipeline to its row being saved.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from bench_parsers import load_corpus, max_rss_mb
+from http_cache import DEFAULT_CACHE_DIR
+from standins import CorpusServer, FakeOpenAI, synthetic_page
+
+DEFAULT_CORPUS = [os.path.join(os.getenv("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR), "objects")]
+COLUMNS = ("level", "pages/s", "saved", "p50 s", "p95 s", "p99 s", "fetch p95", "llm p95", "429s", "peak MB")
+
+
+def _find(summary: Dict, kind: str, name: str, **labels) -> Optional[Dict]:
+    for entry in summary[kind]:
+        if entry["name"] == name and all(entry["labels"].get(k) == v for k, v in labels.items()):
+            return entry
+    return None
+
+
+def run_level(urls: List[str], base_url: str, concurrency: int, llm_batch_size: int, rpm: float) -> Dict:
+    """Runs in a child process: one crawl over urls with concurrency fetch and LLM workers"""
+    os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_MODEL": "bench", "OPENAI_BASE_URL": base_url,
+                       "OPENAI_RPM": str(rpm), "OPENAI_TPM": str(rpm * 10000)})
+    from logger import configure_logging
+    configure_logging(level="CRITICAL", filename="")  # expected fetch errors and 429s would flood the table
+    import crawler
+    import metrics
+    from fetcher import configure_fetcher
+    from llms import get_llm
+
+    rss_before = max_rss_mb()
+    configure_fetcher(per_host=concurrency, host_rate=1e6, host_burst=1e6, cache=None, backoff_factor=0.05)
+    llm = get_llm("openai", cache=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        options = crawler.CrawlOptions(fetch_workers=concurrency, llm_workers=concurrency,
+                                       llm_batch_size=llm_batch_size)
+        stats = crawler.crawl(urls, llm, os.path.join(tmp, "companies.csv"), options)
+        seconds = time.perf_counter() - t0
+    summary = metrics.summary()
+    latency = _find(summary, "histograms", "url_seconds") or {}
+    fetch = _find(summary, "histograms", "stage_seconds", stage="fetch") or {}
+    llm_latency = _find(summary, "histograms", "stage_seconds", stage="llm") or {}
+    return {
+        "level": concurrency,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(urls) / seconds, 3),
+        "saved": stats[-1].processed,
+        "p50": latency.get("p50", 0.0), "p95": latency.get("p95", 0.0), "p99": latency.get("p99", 0.0),
+        "fetch_p95": fetch.get("p95", 0.0),
+        "llm_p95": llm_latency.get("p95", 0.0),
+        "peak_mb": round(max_rss_mb() - rss_before, 1),
+        "stages": [stage.as_dict() for stage in stats],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="*", default=DEFAULT_CORPUS, help="html files or directories of them")
+    parser.add_argument("--pages", type=int, default=200, help="urls per run; synthetic pages fill up the corpus")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="fetch and LLM workers")
+    parser.add_argument("--llm-batch-size", type=int, default=1)
+    parser.add_argument("--site-latency", type=float, default=0.05, help="seconds every page takes")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="share of pages that are slow")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="extra seconds a slow page takes")
+    parser.add_argument("--fail-share", type=float, default=0.05, help="share of pages answering 404/500/503")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean seconds per completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="standard deviation of the completion time")
+    parser.add_argument("--rate-limit-share", type=float, default=0.02, help="share of completions answered with 429")
+    parser.add_argument("--rpm", type=float, default=100000, help="requests/min quota the crawler assumes")
+    parser.add_argument("--save", help="write the results as JSON, to compare later runs against")
+    parser.add_argument("--baseline", help="results saved by an earlier run to compare against")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.pages)
+    recorded = len(pages)
+    pages += [synthetic_page(n) for n in range(recorded, args.pages)]
+    site = CorpusServer(pages, args.site_latency, args.slow_share, args.slow_latency, args.fail_share)
+    llm = FakeOpenAI(args.llm_latency, args.llm_jitter, args.rate_limit_share)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {result["level"]: result for result in json.load(f)["results"]}
+    print(f"{len(pages)} pages ({recorded} recorded), site latency {args.site_latency}s, "
+          f"LLM latency {args.llm_latency}s, {args.rate_limit_share:.0%} 429s\n")
+    print("".join(f"{column:>11}" for column in COLUMNS) + ("   vs baseline" if baseline else ""))
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for concurrency in args.concurrency:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_level, site.urls(), llm.base_url, concurrency, args.llm_batch_size,
+                                 args.rpm).result()
+        result["rate_limited"] = llm.take_counts()["rate_limited"]
+        results.append(result)
+        row = (concurrency, result["pages_per_second"], result["saved"], result["p50"], result["p95"], result["p99"],
+               result["fetch_p95"], result["llm_p95"], result["rate_limited"], result["peak_mb"])
+        line = "".join(f"{value:>11.2f}" if isinstance(value, float) else f"{value:>11}" for value in row)
+        before = baseline.get(concurrency)
+        if before:
+            change = result["pages_per_second"] / before["pages_per_second"] - 1
+            line += f"   {change:+.1%} pages/s, p95 {result['p95'] - before['p95']:+.2f}s"
+        print(line)
+
+    site.shutdown()
+    llm.shutdown()
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\nSaved {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Measures extract_html throughput with threads only and with a process pool, to check
+how the extract stage scales with cores.
+
+    python benchmarks/bench_offload.py --processes 1 4 16 --threads 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from bench_parsers import DEFAULT_CORPUS, load_corpus
+from crawler import extract_html
+from offload import DEFAULT_MIN_SIZE, ProcessOffload
+
+
+def run(extract, pages, threads: int) -> float:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda html: extract(html, None, None), pages))
+    return len(pages) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="*", default=DEFAULT_CORPUS, help="html files or directories of them")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--threads", type=int, default=16, help="extract workers calling the parser")
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE)
+    parser.add_argument("--pages", type=int, default=64, help="corpus pages are repeated up to this count")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, 0)
+    if not corpus:
+        sys.exit("No pages found in the corpus")
+    pages = (corpus * (args.pages // len(corpus) + 1))[:args.pages]
+
+    baseline = run(extract_html, pages, args.threads)
+    print(f"{'threads only':<16}{baseline:>10.2f} pages/s")
+    for processes in sorted(set(args.processes)):
+        with ProcessOffload(extract_html, processes, args.min_size) as offload:
+            offload(pages[0], None, None)  # start the workers before timing
+            rate = run(offload, pages, max(args.threads, processes))
+        print(f"{f'{processes} processes':<16}{rate:>10.2f} pages/s  x{rate / baseline:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares the HTML parser backends of extract_html on a corpus of saved pages.
+
+    python benchmarks/bench_parsers.py                      # scripts/VCs.html + the HTTP cache
+    python benchmarks/bench_parsers.py pages/ --repeat 5 --backends stdlib lxml
+
+Each backend runs in a fresh process so its peak memory is measured on its own. The
+"same" column counts pages whose texts, links and headings match the bs4 reference.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from html_parse import BACKENDS, parse_html
+from http_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_CORPUS = [
+    os.path.join(os.path.dirname(__file__), '..', 'scripts', 'VCs.html'),
+    os.path.join(os.getenv("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR), "objects"),
+]
+
+
+def load_corpus(paths: List[str], limit: int) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names))
+        elif os.path.isfile(path):
+            files.append(path)
+    pages = []
+    for filename in files[:limit or None]:
+        with open(filename, encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    return pages
+
+
+def fingerprint(html: str, backend: str) -> str:
+    page = parse_html(html, backend)
+    return hashlib.sha256(repr((page.texts, page.links, sorted(page.headings))).encode("utf-8")).hexdigest()
+
+
+def max_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_backend(backend: str, pages: List[str], repeat: int) -> Dict:
+    """Runs in a child process: fingerprints once, then times repeat passes over the corpus"""
+    rss_before = max_rss_mb()
+    fingerprints = [fingerprint(html, backend) for html in pages]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse_html(html, backend)
+    seconds = time.perf_counter() - t0
+    return {"fingerprints": fingerprints, "seconds": seconds, "peak_mb": max_rss_mb() - rss_before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="*", default=DEFAULT_CORPUS, help="html files or directories of them")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument("--limit", type=int, default=0, help="use at most this many pages")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.limit)
+    if not pages:
+        sys.exit("No pages found in the corpus")
+    megabytes = sum(len(html.encode("utf-8")) for html in pages) / 1024 ** 2
+    print(f"{len(pages)} pages, {megabytes:.1f} MB, {args.repeat} passes\n")
+
+    reference = None
+    print(f"{'backend':<12}{'pages/s':>10}{'MB/s':>10}{'peak MB':>10}{'same':>10}")
+    context = multiprocessing.get_context("spawn")
+    for backend in ["bs4"] + [b for b in args.backends if b != "bs4"]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                result = pool.submit(run_backend, backend, pages, args.repeat).result()
+            except ValueError as e:  # optional dependency not installed
+                print(f"{backend:<12}skipped: {e}")
+                continue
+        if reference is None:
+            reference = result["fingerprints"]
+        if backend not in args.backends:
+            continue
+        same = sum(a == b for a, b in zip(result["fingerprints"], reference))
+        rate = len(pages) * args.repeat / result["seconds"]
+        print(f"{backend:<12}{rate:>10.1f}{megabytes * args.repeat / result['seconds']:>10.2f}"
+              f"{result['peak_mb']:>10.1f}{f'{same}/{len(pages)}':>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-ins for the websites and the LLM, so the crawler can be benchmarked offline.
+
+CorpusServer serves portfolio pages under /portfolio/<n>, with an artificial latency and
+a deterministic share of slow and failing pages. FakeOpenAI speaks the chat completions
+API with a configurable latency and a deterministic share of 429 answers, and builds its
+canned answer from the page content the crawler sends.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+FAIL_STATUSES = (404, 500, 503)
+PROMPT_END = re.compile(r"\n\s*---\s*\n")  # the prompts end in a --- line, the page content follows
+LINK = re.compile(r"^(.*): (\S+)$", re.MULTILINE)
+WORDS = ("platform", "biotech", "payments", "robotics", "climate", "data", "security", "health", "logistics",
+         "energy", "software", "materials", "fintech", "analytics", "devices", "learning")
+
+
+def synthetic_page(index: int, nav_links: int = 80) -> str:
+    """A portfolio company page shaped like the real ones: navigation, the company, footer, scripts"""
+    rng = random.Random(index)
+    name = f"{rng.choice(WORDS).title()}{rng.choice(WORDS)}{index}"
+    domain = f"{name.lower()}.com"
+    nav = "".join(f'<li><a href="/portfolio/{rng.randrange(10000)}">{rng.choice(WORDS).title()} '
+                  f'{rng.randrange(1000)}</a></li>' for _ in range(nav_links))
+    about = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(40, 200)))
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>{name} | Portfolio</title>
+<style>.nav {{ display: flex; }} .card {{ margin: 0 auto; }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}</script>
+</head><body><header><nav class="nav"><ul>{nav}</ul></nav></header>
+<main><section class="card"><h1>{name}</h1><p>{name} builds {about}.</p>
+<p>Headquarters: {rng.choice(("Boston", "London", "Berlin", "Austin", "Toronto"))}</p>
+<a href="https://www.{domain}/">Website</a> <a href="mailto:hello@{domain}">Contact</a>
+<a href="https://www.linkedin.com/company/{name.lower()}">LinkedIn</a></section></main>
+<footer><p>&copy; Example Ventures</p><a href="/privacy-policy">Privacy</a></footer>
+<script>{"var tracking = 1;" * 200}</script></body></html>"""
+
+
+class _CorpusHandler(BaseHTTPRequestHandler):
+    server: "CorpusServer"
+
+    def do_GET(self):
+        match = re.fullmatch(r"/portfolio/(\d+)", self.path.split("?")[0])
+        if not match or int(match.group(1)) >= len(self.server.pages):
+            self.reply(404, b"not found")
+            return
+        index = int(match.group(1))
+        roll = zlib.crc32(str(index).encode()) / 2 ** 32
+        delay = self.server.latency
+        if roll < self.server.slow_share:
+            delay += self.server.slow_latency
+        time.sleep(delay)
+        if 1 - roll < self.server.fail_share:
+            self.reply(FAIL_STATUSES[index % len(FAIL_STATUSES)], b"failed")
+            return
+        self.reply(200, self.server.pages[index].encode("utf-8"))
+
+    def reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CorpusServer(ThreadingHTTPServer):
+    """
+    Serves pages[n] at /portfolio/<n> after latency seconds. A slow_share of pages take
+    slow_latency seconds longer and a fail_share answer 404/500/503; which pages are slow
+    or failing depends only on n, so every run sees the same ones.
+    """
+    daemon_threads = True
+
+    def __init__(self, pages: List[str], latency: float = 0.02, slow_share: float = 0.05, slow_latency: float = 1.0,
+                 fail_share: float = 0.05, port: int = 0):
+        super().__init__(("127.0.0.1", port), _CorpusHandler)
+        self.pages = pages
+        self.latency = latency
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency
+        self.fail_share = fail_share
+        threading.Thread(target=self.serve_forever, name="corpus", daemon=True).start()
+
+    def urls(self) -> List[str]:
+        return [f"http://127.0.0.1:{self.server_port}/portfolio/{n}" for n in range(len(self.pages))]
+
+
+def canned_answer(content: str) -> Dict:
+    """What a good model would answer for an extract_html page: its first line and outbound links"""
+    texts, _, links = content.partition("Hyperlinks:")
+    lines = [line.strip() for line in texts.splitlines() if line.strip()]
+    url = email = None
+    for _, href in LINK.findall(links):
+        if href.startswith("mailto:"):
+            email = email or href[len("mailto:"):]
+        elif href.startswith("http") and "127.0.0.1" not in href and "linkedin" not in href:
+            url = url or href
+    return {"url": url, "name": lines[0] if lines else None, "description": " ".join(lines[1:3])[:300] or None,
+            "country": None, "city": None, "email": email}
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    server: "FakeOpenAI"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = body["messages"][0]["content"]
+        time.sleep(max(0.0, self.server.rng_gauss(self.server.latency, self.server.jitter)))
+        if self.server.rate_limited():
+            self.server.count("rate_limited")
+            self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                       "code": "rate_limit_exceeded"}},
+                       {"retry-after-ms": str(int(self.server.retry_after * 1000)),
+                        "x-ratelimit-remaining-requests": "0"})
+            return
+        self.server.count("completions")
+        page = PROMPT_END.split(content, maxsplit=1)[-1]
+        sections = re.split(r"^### Page (\d+)\n", page, flags=re.MULTILINE)
+        if len(sections) > 1:
+            answer = json.dumps({"companies": [{"index": int(n), **canned_answer(text)}
+                                               for n, text in zip(sections[1::2], sections[2::2])]})
+        else:
+            answer = json.dumps(canned_answer(page))
+        prompt_tokens = len(content) // 4
+        self.reply(200, {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer) // 4,
+                      "total_tokens": prompt_tokens + len(answer) // 4},
+        })
+
+    def reply(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """OpenAI-compatible endpoint at base_url answering after ~latency seconds, 429 for rate_limit_share of requests"""
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, rate_limit_share: float = 0.02,
+                 retry_after: float = 0.5, seed: int = 0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _OpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_share = rate_limit_share
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)  # latency jitter only
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.counts = {"completions": 0, "rate_limited": 0}
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def rate_limited(self) -> bool:
+        """Spreads the 429s evenly over the requests, whichever thread they arrive on"""
+        with self.lock:
+            n = self.requests
+            self.requests += 1
+        return int((n + 1) * self.rate_limit_share) > int(n * self.rate_limit_share)
+
+    def rng_gauss(self, mean: float, sigma: float) -> float:
+        with self.lock:
+            return self.rng.gauss(mean, sigma)
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def take_counts(self) -> Dict[str, int]:
+        with self.lock:
+            counts, self.counts = self.counts, {"completions": 0, "rate_limited": 0}
+        return counts
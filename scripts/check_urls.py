@@ -1,5 +1,9 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from urls import canonical_url
 
 # Function to check if a URL exists
 def check_url_exists(url):
@@ -26,6 +30,13 @@ res = []
 with open('vcs_urls_all.csv', 'r') as file:
     lines = [line.strip() for line in file if not line.startswith('company')]
 
+# the same VC listed as http://www.vc.com/ and https://vc.com costs the same three requests twice
+unique = {}
+for line in lines:
+    unique.setdefault(canonical_url(line.split(',')[1]), line)
+print(f"Skipping {len(lines) - len(unique)} duplicate VC urls")
+lines = list(unique.values())
+
 # Multithreading with ThreadPoolExecutor
 with ThreadPoolExecutor(max_workers=20) as executor:
     futures = [executor.submit(process_company, *line.split(',')) for line in lines]
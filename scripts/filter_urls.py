@@ -1,85 +1,74 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 from urllib.parse import urljoin, urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                  "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Connection": "keep-alive",
-    "Referer": "https://www.google.com/",
-    "Cache-Control": "no-cache",
-    "DNT": "1",
-    "Upgrade-Insecure-Requests": "1",
-}
-
-EXCLUDE_KEYWORDS = [
-    "page", "about-us", "careers", "contact", "team", "news", "blog", "events",
-    "jobs", "press", "leadership", "story", "media", "insights", "updates"
-]
+from fetcher import get_fetcher, configure_fetcher
+from html_parse import parse_html
+from offload import ProcessOffload
+from urls import UrlIndex, canonical_url, dedup_urls
+from classifier import non_company_url
 
 def should_exclude_url(url, portfolio_url):
     # Exclude if it's the same as the portfolio URL
-    if url.rstrip("/") == portfolio_url.rstrip("/"):
+    if canonical_url(url) == canonical_url(portfolio_url):
         return True
 
     # Exclude vc.com/portfolio/?sector=20
     if urlparse(url).query:
         return True
 
-    # Exclude URLs with unwanted keywords in the path
-    path = urlparse(url).path.lower()
-    if any(keyword in path for keyword in EXCLUDE_KEYWORDS):
+    # Exclude about, team, news, legal and listing pages (see classifier.NON_COMPANY_KEYWORDS)
+    if non_company_url(url):
         return True
 
     return False
 
-def extract_internal_links(portfolio_url):
-    keyword = portfolio_url.split('/')[-2]
+def page_hrefs(html):
+    return parse_html(html).hrefs
 
-    try:
-        response = requests.get(portfolio_url, headers=headers, timeout=10)
-        response.raise_for_status()
+def extract_internal_links(portfolio_url, get_hrefs=page_hrefs):
+    keyword = portfolio_url.split('/')[-2]
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        vc_domain = urlparse(portfolio_url).netloc  # Extract the VC domain
+    # shared connection pool, per-host rate limit and on-disk cache
+    html = get_fetcher().fetch(portfolio_url)
+    if html is None:
+        print(f"Error accessing {portfolio_url}")
+        return []
 
-        internal_links = []
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag['href'].strip()
+    vc_domain = urlparse(portfolio_url).netloc  # Extract the VC domain
 
-            # Skip modals and JavaScript-based links
-            if ("#" in href) or href.startswith("javascript:"):
-                continue
-            full_url = urljoin(portfolio_url, href)
-            if should_exclude_url(full_url, portfolio_url):
-                continue
+    internal_links = []
+    for href in get_hrefs(html):
+        href = href.strip()
 
-            # Check if the link stays within the same VC domain
-            if (urlparse(full_url).netloc == vc_domain) and (f"/{keyword}/" in full_url):
-                internal_links.append(full_url)
+        # Skip modals and JavaScript-based links
+        if ("#" in href) or href.startswith("javascript:"):
+            continue
+        full_url = urljoin(portfolio_url, href)
+        if should_exclude_url(full_url, portfolio_url):
+            continue
 
-        return list(set(internal_links))  # Remove duplicates
+        # Check if the link stays within the same VC domain
+        if (urlparse(full_url).netloc == vc_domain) and (f"/{keyword}/" in full_url):
+            internal_links.append(full_url)
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error accessing {portfolio_url}: {e}")
-        return []
+    return dedup_urls(internal_links)  # Remove duplicates, including www./slash/tracking variants
 
-def process_portfolio(portfolio_url):
+def process_portfolio(portfolio_url, get_hrefs=page_hrefs):
     """
     returns {'https:vc1.com/portfolio/': ['https:vc1.com/portfolio/comp1', 'https:vc1.com/portfolio/comp2'], ...}
     """
-    internal_links = extract_internal_links(portfolio_url)
+    internal_links = extract_internal_links(portfolio_url, get_hrefs)
     return {portfolio_url: internal_links} if len(internal_links) > 1 else None
 
-def parallel_crawl(portfolio_urls, max_workers=20):
+def parallel_crawl(portfolio_urls, max_workers=20, parse_processes=None):
     results = {}
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    # threads wait on the network, the link walk runs on every core in a process pool
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, ProcessOffload(page_hrefs, parse_processes) as offload:
         # Submit all portfolio URLs to be processed in parallel
-        futures = [executor.submit(process_portfolio, url) for url in portfolio_urls]
+        futures = [executor.submit(process_portfolio, url, offload) for url in portfolio_urls]
 
         # Process results as they complete
         for future in as_completed(futures):
@@ -97,6 +86,12 @@ if __name__ == '__main__':
     with open('vcs_urls_all_portfolio.csv', 'r') as file:
         portfolio_urls = [line.strip().split(',')[-1] for line in file if not line.endswith(',\n')]
 
+    # skip near-duplicates before fetching anything, and learn redirects for the crawler
+    url_index = UrlIndex.from_env()
+    configure_fetcher(on_redirect=url_index.add_redirect)
+    portfolio_urls = list(url_index.unique(portfolio_urls))
+    print(f"URL index: {url_index.report()}")
+
     # Run the parallel crawler
     results = parallel_crawl(portfolio_urls, max_workers=10)
 
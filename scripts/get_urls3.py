@@ -1,17 +1,18 @@
-import requests
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 from bs4 import BeautifulSoup
-import time
+from fetcher import get_fetcher, configure_fetcher
+from urls import UrlIndex
 
 def get_company_details(company_url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    response = requests.get(company_url, headers=headers)
-    if response.status_code != 200:
+    # shared connection pool, per-host rate limit and on-disk cache
+    html = get_fetcher().fetch(company_url)
+    if html is None:
         print(f"Failed to retrieve company details from {company_url}")
         return None, None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
     company_name_elem = soup.select_one('[id^="w-node-_1743f616-1944-660a-f988-fd98c0b7d554-"]')
     company_website_elem = soup.select_one('[id^="w-node-_917adf07-6cee-48b6-1f05-21810668e981-"] a')
@@ -26,13 +27,17 @@ def get_company_details(company_url):
 with open("company_urls_uk.txt", "r") as file:
     all_company_urls = [line.strip() for line in file.readlines()]
 
+# skip near-duplicates before fetching anything, and learn redirects for the crawler
+url_index = UrlIndex.from_env()
+configure_fetcher(on_redirect=url_index.add_redirect)
+all_company_urls = list(url_index.unique(all_company_urls))
+
 # Collect company details
 company_details = []
 for url in all_company_urls:
     print(f"Scraping company details from {url}...")
     name, website = get_company_details(url)
     company_details.append({"Company Name": name, "Company URL": website})
-    time.sleep(1)
 
 # Save the company details to a file
 with open("company_details_uk.csv", "w") as file:
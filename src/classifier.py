@@ -0,0 +1,280 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from html_parse import BACKENDS
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smartcrawler", "page_classifier.json")
+DEFAULT_THRESHOLD = 0.2  # pages the model gives a lower chance of being a company page skip the LLM
+DEFAULT_AUDIT_RATE = 0.02  # share of rejected pages sent to the LLM anyway, to estimate recall
+
+# path words of pages that are about the fund, not a portfolio company
+NON_COMPANY_KEYWORDS = [
+    "page", "about-us", "careers", "contact", "team", "news", "blog", "events",
+    "jobs", "press", "leadership", "story", "media", "insights", "updates",
+    "about", "privacy", "privacy-policy", "terms", "terms-and-conditions", "cookie", "cookies", "legal",
+    "disclaimer", "imprint", "category", "categories", "tag", "tags", "sector", "sectors", "login", "search",
+]
+# a path ending in one of these is the portfolio listing itself
+LISTING_WORDS = {"portfolio", "portfolios", "companies", "company", "investments", "all", "current", "exited",
+                 "active-funds"}
+
+# keywords must be a whole path segment: /portfolio/team is the fund's team, /portfolio/team-snap a company
+NON_COMPANY_SEGMENTS = set(NON_COMPANY_KEYWORDS)
+PAGE_EXTENSION = re.compile(r"\.(?:html?|php|aspx?)$")
+WORD = re.compile(r"[a-z][a-z0-9]+")
+
+
+def non_company_url(url: str) -> Optional[str]:
+    """The reason url is clearly not a company page, or None"""
+    path = urlsplit(url).path.lower()
+    segments = [PAGE_EXTENSION.sub("", segment) for segment in path.split("/") if segment]
+    for segment in segments:
+        if segment in NON_COMPANY_SEGMENTS:
+            return segment
+    if not segments or segments[-1] in LISTING_WORDS:
+        return "listing"
+    return None
+
+
+def page_features(content: str, source_url: str) -> Set[str]:
+    """Binary features of an extract_html output: its words and the kinds of links on it"""
+    texts, _, links = content.partition("\n\nHyperlinks:\n")
+    features = set(WORD.findall(texts.lower()))
+    features.add(f"len:{int(math.log2(len(texts) + 1))}")
+    source_host = (urlsplit(source_url).hostname or "").removeprefix("www.")
+    outbound = 0
+    for line in links.splitlines():
+        href = line.rpartition(": ")[2].strip().lower()
+        if href.startswith(("mailto:", "tel:")):
+            features.add(f"link:{href.split(':')[0]}")
+            continue
+        host = (urlsplit(href).hostname or "").removeprefix("www.")
+        outbound += bool(host) and host != source_host
+    features.add(f"outbound:{min(outbound, 8)}")
+    return features
+
+
+class PageClassifier:
+    """Logistic regression over binary page features, small enough to train on past crawls"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = 0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+    def probability(self, features: Iterable[str]) -> float:
+        score = self.bias + sum(self.weights.get(feature, 0.0) for feature in features)
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, score))))
+
+    def fit(self, samples: List[Tuple[Set[str], int]], epochs: int = 15, learning_rate: float = 0.1,
+            l2: float = 1e-4, seed: int = 0) -> "PageClassifier":
+        samples = list(samples)
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            rate = learning_rate / (1 + epoch)
+            for features, label in samples:
+                gradient = label - self.probability(features)
+                self.bias += rate * gradient
+                for feature in features:
+                    weight = self.weights.get(feature, 0.0)
+                    self.weights[feature] = weight + rate * (gradient - l2 * weight)
+        # drop features that never mattered to keep the model file small
+        self.weights = {feature: round(weight, 4) for feature, weight in self.weights.items() if abs(weight) > 1e-3}
+        return self
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"bias": self.bias, "weights": self.weights}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "PageClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["weights"], data["bias"])
+
+
+class PageGate:
+    """
+    Cheap checks in front of the LLM. Urls that are clearly not company pages are dropped
+    before fetching; with a trained classifier, extracted pages scoring below threshold are
+    dropped before the LLM call. A small audit_rate share of rejected urls and pages still
+    goes to the LLM, so the companies the gate would have lost can be counted to estimate recall.
+    """
+
+    def __init__(self, classifier: Optional[PageClassifier] = None, threshold: float = DEFAULT_THRESHOLD,
+                 audit_rate: float = DEFAULT_AUDIT_RATE, check_urls: bool = True):
+        self.classifier = classifier
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.check_urls = check_urls
+        self.lock = threading.Lock()
+        self.urls_skipped = self.pages_checked = self.pages_skipped = 0
+        self.audited = self.audited_companies = 0
+        self.audited_urls: Set[str] = set()  # rejected by the url rules but crawled for the recall estimate
+        self.url_audited_companies = 0
+
+    @classmethod
+    def from_path(cls, path: str = DEFAULT_MODEL_PATH, **kwargs) -> "PageGate":
+        classifier = PageClassifier.load(path) if os.path.isfile(path) else None
+        if classifier is None:
+            logger.info(f"No page classifier at {path}, only urls are checked")
+        return cls(classifier, **kwargs)
+
+    def filter_urls(self, urls: Iterable[str],
+                    on_skip: Optional[Callable[[str, str], None]] = None) -> Iterator[str]:
+        """Yields the urls worth fetching; on_skip is called with every other url and "not_company_url" """
+        for url in urls:
+            reason = non_company_url(url) if self.check_urls else None
+            if reason is None:
+                yield url
+                continue
+            if self._audit(url):
+                with self.lock:
+                    self.audited_urls.add(url)
+                yield url
+                continue
+            with self.lock:
+                self.urls_skipped += 1
+            logger.info(f"Skipping {url}: not a company page ({reason})")
+            if on_skip is not None:
+                on_skip(url, "not_company_url")
+
+    def check_page(self, url: str, content: str) -> Tuple[bool, bool]:
+        """Returns (send to the LLM, audit): audit marks a rejected page let through for the recall estimate"""
+        probability = self.classifier.probability(page_features(content, url))
+        if probability >= self.threshold:
+            with self.lock:
+                self.pages_checked += 1
+            return True, False
+        audit = self._audit(url)
+        with self.lock:
+            self.pages_checked += 1
+            self.pages_skipped += not audit
+            self.audited += audit
+        if not audit:
+            logger.info(f"Skipping {url}: company page probability {probability:.2f}")
+        return audit, audit
+
+    def _audit(self, url: str) -> bool:
+        # deterministic per url, so resumed runs audit the same pages
+        return zlib.crc32(url.encode("utf-8")) / 2 ** 32 < self.audit_rate
+
+    def audits_url(self, url: str) -> bool:
+        """True for a url the url rules rejected that is crawled anyway, to audit them"""
+        with self.lock:
+            return url in self.audited_urls
+
+    def audit_hit(self, url: Optional[str] = None):
+        """An audited url or page turned out to be a company page"""
+        with self.lock:
+            if url is not None and url in self.audited_urls:
+                self.url_audited_companies += 1
+            else:
+                self.audited_companies += 1
+
+    def report(self, companies: int) -> Dict:
+        """Skipped work and, if any pages were audited, the estimated share of company pages kept"""
+        with self.lock:
+            report = {
+                "urls_skipped": self.urls_skipped,
+                "pages_checked": self.pages_checked,
+                "pages_skipped": self.pages_skipped,
+                "fetches_avoided": self.urls_skipped,
+                "llm_calls_avoided": self.urls_skipped + self.pages_skipped,
+                "audited": self.audited,
+                "audited_companies": self.audited_companies,
+                "urls_audited": len(self.audited_urls),
+                "url_audited_companies": self.url_audited_companies,
+            }
+            if self.audit_rate and (self.audited or self.audited_urls):
+                hits = self.audited_companies + self.url_audited_companies
+                kept = companies - hits
+                missed = hits / self.audit_rate
+                report["estimated_recall"] = round(kept / (kept + missed), 3) if kept + missed else 1.0
+        return report
+
+
+def labelled_pages(state_path: str, cache_dir: Optional[str] = None, token_budget: Optional[int] = None,
+                   parser: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+    """
+    (url, extracted content, label) for every url an earlier crawl took to the LLM: 1 if it
+    produced a company, 0 if the LLM answered without one. Urls whose LLM call or answer
+    failed say nothing about the page and are left out. Pages come from the HTTP cache and
+    are extracted as the crawl did, so pass the crawl's token_budget and parser.
+    """
+    from crawler import extract_html
+    from http_cache import HTTPCache
+    from state import StateStore
+    state = StateStore(state_path)
+    cache = HTTPCache(cache_dir) if cache_dir else HTTPCache.from_env()
+    try:
+        for url, status, error in state.outcomes():
+            if status == "done":
+                label = 1
+            elif status == "skipped" and error == "no_company":
+                label = 0
+            else:
+                continue
+            cached = cache.get(url)
+            if cached is not None:
+                yield url, extract_html(cached.body, url, token_budget, parser), label
+    finally:
+        state.close()
+        cache.close()
+
+
+def evaluate(classifier: PageClassifier, samples: List[Tuple[Set[str], int]],
+             thresholds: Iterable[float]) -> List[Dict]:
+    rows = []
+    positives = sum(label for _, label in samples) or 1
+    for threshold in thresholds:
+        kept = [(classifier.probability(features) >= threshold, label) for features, label in samples]
+        found = sum(1 for keep, label in kept if keep and label)
+        rows.append({
+            "threshold": threshold,
+            "recall": round(found / positives, 3),
+            "skip_rate": round(sum(1 for keep, _ in kept if not keep) / (len(kept) or 1), 3),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the page classifier on the results of earlier crawls")
+    parser.add_argument("--state", default="crawl_state.db", help="state file of the crawls to learn from")
+    parser.add_argument("--http-cache", help="HTTP cache directory holding their pages (default: HTTP_CACHE_DIR)")
+    parser.add_argument("--model", default=os.getenv("PAGE_CLASSIFIER_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of pages kept back to measure recall")
+    # pages are extracted as the crawls did, so the features match what the gate sees
+    parser.add_argument("--token-budget", type=int, help="the --token-budget of the crawls")
+    parser.add_argument("--parser", choices=sorted(BACKENDS), help="the HTML parser backend of the crawls")
+    args = parser.parse_args()
+
+    samples = [(url, page_features(content, url), label)
+               for url, content, label in labelled_pages(args.state, args.http_cache, args.token_budget,
+                                                         args.parser)]
+    if not samples:
+        raise SystemExit("No labelled pages found: run a crawl with --state first")
+    test = [(features, label) for url, features, label in samples if zlib.crc32(url.encode()) / 2 ** 32 < args.holdout]
+    train = [(features, label) for url, features, label in samples if zlib.crc32(url.encode()) / 2 ** 32 >= args.holdout]
+    print(f"{len(samples)} pages, {sum(label for *_, label in samples)} company pages")
+    if test:
+        for row in evaluate(PageClassifier().fit(train), test, [0.05, 0.1, 0.2, 0.3, 0.5]):
+            print(f"threshold {row['threshold']:.2f}: recall {row['recall']:.3f}, LLM calls skipped {row['skip_rate']:.1%}")
+    # the saved model learns from every page
+    PageClassifier().fit([(features, label) for _, features, label in samples]).save(args.model)
+    print(f"Saved {args.model}")
+
+
+if __name__ == '__main__':
+    main()
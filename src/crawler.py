@@ -1,90 +1,70 @@
-import requests
-import ast
+import argparse
 import csv
 import os
-import pydantic
+import sys
 import time
+import pydantic
 from company import Company
-from bs4 import BeautifulSoup
-from llms import get_llm
-from urllib.parse import urlparse
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from typing import Optional, Dict
-from logger import get_logger
+from html_parse import parse_html, configure_parser, current_parser, BACKENDS
+from offload import ProcessOffload, DEFAULT_MIN_SIZE
+from llms import get_llm, CachedLLM, LLMRouter, PROVIDERS
+from structured import parse_company_output
+from fetcher import get_fetcher, configure_fetcher, DEFAULT_MAX_BYTES
+from http_cache import HTTPCache, DEFAULT_CACHE_DIR, DEFAULT_TTL
+from fingerprint import Fingerprint, DEFAULT_MAX_DISTANCE
+from discovery import DEFAULT_MAX_PAGES, Discovery
+from inputs import read_urls
+from urls import UrlIndex, DEFAULT_INDEX_PATH, site_domain
+from classifier import PageGate, DEFAULT_MODEL_PATH, DEFAULT_THRESHOLD
+from typing import Callable, Optional, Dict, Iterable, List, Tuple
+from dataclasses import dataclass, field
+from functools import partial
+from operator import attrgetter
+from pipeline import Pipeline, Stage, StageStats
+from writer import RecordWriter
+from workqueue import DEFAULT_VISIBILITY, QueueWorker, open_queue
+from state import StateStore
+from reduce import reduce_content, estimate_tokens
+from rules import extract_fields, fill_missing, missing_fields, resolved
+from logger import get_logger, log_payload
+import metrics
 
 logger = get_logger(__name__)
 
 def get_html(url: str) -> Optional[str]:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Connection": "keep-alive",
-        "Referer": "https://www.google.com/",
-    }
-    try:
-        adapter = HTTPAdapter(max_retries=Retry(
-            total=3,
-            backoff_factor=1,      # Wait 1s, 2s, 4s between retries
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"]
-        ))
-        session = requests.Session()
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-
-        response = session.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise error for bad status codes (4xx/5xx)
-        return response.text
-
-    except requests.exceptions.HTTPError as errh:
-        logger.error(f"HTTP Error: {errh} for URL: {url}")
-    except requests.exceptions.ConnectionError as errc:
-        logger.error(f"Connection Error: {errc} for URL: {url}")
-    except requests.exceptions.Timeout as errt:
-        logger.error(f"Timeout Error: {errt} for URL: {url}")
-    except requests.exceptions.RequestException as err:
-        logger.error(f"Unexpected Error: {err} for URL: {url}")
-
-def extract_html(input_html: str) -> str:
-    soup = BeautifulSoup(input_html, "html.parser") # lxml, html5lib
-
-    # Remove unnecessary tags
-    for tag in soup(["script", "style", "noscript", "meta", "header", "footer"]):
-        tag.extract()
-
-    general_text = soup.get_text(separator=" ", strip=True)
-
-    links = []
-    for link in soup.find_all("a", href=True):  # Only <a> tags with href attribute
-        href = link["href"]
-        link_text = link.get_text(strip=True)
-
-        # Skip empty links
-        if href and link_text:
-            links.append(f"{link_text}: {href}")
-
-    return f"Texts:\n{general_text}\n\nHyperlinks:\n" + "\n".join(links)
+    # one shared connection pool with per-host politeness limits, see fetcher.py
+    return get_fetcher().fetch(url)
+
+def extract_html(input_html: str, source_url: Optional[str] = None, token_budget: Optional[int] = None,
+                 parser: Optional[str] = None) -> str:
+    # one pass collects the texts and links outside script, style, header, footer, etc.
+    page = parse_html(input_html, parser)
+    content = format_content(page.texts, page.links)
+    if token_budget is None:
+        return content
+
+    # keep only what is likely about the company, within the token budget
+    texts, links = reduce_content(page.texts, page.links, source_url or "", token_budget, page.headings)
+    reduced = format_content(texts, links)
+    before, after = estimate_tokens(content), estimate_tokens(reduced)
+    logger.info(f"Reduced content of {source_url} from {before} to {after} tokens ({before - after} saved)")
+    return reduced
+
+def format_content(texts: List[str], links: List[Tuple[str, str]]) -> str:
+    general_text = " ".join(texts)
+    return f"Texts:\n{general_text}\n\nHyperlinks:\n" + "\n".join(f"{text}: {href}" for text, href in links)
 
 def parse_llm_output(llm_output: str) -> Optional[Dict]:
-    try:
-        return ast.literal_eval(llm_output)
-    except (SyntaxError, ValueError) as e:
-        logger.debug(llm_output)
-        logger.error("Error parsing LLM output:", e)
-    except Exception as e:
-        logger.debug(llm_output)
-        logger.error(f"Unexpected Error while parsing LLM output: {e}")
+    # JSON from the provider, or an older Python dict literal from the LLM cache
+    return parse_company_output(llm_output)
 
 def validate_url_email(data_dict: Dict, source_url: str) -> Dict:
     data_dict['source'] = source_url
 
     # vc and startup has the same domain, that means llm extracted wrong info
     # "https://www.dcvc.com/companies/platfora/"
-    parsed_url = urlparse(source_url)
-    if parsed_url.netloc == urlparse(data_dict['url']).netloc:
+    source_domain = site_domain(source_url)  # no www., so it compares with email domains too
+    if site_domain(data_dict['url']) == source_domain:
         logger.warning(f'No valid url for company from {source_url}')
         data_dict['url'] = None
 
@@ -92,10 +72,7 @@ def validate_url_email(data_dict: Dict, source_url: str) -> Dict:
     # "https://btn.vc/portfolio/hivewealth-2/"
     # "https://www.preludeventures.com/portfolio/atom-computing"
     if data_dict['email'] is not None:
-        source_domain = parsed_url.netloc or parsed_url.path # no http
-        if source_domain.startswith('www.'): # remove www. to compare with email domain
-            source_domain = source_domain[4:]
-        good_emails = [x for x in data_dict['email'].split(',') if x.split('@')[-1].strip() != source_domain]
+        good_emails = [x for x in data_dict['email'].split(',') if x.split('@')[-1].strip().lower() != source_domain]
         if good_emails:
             data_dict['email'] = ','.join(good_emails)
         else:
@@ -107,61 +84,426 @@ def validate_data(data: Dict) -> Optional[Company]:
         company = Company(**data)
         return company
     except pydantic.ValidationError as e:
+        metrics.count("errors_total", stage="validate", error=type(e).__name__)
         logger.error(f"Validation Error: {e}")
     except Exception as e:
+        metrics.count("errors_total", stage="validate", error=type(e).__name__)
         logger.error(f"Unexpected Error: {e}")
 
 def save_to_csv(company: Company, filename: str):
+    # one-off append, crawl() streams rows through a RecordWriter instead
     file_exists = os.path.isfile(filename)
+    row = company.model_dump()
 
     with open(filename, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=company.model_dump().keys(), extrasaction='ignore')
+        writer = csv.DictWriter(file, fieldnames=row.keys(), extrasaction='ignore')
 
         # Write headers only if file is new
         if not file_exists:
             writer.writeheader()
 
-        writer.writerow(company.model_dump())
+        writer.writerow(row)
+
+@dataclass
+class CrawlJob:
+    """State of one url as it moves through the crawl stages"""
+    url: str
+    output_filename: str = "output.csv"
+    token_budget: Optional[int] = None
+    raw_html: Optional[str] = None
+    clean_content: Optional[str] = None
+    llm_output: Optional[str] = None
+    company: Optional[Company] = None
+    audited: bool = False  # rejected by the page classifier but sent to the LLM to measure recall
+    fingerprint: Optional[Fingerprint] = None
+    carried: bool = False  # page unchanged since an earlier run, its record is reused without an LLM call
+    prefilled: Dict = field(default_factory=dict)  # fields in the page's structured data, see rules.py
+    guessed: Dict = field(default_factory=dict)  # fields guessed from the page's links, used if the LLM has none
+    skipped: Optional[str] = None  # why the job was left out on purpose, as opposed to failing
+    started: float = field(default_factory=time.perf_counter)
 
-def process_company(url: str, llm_client, output_filename="output.csv"):
-    logger.info(f"Processing: {url}")
+    @property
+    def needs_llm(self) -> bool:
+        return not self.carried and not resolved(self.prefilled)
+
+    @property
+    def asked_fields(self) -> Optional[List[str]]:
+        """Fields the LLM is asked for, None for all of them"""
+        return missing_fields(self.prefilled)
+
+
+def fetch_stage(job: CrawlJob, url_index: Optional[UrlIndex] = None) -> Optional[CrawlJob]:
+    logger.info(f"Processing: {job.url}")
 
     # get raw html contents
-    raw_html_content = get_html(url)
-    if not raw_html_content:
-        return
+    with metrics.timer("fetch"):
+        job.raw_html = get_html(job.url)
+    # known redirects are resolved by UrlIndex.unique() before fetching, new ones only show up here
+    if url_index is not None and url_index.is_duplicate(job.url):
+        logger.info(f"Skipping {job.url}: redirects to a page already in this crawl")
+        job.skipped = "redirect_duplicate"
+        return None
+    return job if job.raw_html else None
 
-    # extract only texts and urls from html
-    clean_content = extract_html(raw_html_content)
-    logger.debug(clean_content)
+def extract_stage(job: CrawlJob, offload: Optional[ProcessOffload] = None, rules=True) -> CrawlJob:
+    # extract only texts and urls from html, in a worker process if offload is given
+    with metrics.timer("extract"):
+        job.clean_content = (offload or extract_html)(job.raw_html, job.url, job.token_budget)
+    if rules:
+        # company fields in the page's markup, so the LLM only has to find the rest
+        with metrics.timer("rules"):
+            job.prefilled, job.guessed = extract_fields(job.raw_html, job.clean_content, job.url)
+        found = False
+        for source, fields in (("structured", job.prefilled), ("links", job.guessed)):
+            for name, value in fields.items():
+                if value:
+                    found = True
+                    metrics.count("rules_fields_total", field=name, source=source)
+        metrics.count("rules_pages_total", result="resolved" if resolved(job.prefilled) else
+                      "partial" if found else "none")
+    job.raw_html = None  # not needed downstream, free it early
+    log_payload(logger, f"Extracted content of {job.url}", job.clean_content, key=job.url)
+    return job
 
+def fingerprint_stage(job: CrawlJob, state: StateStore, incremental: bool = False,
+                      max_distance: int = DEFAULT_MAX_DISTANCE) -> CrawlJob:
+    # reuse the record of a page whose content hasn't changed since it was extracted
+    job.fingerprint = Fingerprint.of(job.clean_content)
+    if not incremental:
+        return job
+    remembered = state.recall(job.url)
+    if remembered is None:
+        metrics.count("incremental_pages_total", result="new")
+        return job
+    fingerprint, record = remembered
+    result = fingerprint.compare(job.fingerprint, max_distance)
+    metrics.count("incremental_pages_total", result=result)
+    if result != "changed":
+        job.company = Company.model_validate_json(record)
+        job.carried = True
+    return job
+
+def classify_stage(job: CrawlJob, gate: PageGate) -> Optional[CrawlJob]:
+    # skip the LLM call for pages that don't look like a company page
+    if not job.needs_llm or gate.audits_url(job.url):
+        return job
+    send, job.audited = gate.check_page(job.url, job.clean_content)
+    return job if send else None
+
+def llm_stage(job: CrawlJob, llm_client) -> Optional[CrawlJob]:
     # LLM extraction
-    llm_output = llm_client.get_company_info(clean_content)
-    if not llm_output:
-        return
+    if not job.needs_llm:
+        return job
+    with metrics.timer("llm"):
+        job.llm_output = llm_client.get_company_info(job.clean_content, job.asked_fields)
+    return job if job.llm_output else None
 
-    # convert to dict
-    data_dict = parse_llm_output(llm_output)
-    if not data_dict:
-        return
+def llm_batch_stage(jobs: List[CrawlJob], llm_client) -> List[Optional[CrawlJob]]:
+    # several pages in one LLM request, those missing the same fields share one prompt and schema
+    groups: Dict[Optional[Tuple[str, ...]], List[CrawlJob]] = {}
+    for job in jobs:
+        if job.needs_llm:
+            fields = job.asked_fields
+            groups.setdefault(tuple(fields) if fields is not None else None, []).append(job)
+    for pending in groups.values():
+        with metrics.timer("llm", batched=True):
+            outputs = llm_client.get_companies_info([job.clean_content for job in pending], pending[0].asked_fields)
+        for job, llm_output in zip(pending, outputs):
+            job.llm_output = llm_output
+    return [job if not job.needs_llm or job.llm_output else None for job in jobs]
 
-    # check on source url, startup url and startup email
-    validate_url_email(data_dict, url)
+def validate_stage(job: CrawlJob, gate: Optional[PageGate] = None) -> Optional[CrawlJob]:
+    if job.carried:
+        return job
+    data_dict = {}
+    if job.llm_output is not None:  # None when the rules found everything
+        # convert to dict
+        with metrics.timer("parse"):
+            data_dict = parse_llm_output(job.llm_output)
+        if not data_dict:
+            metrics.count("errors_total", stage="parse", error="Unparseable")
+            if not job.prefilled.get("url") and not job.guessed.get("url"):
+                return
 
-    # pydantic validation
-    company = validate_data(data_dict)
-    if not company:
-        return
+    with metrics.timer("validate"):
+        # structured fields win, the LLM's answer fills the gaps and link guesses what it left empty
+        data_dict = fill_missing(job.prefilled, data_dict or {}, job.guessed)
 
-    # save to csv
-    save_to_csv(company, output_filename)
-    logger.info(f"Successfully processed: {url}")
+        # check on source url, startup url and startup email
+        validate_url_email(data_dict, job.url)
+        if not data_dict.get("url"):
+            # an answer without a company website: the page is not about a company, see classifier.py
+            logger.info(f"No company found on {job.url}")
+            job.skipped = "no_company"
+            return None
 
+        # pydantic validation
+        job.company = validate_data(data_dict)
+    if job.company and gate is not None and (job.audited or gate.audits_url(job.url)):
+        gate.audit_hit(job.url)
+    return job if job.company else None
 
-if __name__ == '__main__':
-    urls = ["https://www.nvfund.com/portfolio/anokion"]
-    #urls = ['https://www.foresitecapital.com/portfolio/myome-inc/', 'http://www.socialstarts.com/portfolio/everymove.org', 'https://www.1011vc.com/portfolio/axis-security/', 'http://www.wrvi.vc/portfolio/mojo-networks', 'https://www.kaporcapital.com/portfolio/adeptid/', 'http://www.TEXOventures.com/portfolio/www.sensentia.com', 'http://www.thirdpointventures.com/companies/kumu-networks', 'https://www.silvertonpartners.com/portfolio/vtel/', 'http://tenoneten.net/portfolio/locu', 'https://ardent.vc/portfolio/ecue', 'http://www.nvc.vc/portfolio/human-interest', 'https://www.momentventures.com/portfolio/stylar/', 'http://www.congruentvc.com/portfolio/Thrilling', 'http://www.alsop-louie.com/portfolio/socialcam', 'https://www.synventures.com/portfolio/revic/', 'http://www.maveron.com/portfolio/two-chairs', 'http://www.hwvp.com/companies/aria-systems', 'http://www.pivotinvestment.com/companies/card-com', 'http://www.starvestpartners.com/portfolio/portfolio', 'https://www.usvp.com/portfolio/nuance-communications-nuan/', 'http://www.aperturevp.com/portfolio/www.endotronix.com', 'https://www.cambridgespg.com/portfolio/lifeaid/', 'http://www.valorcapitalgroup.com/portfolio/companies', 'https://www.lyticalventures.com/companies/wand.ai', 'https://www.moonshotscapital.com/portfolio/threatcare/', 'https://parkway.vc/portfolio/sandbox-aq', 'https://www.137ventures.com/portfolio/workrise', 'https://www.wocstar.com/portfolio/project-one-ephnc-ge944', 'http://www.mercatopartners.com/portfolio/beam-benefits', 'http://www.heavybit.com/portfolio/runscope', 'https://tidemarkcap.com/portfolio/karbon', 'http://www.ethos.vc/portfolio/fantasmo', 'http://www.contrary.com/companies/anduril', 'https://www.levelonefund.com/portfolio/genies/', 'https://OSS.Capital/portfolio/spacedrive', 'https://www.pappas-capital.com/portfolio/bioatla/', 'https://www.truebeautyventures.com/portfolio/cay-skin', 'https://energytransitionventures.com/portfolio/dandelion-energy-launches-worlds-most-efficient-geothermal-heat-pump-nationwide/', 'http://www.ewhealthcare.com/portfolio/detail/velcera_inc', 'https://counterpart.vc/portfolio/oxide/', 'https://www.sequoiacap.com/companies/stripe/', 'http://www.techoperators.com/portfolio/scytale', 'http://www.techsquareventures.com/portfolio/privacy-policy', 'https://beliade.com/portfolio/ceremonia', 'https://gsquared.com/portfolio/meituan-dianping/', 'https://www.beechwoodcap.com/portfolio/shani-darden-skincare/', 'https://flyerone.vc/portfolio/competera', 'http://www.nextfrontiercapital.com/portfolio/pitch-us', 'https://www.paladincapgroup.com/portfolio/crossbow/', 'http://www.indexventures.com/companies/clumio/', 'http://www.camdenpartners.com/portfolio/medplus-inc', 'http://www.parafi.capital/portfolio/privacy-notice', 'http://www.scoutventures.com/companies/gelsight', 'https://www.ylventures.com/portfolio/hexadite/', 'http://www.blackbird.vc/portfolio/gilmour-space-technologies', 'http://www.translinkcapital.com/portfolio/klaytn', 'https://www.morgenthaler.com/information-technology/portfolio/software-services/', 'http://www.expertdojo.com/portfolio/www.mogiio.com', 'https://www.7wireventures.com/portfolio/caraway/', 'http://www.beringea.com/portfolio/atlas', 'https://www.fintopcapital.com/portfolio/qohash', 'https://www.silversmith.com/portfolio/mediquant', 'https://www.salesforce.com/company/sustainability/', 'http://www.emcap.com/portfolio/ironclad', 'https://elsewhere.partners/portfolio/upland', 'https://www.8vc.com/companies/branch', 'http://www.buildingventures.com/companies/join-digital/', 'http://www.meritechcapital.com/companies/category/healthcare', 'https://www.edisonpartners.com/portfolio/fingercheck', 'http://www.ascentvp.com/portfolio/sensitech/', 'http://matchstickventures.com/companies/two-boxes', 'http://www.vertexventures.com/portfolio/ambi-robotics/', 'http://www.e14fund.com/companies/payflow-digital', 'http://www.canaan.com/companies/alterego-networks', 'https://www.moltenventures.com/portfolio/focalpoint', 'http://www.armorysv.com/companies/qualifi', 'http://www.bfgpartners.com/portfolio/about', 'https://elevate.vc/portfolio/onboard-dynamics/', 'https://psl.com/companies/dropzone-ai', 'http://www.keiretsuforum.com/portfolio/www.exergyn.com', 'http://www.montageventures.com/companies/carefull', 'https://nrgvc.com/portfolio/inspace-1/', 'https://www.lrvhealth.com/portfolio/intelycare/', 'https://www.dallasvc.com/portfolio/blusapphire', 'https://emerging.vc/portfolio/kanari-ai', 'http://www.signalfire.com/portfolio/motion', 'http://www.wing.vc/companies/cumulus-networks', 'https://www.automotiveventures.com/portfolio/robotire', 'http://www.iacapgroup.com/portfolio/thezebra', 'http://dormroomfund.com/companies/www.sunrisehealth.co', 'http://www.differential.vc/portfolio/category/Acquired', 'https://www.agfunder.com/portfolio/Supplant/', 'http://p5hv.com/portfolio/cohero-health/', 'http://www.courtsidevc.com/portfolio/tap', 'http://www.leadedge.com/portfolio/nucleus/', 'https://unreasonablecapital.com/portfolio/o-list/', 'http://www.linkventures.com/portfolio/fountai-co', 'http://www.capitalg.com/portfolio/multiplan/', 'https://www.cotacapital.com/companies/orchestro-ai/', 'https://www.acm.com/portfolio/networking.html', 'https://www.406ventures.com/portfolio/cloudhealth_technologies', 'http://www.cataliocapital.com/portfolio/insightec', 'http://www.GrandBanksCapital.com/portfolio/software-and-services/', 'http://www.craftventures.com/portfolio/replit', 'https://www.flagshippioneering.com/companies/moderna', 'https://www.questvp.com/portfolio/dogvacay/', 'http://www.exeloncorp.com/companies/peco', 'http://www.mosaikpartners.com/companies/kor', 'http://www.crimsonseedcapital.com/portfolio/crashed-and-burned/', 'https://www.panache.vc/portfolio/dfuse-now-streaming-fast', 'https://goodai.capital/portfolio/portfolio', 'https://www.docusign.com/company/modern-slavery-act-statement', 'http://www.crv.com/companies/3t-biosciences', 'http://www.corevc.com/portfolio/impact-articles', 'https://www.progression.fund/companies/wavexr', 'http://www.equal.vc/portfolio/bikky', 'https://golden.ventures/portfolio/applyboard', 'http://www.bonfirevc.com/companies/archer-education', 'https://www.siliconbadia.com/portfolio/transcriptic/', 'https://www.volitioncapital.com/portfolio/automatiq/', 'http://www.streamlined.vc/companies/ipo', 'http://www.capitalfactory.com/portfolio/hawkdefense.com', 'http://www.interplay.vc/portfolio/acquire', 'https://www.wrvcapital.com/portfolio/healofy', 'http://www.xg-ventures.com/portfolio/exited/', 'https://www.bluestartups.com/portfolio/biteslice/', 'https://www.cervin.com/portfolio/celona', 'http://www.type1ventures.com/portfolio/space-forge', 'http://www.ivp.com/portfolio/lyra-health/', 'http://www.nfx.com/companies/proptech', 'http://www.flybridge.com/portfolio/www.dataxu.com', 'http://www.luxcapital.com/companies/auris-health', 'https://riceparkcapital.com/portfolio/blue-water/', 'https://www.uncommonvc.com/portfolio/dollar-shave-club/', 'https://www.arboretumvc.com/portfolio/convergent-dental/', 'https://www.floridafunders.com/portfolio/enrichly/', 'https://www.yashgodiwala.com/portfolio/Portfolio', 'https://www.anzupartners.com/portfolio/south-8-technologies/', 'https://higgrowth.com/portfolio/avi-spl/', 'http://www.gilead.com/company/board-of-directors/jacqueline-barton', 'https://www.freshtrackscap.com/portfolio/suncommon/', 'http://www.varanacapital.com/portfolio/portfolio', 'https://www.scalevp.com/portfolio/agari/', 'https://www.wavemaker360.com/portfolio/marigold-health', 'http://www.wndrco.com/portfolio/airtable', 'https://www.amfamventures.com/portfolio/hover/', 'https://www.augustcap.com/portfolio/active-funds/', 'https://www.founderscircle.com/companies/', 'http://www.alter.vc/portfolio/portfolio/cities/lahore', 'https://www.preludeventures.com/portfolio/sense', 'http://www.deltavcapital.com/portfolio/chownow', 'https://www.sageviewcapital.com/portfolio/loanstar/', 'http://www.headline.com/portfolio/pismo', 'https://twobearcapital.com/portfolio/fyr-diagnostics', 'http://www.scv.vc/portfolio/portfolio/', 'https://curate.capital/portfolio/to-the-market', 'https://www.clear-sky.com/portfolio/systems-control/', 'https://www.khoslaventures.com/portfolio/stripe/', 'http://www.kickstartfund.com/portfolio/keap', 'http://hyperplane.vc/companies/nwo.ai', 'http://www.qedinvestors.com/companies/aplazo', 'https://www.trinityventures.com/portfolio/property-capsule', 'https://www.heartlandvc.com/portfolio/strongarm-tech/', 'https://raphacap.com/portfolio/controlrad-inc/', 'http://www.cowboy.vc/portfolio/uplimit', 'https://www.atoneventures.com/portfolio/ascend-elements', 'https://ventures.rga.com/portfolio/freewire/', 'http://www.bullpencap.com/companies/enterprise/discover-more', 'http://www.inspiredcapital.com/companies/finix', 'http://www.nea.com/portfolio/patreon', 'http://www.rre.com/portfolio/rubric', 'https://www.orbimed.com/portfolio/', 'https://smartfinvc.com/portfolio/divitel/', 'https://www.ascension.vc/portfolio/qur8/', 'https://www.oxx.vc/portfolio/kodiak-hub/', 'http://www.eternacapital.com/portfolio/legal/terms-and-conditions', 'http://www.true.global/portfolio/mishipay/', 'https://openocean.vc/portfolio/oppex', 'http://www.dawncapital.com/portfolio/privacy-policy', 'http://www.connectventures.co/companies/colossal', 'https://www.conceptventures.vc/portfolio/chatterbox', 'https://www.activantcapital.com/companies/deuna', 'https://seraphim.vc/portfolio/astrosale/', 'https://playfair.vc/companies/approach.php', 'http://www.blossomcap.com/portfolio/theydo', 'https://rlc.ventures/portfolio/gendo', 'http://www.localglobe.vc/localglobe/companies/travelperk', 'https://notion.vc/portfolio/shutl', 'https://www.dcvc.com/companies/dronedeploy', 'https://www.mourocapital.com/portfolio/clikalia/', 'https://www.fabric.vc/portfolio/ntropy-network', 'https://craftventures.com/portfolio/cloud9', 'http://streamlined.vc/companies/ipo', 'https://www.ahreninnovationcapital.com/companies/bitfount/', 'https://twosigmaventures.com/portfolio/company/glide/', 'https://avalanche.vc/portfolio/boundless-life', 'http://www.406ventures.com/portfolio/ableto', 'http://wing.vc/companies/deepsight', 'https://www.7pc.vc/portfolio/volta', 'https://www.celesta.vc/portfolio/crescendo', 'https://cake.vc/companies/guaranteed', 'http://www.draper.vc/companies/cytotronics', 'https://headline.com/portfolio/honeycomb', 'https://www.scout.vc/companies/encharge-ai', 'https://flourishventures.com/portfolio/insurtech/', 'https://alleycorp.com/companies/stepful/', 'https://type1ventures.com/portfolio/active-surfaces', 'https://www.heavybit.com/portfolio/mobot', 'https://www.preludeventures.com/portfolio/sense', 'https://buildingventures.com/companies/blokable/', 'https://www.aera.vc/portfolio/climate/', 'http://goldengate.vc/portfolio/ninjavan', 'https://crossbeam.vc/portfolio/common-trust', 'https://konvoy.vc/portfolio/pok-pok', 'https://femalefoundersfund.com/portfolio/entrypoint/', 'https://beepartners.vc/portfolio/tensorstax', 'https://osageventurepartners.com/portfolio/rackware/', 'https://script.capital/portfolio/sqreen/', 'https://northzone.com/portfolio/sellersfunding/', 'https://btn.vc/portfolio/hivewealth-2-2/', 'https://www.wavemaker360.com/portfolio/marigold-health', 'https://www.wndrco.com/portfolio/aura', 'https://www.bonfirevc.com/companies/boulevard', 'https://www.equal.vc/portfolio/ghost', 'https://dynamo.vc/portfolio/seeva', 'https://amplify.la/portfolio/upwards/', 'https://www.flexport.com/company/global-network/', 'https://www.ivp.com/portfolio/dataai/', 'https://www.matchstick.vc/companies/optera', 'https://www.longtermimpact.fund/companies/hilight', 'https://www.nextfrontiercapital.com/portfolio/about', 'https://newmarketsvp.com/portfolio/datapeople/', 'https://www.paleblue.vc/portfolio/phytoform', 'https://www.sequoiacap.com/companies/stripe/', 'http://longevity.vc/portfolio/portfolio', 'https://vvus.com/portfolio/Vividly/', 'https://www.luxcapital.com/companies/chronosphere', 'https://www.ylventures.com/portfolio/hexadite/', 'http://www.8vc.com/companies/epirus', 'https://www.worldfund.vc/portfolio/sunroof', 'https://aifund.ai/portfolio/jivi-ai/', 'https://www.cervin.com/portfolio/celona', 'https://www.dimensioncap.com/portfolio/kaleidoscope-bio', 'https://embedded.capital/portfolio/wilshire', 'https://elevate.vc/portfolio/onboard-dynamics/', 'https://www.exceptionalcap.com/portfolio/portfolio/lumu', 'https://kokopelli.vc/portfolio/comsero/', 'http://kickstartfund.com/portfolio/peoplekeep', 'http://agfunder.com/portfolio/eion/', 'https://partechpartners.com/companies/brevo', 'https://bigideaventures.com/portfolio/the-frauxmagerie/', 'https://www.1011vc.com/portfolio/axis-security/', 'https://straydogcapital.com/portfolio/4ag/', 'https://wavemaker.vc/portfolio/portfolio-location-pods-wavemaker-portfolio-headquarter-hong-kong/']
-    llm_client = get_llm('openai')
+def save_stage(job: CrawlJob, writer: Optional[RecordWriter] = None, state: Optional[StateStore] = None) -> CrawlJob:
+    # save to csv, or hand over to the writer thread
+    with metrics.timer("save"):
+        if writer is not None:
+            writer.put(job.company)
+        else:
+            save_to_csv(job.company, job.output_filename)
+        # a carried record keeps the fingerprint it was extracted from, so slow drift still shows up
+        if state is not None and job.fingerprint is not None and not job.carried:
+            state.remember(job.url, job.fingerprint, job.company.model_dump_json())
+    # end-to-end latency of a url, queueing included
+    metrics.observe("url_seconds", time.perf_counter() - job.started)
+    logger.info(f"Successfully processed: {job.url}")
+    return job
+
+def process_company(url: str, llm_client, output_filename="output.csv", token_budget: Optional[int] = None):
+    job = CrawlJob(url, output_filename, token_budget)
+    for step in (fetch_stage, extract_stage, partial(llm_stage, llm_client=llm_client), validate_stage, save_stage):
+        job = step(job)
+        if job is None:
+            return
+
+def _pending(urls: Iterable[str], state: Optional[StateStore], resume: bool) -> Iterable[str]:
+    skipped = 0
     for url in urls:
-        process_company(url, llm_client)
-        time.sleep(1)
+        if state is not None:
+            if resume and state.should_skip(url):
+                skipped += 1
+                continue
+            state.start(url)
+        yield url
+    if skipped:
+        logger.info(f"Resumed run skipped {skipped} urls finished earlier")
+
+@dataclass
+class CrawlOptions:
+    """How crawl() runs its pipeline"""
+    fetch_workers: int = 16
+    extract_workers: int = 2
+    llm_workers: int = 4
+    llm_batch_size: int = 1  # pages per LLM request
+    ordered: bool = True  # rows in input order, the file a sequential run writes
+    token_budget: Optional[int] = None  # page content is cut to this many tokens, see reduce.py
+    output_format: Optional[str] = None  # csv, jsonl or parquet, by default from the file extension
+    parse_processes: int = 0  # parse pages of parse_min_size characters or more in this many processes
+    parse_min_size: int = DEFAULT_MIN_SIZE
+    rules: bool = True  # fields from the page's JSON-LD and OpenGraph tags first, see rules.py
+    resume: bool = False  # skip urls an earlier run with the same StateStore finished
+    incremental: bool = False  # reuse the record of pages within change_threshold SimHash bits of their last crawl
+    change_threshold: int = DEFAULT_MAX_DISTANCE
+    metrics_path: Optional[str] = None  # run report in JSON, see metrics.py
+
+def crawl(urls: Iterable[str], llm_client, output_filename="output.csv", options: Optional[CrawlOptions] = None,
+          state: Optional[StateStore] = None, url_index: Optional[UrlIndex] = None, gate: Optional[PageGate] = None,
+          sink=None, on_dropped: Optional[Callable[[CrawlJob, str, bool], None]] = None) -> List[StageStats]:
+    """
+    Runs process_company over many urls with fetching, parsing and LLM calls overlapping.
+    Rows go through a single RecordWriter, or sink if given, e.g. a workqueue.QueueWorker.
+    A StateStore records every url's progress and the record of every page, the UrlIndex
+    that deduplicated urls also drops pages redirecting to one already in the crawl, and a
+    PageGate drops pages unlikely to be about a company. on_dropped is called with every
+    job that fails, the stage it failed in and whether that stage raised.
+    """
+    options = options or CrawlOptions()
+    if options.incremental and state is None:
+        raise ValueError("An incremental crawl needs the StateStore of earlier runs")
+    metrics.reset()
+    offload = None
+    extract_workers = options.extract_workers
+    if options.parse_processes:
+        offload = ProcessOffload(extract_html, options.parse_processes, options.parse_min_size,
+                                 initializer=configure_parser, initargs=(current_parser(),))
+        extract_workers = max(extract_workers, offload.processes)
+    if options.llm_batch_size > 1:
+        llm = Stage("llm", partial(llm_batch_stage, llm_client=llm_client), options.llm_workers,
+                    queue_size=2 * options.llm_workers * options.llm_batch_size, batch_size=options.llm_batch_size)
+    else:
+        llm = Stage("llm", partial(llm_stage, llm_client=llm_client), options.llm_workers)
+    stages = [
+        Stage("fetch", partial(fetch_stage, url_index=url_index), options.fetch_workers),
+        Stage("extract", partial(extract_stage, offload=offload, rules=options.rules), extract_workers),
+        llm,
+        Stage("validate", partial(validate_stage, gate=gate), 1),
+        Stage("save", save_stage, 1),
+    ]
+    if gate is not None:
+        on_skip = None
+        if on_dropped is not None:
+            # urls the gate drops never reach the pipeline, but they are finished all the same
+            on_skip = lambda url, reason: on_dropped(CrawlJob(url, output_filename, skipped=reason), "gate", False)
+        urls = gate.filter_urls(urls, on_skip=on_skip)
+        if gate.classifier is not None:
+            stages.insert(2, Stage("classify", partial(classify_stage, gate=gate), 1))
+    if state is not None:
+        stages.insert(2, Stage("fingerprint", partial(fingerprint_stage, state=state, incremental=options.incremental,
+                                                      max_distance=options.change_threshold), extract_workers))
+
+    # urls only count as done once the writer has their row in the file
+    on_written = state.done if state is not None else None
+    try:
+        if sink is not None:
+            sink.on_written = on_written
+        with sink or RecordWriter(output_filename, options.output_format, on_written=on_written) as writer:
+            stages[-1].func = partial(save_stage, writer=writer, state=state)
+            if state is not None:
+                for stage in stages[:-1]:
+                    stage.func = state.track(stage.name, stage.func, key=attrgetter("url"),
+                                             batched=stage.batch_size > 1)
+            jobs = (CrawlJob(url, output_filename, options.token_budget)
+                    for url in _pending(urls, state, options.resume))
+            stats = Pipeline(stages, ordered=options.ordered, on_drop=on_dropped).run(jobs)
+    finally:
+        if offload is not None:
+            offload.close()
+    if state is not None:
+        logger.info(f"Crawl state: {state.summary()}")
+    if isinstance(llm_client, CachedLLM):
+        logger.info(f"LLM cache: {llm_client.cache.stats()}")
+    router = llm_client.llm if isinstance(llm_client, CachedLLM) else llm_client
+    if isinstance(router, LLMRouter):
+        logger.info(f"LLM routing: {router.report()}")
+    parse_stats = getattr(llm_client, "parse_stats", None)
+    if parse_stats is not None:
+        logger.info(f"LLM output parsing: {parse_stats.stats()}")
+    if url_index is not None:
+        logger.info(f"URL index: {url_index.report()}")
+    if gate is not None:
+        logger.info(f"Page gate: {gate.report(companies=stats[-1].processed)}")
+    if options.incremental:
+        results = {counter["labels"]["result"]: counter["value"] for counter in metrics.summary()["counters"]
+                   if counter["name"] == "incremental_pages_total"}
+        logger.info(f"Incremental crawl, pages by change since their last extraction: {results}")
+    if options.rules:
+        results = {counter["labels"]["result"]: counter["value"] for counter in metrics.summary()["counters"]
+                   if counter["name"] == "rules_pages_total"}
+        logger.info(f"Rule-based extraction, pages by fields found without the LLM: {results}")
+    if options.metrics_path:
+        busiest = max(stats, key=attrgetter("utilization"))
+        metrics.write_summary(options.metrics_path, stages=[stage.as_dict() for stage in stats],
+                              bottleneck=busiest.name,
+                              llm_output=parse_stats.stats() if parse_stats is not None else None)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Extract startup company info from VC portfolio pages")
+    parser.add_argument("inputs", nargs="*",
+                        help="CSV, JSON Lines or text files with urls, - for stdin (default: stdin if piped, "
+                             "else the built-in list)")
+    parser.add_argument("--column", help="CSV column or JSON key holding the url (default: url, startup, ...)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl", "txt"], help="override the format guessed from the extension")
+    parser.add_argument("--dedup", choices=["set", "bloom"], default="set",
+                        help="how repeated urls are detected; bloom uses fixed memory for huge inputs")
+    parser.add_argument("--url-index", default=os.getenv("URL_INDEX_PATH", DEFAULT_INDEX_PATH),
+                        help="SQLite file shared with scripts/ mapping near-duplicate urls and redirects to one page")
+    parser.add_argument("--discover", action="store_true",
+                        help="inputs are VC websites or portfolio listings: crawl the company pages found on them")
+    parser.add_argument("--discover-max-pages", type=int, default=DEFAULT_MAX_PAGES,
+                        help="listing pages fetched per VC when discovering, pagination included")
+    parser.add_argument("-o", "--output", default="output.csv", help="output file")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="output format (default: from the extension)")
+    parser.add_argument("--provider", default="openai",
+                        help=f"LLM provider: {', '.join(PROVIDERS)} or any name with <NAME>_BASE_URL set; "
+                             "several separated by commas share the load, e.g. openai,llamacpp")
+    parser.add_argument("--parser", choices=sorted(BACKENDS), help="HTML parser backend (default: HTML_PARSER or stdlib)")
+    parser.add_argument("--fetch-workers", type=int, default=16)
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--llm-batch-size", type=int, default=1, help="pages sent to the LLM per request")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="parse pages in this many processes, -1 for one per core (default: in threads)")
+    parser.add_argument("--parse-min-size", type=int, default=DEFAULT_MIN_SIZE,
+                        help="pages smaller than this many characters are parsed in-process")
+    parser.add_argument("--no-structured-output", action="store_true",
+                        help="don't constrain answers to the JSON schema, for servers without response_format support")
+    parser.add_argument("--token-budget", type=int, help="trim page content to this many tokens before the LLM call")
+    parser.add_argument("--per-host", type=int, default=2, help="concurrent requests per website")
+    parser.add_argument("--max-page-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                        help="stop downloading a page after this many bytes")
+    parser.add_argument("--host-rate", type=float, default=1.0, help="requests per second per website")
+    parser.add_argument("--http-cache", default=os.getenv("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR), help="HTTP cache directory")
+    parser.add_argument("--http-cache-ttl", type=float, default=float(os.getenv("HTTP_CACHE_TTL", DEFAULT_TTL)),
+                        help="seconds before a cached page is revalidated")
+    parser.add_argument("--no-http-cache", action="store_true")
+    parser.add_argument("--llm-cache", help="LLM response cache file (default: LLM_CACHE_PATH)")
+    parser.add_argument("--no-llm-cache", action="store_true")
+    parser.add_argument("--gate-model", default=os.getenv("PAGE_CLASSIFIER_PATH", DEFAULT_MODEL_PATH),
+                        help="page classifier trained with classifier.py; without it only urls are checked")
+    parser.add_argument("--gate-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="pages the classifier rates less likely than this to be a company page skip the LLM")
+    parser.add_argument("--no-gate", action="store_true", help="send every page to the LLM")
+    parser.add_argument("--metrics", default="crawl_metrics.json", help="JSON run report of latencies, counts and errors")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port during the crawl")
+    parser.add_argument("--state", default="crawl_state.db", help="SQLite file recording the progress of every url")
+    parser.add_argument("--resume", action="store_true", help="skip urls completed by an earlier run, retry failures")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only send pages that changed since their last extraction (per --state) to the LLM, "
+                             "write the earlier records of the others again")
+    parser.add_argument("--change-threshold", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="SimHash bits (of 64) a page may differ by and still count as unchanged")
+    parser.add_argument("--no-rules", action="store_true",
+                        help="don't take company fields from the page's JSON-LD, OpenGraph tags and links, "
+                             "ask the LLM for all of them")
+    parser.add_argument("--queue", help="work queue shared by crawler processes, a SQLite file or redis:// url: "
+                                        "inputs are added to it, and workers write their records to it")
+    parser.add_argument("--worker", action="store_true",
+                        help="crawl urls taken from --queue until it is empty (export the records with workqueue.py)")
+    parser.add_argument("--lease-timeout", type=float, default=DEFAULT_VISIBILITY,
+                        help="seconds before a url leased by a worker that stopped responding goes to another worker")
+    args = parser.parse_args(argv)
+    if args.worker and not args.queue:
+        parser.error("--worker needs a --queue to take urls from")
+
+    inputs = args.inputs or (["-"] if not sys.stdin.isatty() else [])
+    if inputs:
+        urls = read_urls(inputs, args.column, args.input_format)
+    elif args.queue:
+        urls = []
+    else:
+        urls = ["https://www.nvfund.com/portfolio/anokion"]
+        #urls = ['https://www.foresitecapital.com/portfolio/myome-inc/', 'http://www.socialstarts.com/portfolio/everymove.org', 'https://www.1011vc.com/portfolio/axis-security/', 'http://www.wrvi.vc/portfolio/mojo-networks', 'https://www.kaporcapital.com/portfolio/adeptid/', 'http://www.TEXOventures.com/portfolio/www.sensentia.com', 'http://www.thirdpointventures.com/companies/kumu-networks', 'https://www.silvertonpartners.com/portfolio/vtel/', 'http://tenoneten.net/portfolio/locu', 'https://ardent.vc/portfolio/ecue', 'http://www.nvc.vc/portfolio/human-interest', 'https://www.momentventures.com/portfolio/stylar/', 'http://www.congruentvc.com/portfolio/Thrilling', 'http://www.alsop-louie.com/portfolio/socialcam', 'https://www.synventures.com/portfolio/revic/', 'http://www.maveron.com/portfolio/two-chairs', 'http://www.hwvp.com/companies/aria-systems', 'http://www.pivotinvestment.com/companies/card-com', 'http://www.starvestpartners.com/portfolio/portfolio', 'https://www.usvp.com/portfolio/nuance-communications-nuan/', 'http://www.aperturevp.com/portfolio/www.endotronix.com', 'https://www.cambridgespg.com/portfolio/lifeaid/', 'http://www.valorcapitalgroup.com/portfolio/companies', 'https://www.lyticalventures.com/companies/wand.ai', 'https://www.moonshotscapital.com/portfolio/threatcare/', 'https://parkway.vc/portfolio/sandbox-aq', 'https://www.137ventures.com/portfolio/workrise', 'https://www.wocstar.com/portfolio/project-one-ephnc-ge944', 'http://www.mercatopartners.com/portfolio/beam-benefits', 'http://www.heavybit.com/portfolio/runscope', 'https://tidemarkcap.com/portfolio/karbon', 'http://www.ethos.vc/portfolio/fantasmo', 'http://www.contrary.com/companies/anduril', 'https://www.levelonefund.com/portfolio/genies/', 'https://OSS.Capital/portfolio/spacedrive', 'https://www.pappas-capital.com/portfolio/bioatla/', 'https://www.truebeautyventures.com/portfolio/cay-skin', 'https://energytransitionventures.com/portfolio/dandelion-energy-launches-worlds-most-efficient-geothermal-heat-pump-nationwide/', 'http://www.ewhealthcare.com/portfolio/detail/velcera_inc', 'https://counterpart.vc/portfolio/oxide/', 'https://www.sequoiacap.com/companies/stripe/', 'http://www.techoperators.com/portfolio/scytale', 'http://www.techsquareventures.com/portfolio/privacy-policy', 'https://beliade.com/portfolio/ceremonia', 'https://gsquared.com/portfolio/meituan-dianping/', 'https://www.beechwoodcap.com/portfolio/shani-darden-skincare/', 'https://flyerone.vc/portfolio/competera', 'http://www.nextfrontiercapital.com/portfolio/pitch-us', 'https://www.paladincapgroup.com/portfolio/crossbow/', 'http://www.indexventures.com/companies/clumio/', 'http://www.camdenpartners.com/portfolio/medplus-inc', 'http://www.parafi.capital/portfolio/privacy-notice', 'http://www.scoutventures.com/companies/gelsight', 'https://www.ylventures.com/portfolio/hexadite/', 'http://www.blackbird.vc/portfolio/gilmour-space-technologies', 'http://www.translinkcapital.com/portfolio/klaytn', 'https://www.morgenthaler.com/information-technology/portfolio/software-services/', 'http://www.expertdojo.com/portfolio/www.mogiio.com', 'https://www.7wireventures.com/portfolio/caraway/', 'http://www.beringea.com/portfolio/atlas', 'https://www.fintopcapital.com/portfolio/qohash', 'https://www.silversmith.com/portfolio/mediquant', 'https://www.salesforce.com/company/sustainability/', 'http://www.emcap.com/portfolio/ironclad', 'https://elsewhere.partners/portfolio/upland', 'https://www.8vc.com/companies/branch', 'http://www.buildingventures.com/companies/join-digital/', 'http://www.meritechcapital.com/companies/category/healthcare', 'https://www.edisonpartners.com/portfolio/fingercheck', 'http://www.ascentvp.com/portfolio/sensitech/', 'http://matchstickventures.com/companies/two-boxes', 'http://www.vertexventures.com/portfolio/ambi-robotics/', 'http://www.e14fund.com/companies/payflow-digital', 'http://www.canaan.com/companies/alterego-networks', 'https://www.moltenventures.com/portfolio/focalpoint', 'http://www.armorysv.com/companies/qualifi', 'http://www.bfgpartners.com/portfolio/about', 'https://elevate.vc/portfolio/onboard-dynamics/', 'https://psl.com/companies/dropzone-ai', 'http://www.keiretsuforum.com/portfolio/www.exergyn.com', 'http://www.montageventures.com/companies/carefull', 'https://nrgvc.com/portfolio/inspace-1/', 'https://www.lrvhealth.com/portfolio/intelycare/', 'https://www.dallasvc.com/portfolio/blusapphire', 'https://emerging.vc/portfolio/kanari-ai', 'http://www.signalfire.com/portfolio/motion', 'http://www.wing.vc/companies/cumulus-networks', 'https://www.automotiveventures.com/portfolio/robotire', 'http://www.iacapgroup.com/portfolio/thezebra', 'http://dormroomfund.com/companies/www.sunrisehealth.co', 'http://www.differential.vc/portfolio/category/Acquired', 'https://www.agfunder.com/portfolio/Supplant/', 'http://p5hv.com/portfolio/cohero-health/', 'http://www.courtsidevc.com/portfolio/tap', 'http://www.leadedge.com/portfolio/nucleus/', 'https://unreasonablecapital.com/portfolio/o-list/', 'http://www.linkventures.com/portfolio/fountai-co', 'http://www.capitalg.com/portfolio/multiplan/', 'https://www.cotacapital.com/companies/orchestro-ai/', 'https://www.acm.com/portfolio/networking.html', 'https://www.406ventures.com/portfolio/cloudhealth_technologies', 'http://www.cataliocapital.com/portfolio/insightec', 'http://www.GrandBanksCapital.com/portfolio/software-and-services/', 'http://www.craftventures.com/portfolio/replit', 'https://www.flagshippioneering.com/companies/moderna', 'https://www.questvp.com/portfolio/dogvacay/', 'http://www.exeloncorp.com/companies/peco', 'http://www.mosaikpartners.com/companies/kor', 'http://www.crimsonseedcapital.com/portfolio/crashed-and-burned/', 'https://www.panache.vc/portfolio/dfuse-now-streaming-fast', 'https://goodai.capital/portfolio/portfolio', 'https://www.docusign.com/company/modern-slavery-act-statement', 'http://www.crv.com/companies/3t-biosciences', 'http://www.corevc.com/portfolio/impact-articles', 'https://www.progression.fund/companies/wavexr', 'http://www.equal.vc/portfolio/bikky', 'https://golden.ventures/portfolio/applyboard', 'http://www.bonfirevc.com/companies/archer-education', 'https://www.siliconbadia.com/portfolio/transcriptic/', 'https://www.volitioncapital.com/portfolio/automatiq/', 'http://www.streamlined.vc/companies/ipo', 'http://www.capitalfactory.com/portfolio/hawkdefense.com', 'http://www.interplay.vc/portfolio/acquire', 'https://www.wrvcapital.com/portfolio/healofy', 'http://www.xg-ventures.com/portfolio/exited/', 'https://www.bluestartups.com/portfolio/biteslice/', 'https://www.cervin.com/portfolio/celona', 'http://www.type1ventures.com/portfolio/space-forge', 'http://www.ivp.com/portfolio/lyra-health/', 'http://www.nfx.com/companies/proptech', 'http://www.flybridge.com/portfolio/www.dataxu.com', 'http://www.luxcapital.com/companies/auris-health', 'https://riceparkcapital.com/portfolio/blue-water/', 'https://www.uncommonvc.com/portfolio/dollar-shave-club/', 'https://www.arboretumvc.com/portfolio/convergent-dental/', 'https://www.floridafunders.com/portfolio/enrichly/', 'https://www.yashgodiwala.com/portfolio/Portfolio', 'https://www.anzupartners.com/portfolio/south-8-technologies/', 'https://higgrowth.com/portfolio/avi-spl/', 'http://www.gilead.com/company/board-of-directors/jacqueline-barton', 'https://www.freshtrackscap.com/portfolio/suncommon/', 'http://www.varanacapital.com/portfolio/portfolio', 'https://www.scalevp.com/portfolio/agari/', 'https://www.wavemaker360.com/portfolio/marigold-health', 'http://www.wndrco.com/portfolio/airtable', 'https://www.amfamventures.com/portfolio/hover/', 'https://www.augustcap.com/portfolio/active-funds/', 'https://www.founderscircle.com/companies/', 'http://www.alter.vc/portfolio/portfolio/cities/lahore', 'https://www.preludeventures.com/portfolio/sense', 'http://www.deltavcapital.com/portfolio/chownow', 'https://www.sageviewcapital.com/portfolio/loanstar/', 'http://www.headline.com/portfolio/pismo', 'https://twobearcapital.com/portfolio/fyr-diagnostics', 'http://www.scv.vc/portfolio/portfolio/', 'https://curate.capital/portfolio/to-the-market', 'https://www.clear-sky.com/portfolio/systems-control/', 'https://www.khoslaventures.com/portfolio/stripe/', 'http://www.kickstartfund.com/portfolio/keap', 'http://hyperplane.vc/companies/nwo.ai', 'http://www.qedinvestors.com/companies/aplazo', 'https://www.trinityventures.com/portfolio/property-capsule', 'https://www.heartlandvc.com/portfolio/strongarm-tech/', 'https://raphacap.com/portfolio/controlrad-inc/', 'http://www.cowboy.vc/portfolio/uplimit', 'https://www.atoneventures.com/portfolio/ascend-elements', 'https://ventures.rga.com/portfolio/freewire/', 'http://www.bullpencap.com/companies/enterprise/discover-more', 'http://www.inspiredcapital.com/companies/finix', 'http://www.nea.com/portfolio/patreon', 'http://www.rre.com/portfolio/rubric', 'https://www.orbimed.com/portfolio/', 'https://smartfinvc.com/portfolio/divitel/', 'https://www.ascension.vc/portfolio/qur8/', 'https://www.oxx.vc/portfolio/kodiak-hub/', 'http://www.eternacapital.com/portfolio/legal/terms-and-conditions', 'http://www.true.global/portfolio/mishipay/', 'https://openocean.vc/portfolio/oppex', 'http://www.dawncapital.com/portfolio/privacy-policy', 'http://www.connectventures.co/companies/colossal', 'https://www.conceptventures.vc/portfolio/chatterbox', 'https://www.activantcapital.com/companies/deuna', 'https://seraphim.vc/portfolio/astrosale/', 'https://playfair.vc/companies/approach.php', 'http://www.blossomcap.com/portfolio/theydo', 'https://rlc.ventures/portfolio/gendo', 'http://www.localglobe.vc/localglobe/companies/travelperk', 'https://notion.vc/portfolio/shutl', 'https://www.dcvc.com/companies/dronedeploy', 'https://www.mourocapital.com/portfolio/clikalia/', 'https://www.fabric.vc/portfolio/ntropy-network', 'https://craftventures.com/portfolio/cloud9', 'http://streamlined.vc/companies/ipo', 'https://www.ahreninnovationcapital.com/companies/bitfount/', 'https://twosigmaventures.com/portfolio/company/glide/', 'https://avalanche.vc/portfolio/boundless-life', 'http://www.406ventures.com/portfolio/ableto', 'http://wing.vc/companies/deepsight', 'https://www.7pc.vc/portfolio/volta', 'https://www.celesta.vc/portfolio/crescendo', 'https://cake.vc/companies/guaranteed', 'http://www.draper.vc/companies/cytotronics', 'https://headline.com/portfolio/honeycomb', 'https://www.scout.vc/companies/encharge-ai', 'https://flourishventures.com/portfolio/insurtech/', 'https://alleycorp.com/companies/stepful/', 'https://type1ventures.com/portfolio/active-surfaces', 'https://www.heavybit.com/portfolio/mobot', 'https://www.preludeventures.com/portfolio/sense', 'https://buildingventures.com/companies/blokable/', 'https://www.aera.vc/portfolio/climate/', 'http://goldengate.vc/portfolio/ninjavan', 'https://crossbeam.vc/portfolio/common-trust', 'https://konvoy.vc/portfolio/pok-pok', 'https://femalefoundersfund.com/portfolio/entrypoint/', 'https://beepartners.vc/portfolio/tensorstax', 'https://osageventurepartners.com/portfolio/rackware/', 'https://script.capital/portfolio/sqreen/', 'https://northzone.com/portfolio/sellersfunding/', 'https://btn.vc/portfolio/hivewealth-2-2/', 'https://www.wavemaker360.com/portfolio/marigold-health', 'https://www.wndrco.com/portfolio/aura', 'https://www.bonfirevc.com/companies/boulevard', 'https://www.equal.vc/portfolio/ghost', 'https://dynamo.vc/portfolio/seeva', 'https://amplify.la/portfolio/upwards/', 'https://www.flexport.com/company/global-network/', 'https://www.ivp.com/portfolio/dataai/', 'https://www.matchstick.vc/companies/optera', 'https://www.longtermimpact.fund/companies/hilight', 'https://www.nextfrontiercapital.com/portfolio/about', 'https://newmarketsvp.com/portfolio/datapeople/', 'https://www.paleblue.vc/portfolio/phytoform', 'https://www.sequoiacap.com/companies/stripe/', 'http://longevity.vc/portfolio/portfolio', 'https://vvus.com/portfolio/Vividly/', 'https://www.luxcapital.com/companies/chronosphere', 'https://www.ylventures.com/portfolio/hexadite/', 'http://www.8vc.com/companies/epirus', 'https://www.worldfund.vc/portfolio/sunroof', 'https://aifund.ai/portfolio/jivi-ai/', 'https://www.cervin.com/portfolio/celona', 'https://www.dimensioncap.com/portfolio/kaleidoscope-bio', 'https://embedded.capital/portfolio/wilshire', 'https://elevate.vc/portfolio/onboard-dynamics/', 'https://www.exceptionalcap.com/portfolio/portfolio/lumu', 'https://kokopelli.vc/portfolio/comsero/', 'http://kickstartfund.com/portfolio/peoplekeep', 'http://agfunder.com/portfolio/eion/', 'https://partechpartners.com/companies/brevo', 'https://bigideaventures.com/portfolio/the-frauxmagerie/', 'https://www.1011vc.com/portfolio/axis-security/', 'https://straydogcapital.com/portfolio/4ag/', 'https://wavemaker.vc/portfolio/portfolio-location-pods-wavemaker-portfolio-headquarter-hong-kong/']
+
+    if args.parser:
+        configure_parser(args.parser)
+    http_cache = None if args.no_http_cache else HTTPCache(args.http_cache, ttl=args.http_cache_ttl)
+    url_index = UrlIndex(args.url_index, args.dedup)
+    work_queue = open_queue(args.queue) if args.queue else None
+    # with a queue the per-host rate limits are shared by all its workers
+    host_schedule = partial(work_queue.reserve_host, rate=args.host_rate) if work_queue is not None else None
+    configure_fetcher(per_host=args.per_host, host_rate=args.host_rate, cache=http_cache,
+                      max_bytes=args.max_page_bytes, on_redirect=url_index.add_redirect, host_schedule=host_schedule)
+    gate = None if args.no_gate else PageGate.from_path(args.gate_model, threshold=args.gate_threshold)
+    parse_processes = args.parse_processes if args.parse_processes >= 0 else os.cpu_count()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.discover:
+        discovery = Discovery(workers=args.fetch_workers, max_pages=args.discover_max_pages)
+        urls = (url for _, url in discovery.run(urls))
+    if work_queue is not None:
+        added = work_queue.put(url_index.unique(urls))
+        logger.info(f"Added {added} urls to the work queue: {work_queue.counts()}")
+        if not args.worker:
+            return
+    llm_client = get_llm(args.provider, cache=not args.no_llm_cache, cache_path=args.llm_cache,
+                         structured=not args.no_structured_output)
+    # the queue knows which urls are finished, so every leased url is crawled
+    options = CrawlOptions(fetch_workers=args.fetch_workers, extract_workers=args.extract_workers,
+                           llm_workers=args.llm_workers, llm_batch_size=args.llm_batch_size,
+                           token_budget=args.token_budget, output_format=args.format,
+                           parse_processes=parse_processes, parse_min_size=args.parse_min_size,
+                           rules=not args.no_rules, resume=args.resume and work_queue is None,
+                           incremental=args.incremental, change_threshold=args.change_threshold,
+                           metrics_path=args.metrics)
+    helpers = dict(state=StateStore(args.state), url_index=url_index, gate=gate)
+    if work_queue is None:
+        crawl(url_index.unique(urls), llm_client, args.output, options, **helpers)
+        return
+    worker = QueueWorker(work_queue, batch=args.fetch_workers, visibility=args.lease_timeout)
+    crawl(worker.urls(), llm_client, args.output, options, sink=worker, on_dropped=worker.dropped, **helpers)
+    logger.info(f"Work queue: {work_queue.counts()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Finds portfolio company pages from VC websites in one streaming pass, replacing the
+scripts/ chain (check_urls.py, filter_urls.py, get_urls*.py) and its intermediate CSVs.
+
+    for listing, url in Discovery().run(["https://vc.com/", "https://other.vc/companies/"]):
+        ...
+
+Every VC root is probed for portfolio/, companies/ and company/ at once, next to its home
+page, whose links to a listing are followed too. Listings are fetched once through the
+shared fetcher (connection pool, per-host rate limit, HTTP cache), their company links are
+yielded as soon as they are found, and their pagination (?page=2, /page/2/) is followed up
+to max_pages listing pages per VC. A root that already is a listing is not probed.
+"""
+import argparse
+import csv
+import queue
+import re
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urljoin, urlsplit
+import metrics
+from classifier import LISTING_WORDS, non_company_url
+from fetcher import get_fetcher
+from html_parse import parse_html
+from inputs import read_urls
+from logger import get_logger
+from urls import DigestSet, canonical_url, dedup_urls
+
+logger = get_logger(__name__)
+
+PROBE_PATHS = ("portfolio/", "companies/", "company/")
+# path segments naming the portfolio, company pages live below them: /portfolio/<company>
+PORTFOLIO_WORDS = ("portfolio", "portfolios", "companies", "company", "investments")
+DEFAULT_MAX_PAGES = 20  # listing pages fetched per VC, probes and pagination included
+MIN_COMPANIES = 2  # a probed page linking to fewer company pages is not the portfolio
+PAGE_PARAM = re.compile(r"^(?:[a-z0-9]+_)?(?:page|paged|pg|p)$", re.IGNORECASE)  # ?page=2, ?e4b2_page=2
+PAGE_PATH = re.compile(r"/page/\d+/?$")  # /portfolio/page/2/
+
+_DONE = object()
+
+
+def root_url(url: str) -> str:
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    return url if url.endswith("/") else f"{url}/"
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower().removeprefix("www.")
+
+
+def _segments(url: str) -> List[str]:
+    return [segment for segment in PAGE_PATH.sub("", urlsplit(url).path.lower()).split("/") if segment]
+
+
+def is_listing(url: str) -> bool:
+    """A portfolio listing by its path: /portfolio/, /companies/, /portfolio/exited/, /our-portfolio/ ..."""
+    segments = _segments(url)
+    if not segments or urlsplit(url).query:
+        return False
+    return segments[-1] in LISTING_WORDS or any(word in segments[-1] for word in PORTFOLIO_WORDS)
+
+
+def portfolio_keyword(url: str) -> str:
+    """The path segment company pages of the listing at url live under"""
+    segments = _segments(url)
+    for segment in reversed(segments):
+        if segment in PORTFOLIO_WORDS:
+            return segment
+    return segments[-1] if segments else ""
+
+
+def is_company_link(url: str, listing_url: str, keyword: str) -> bool:
+    """A link on a listing to one of its company pages, e.g. vc.com/portfolio/acme"""
+    if _host(url) != _host(listing_url) or urlsplit(url).query or non_company_url(url):
+        return False
+    if canonical_url(url) == canonical_url(listing_url):
+        return False
+    segments = _segments(url)
+    return keyword in segments[:-1]
+
+
+def is_next_page(url: str, listing_url: str) -> bool:
+    """A link on a listing to another page of the same listing"""
+    if _host(url) != _host(listing_url) or _segments(url) != _segments(listing_url):
+        return False
+    if PAGE_PATH.search(urlsplit(url).path):
+        return True
+    return any(PAGE_PARAM.match(key) and value.isdigit() for key, value in parse_qsl(urlsplit(url).query))
+
+
+@dataclass
+class _Root:
+    url: str
+    pending: int = 0  # tasks queued or being fetched
+    pages: int = 0  # listing pages queued so far
+
+
+@dataclass
+class _Task:
+    root: _Root
+    url: str
+    kind: str  # "home", "probe", "listing" or "page" (a further page of a listing)
+    listing: str = ""
+    keyword: str = ""
+
+
+class Discovery:
+    """
+    Streams (listing url, company url) pairs from VC roots, fetched by workers threads
+    sharing one fetcher. Each page and each company is seen once across all roots. At most
+    max_roots VCs are in flight and each gets at most max_pages listing pages, which bounds
+    the frontier however many roots are fed in.
+    """
+
+    def __init__(self, workers: int = 16, max_pages: int = DEFAULT_MAX_PAGES, max_roots: Optional[int] = None,
+                 probe_paths: Iterable[str] = PROBE_PATHS, fetch: Optional[Callable[[str], Optional[str]]] = None):
+        self.workers = workers
+        self.max_pages = max_pages
+        self.max_roots = max_roots or workers
+        self.probe_paths = tuple(probe_paths)
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.seen_pages = DigestSet()
+        self.seen_companies = DigestSet()
+        self.counts = {"roots": 0, "fetched": 0, "failed": 0, "listings": 0, "not_listings": 0, "pages": 0,
+                       "page_limit": 0, "companies": 0, "duplicates": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counts[name] += n
+
+    def _task(self, root: _Root, url: str, kind: str, listing: str = "", keyword: str = "") -> Optional[_Task]:
+        """A task for url unless it was fetched already or the root is out of listing pages"""
+        with self.lock:
+            if kind != "home" and root.pages >= self.max_pages:
+                self.counts["page_limit"] += 1
+                return None
+            if self.seen_pages.add(canonical_url(url).encode("utf-8")):
+                return None
+            root.pending += 1
+            if kind != "home":
+                root.pages += 1
+        return _Task(root, url, kind, listing or url, keyword or portfolio_keyword(url))
+
+    def _start(self, url: str) -> List[_Task]:
+        root = _Root(root_url(url))
+        if is_listing(root.url):
+            tasks = [self._task(root, root.url, "listing")]
+        else:
+            tasks = [self._task(root, root.url, "home")]
+            tasks += [self._task(root, urljoin(root.url, path), "probe") for path in self.probe_paths]
+        return [task for task in tasks if task is not None]
+
+    def _visit(self, task: _Task, html: str, found: queue.Queue) -> List[_Task]:
+        """Yields the company links on a page and returns the tasks for the pages it leads to"""
+        links = dedup_urls(urljoin(task.url, href.strip()) for href in parse_html(html).hrefs
+                           if "#" not in href and not href.strip().lower().startswith(("javascript:", "mailto:")))
+        if task.kind == "home":
+            return [self._task(task.root, url, "listing") for url in links
+                    if _host(url) == _host(task.url) and is_listing(url)]
+
+        companies = [url for url in links if is_company_link(url, task.listing, task.keyword)]
+        if task.kind != "page" and len(companies) < MIN_COMPANIES:
+            self._count("not_listings")
+            return []
+        self._count("listings" if task.kind != "page" else "pages")
+        for url in companies:
+            if self.seen_companies.add(canonical_url(url).encode("utf-8")):
+                self._count("duplicates")
+                continue
+            self._count("companies")
+            metrics.count("discovered_companies_total")
+            found.put((task.listing, url))
+        return [self._task(task.root, url, "page", task.listing, task.keyword) for url in links
+                if is_next_page(url, task.listing)]
+
+    def _work(self, fetch: Callable[[str], Optional[str]], frontier: queue.Queue, found: queue.Queue,
+              slots: threading.Semaphore):
+        while True:
+            task = frontier.get()
+            if task is None:
+                return
+            try:
+                with metrics.timer("discovery"):
+                    html = fetch(task.url)
+                if html is None:
+                    self._count("failed")
+                else:
+                    self._count("fetched")
+                    # queued before this task is finished, so the root never looks done too early
+                    for new_task in self._visit(task, html, found):
+                        if new_task is not None:
+                            frontier.put(new_task)
+            except Exception as e:
+                logger.error(f"Error discovering {task.url}: {e}")
+                metrics.count("errors_total", stage="discovery", error=type(e).__name__)
+            finally:
+                with self.lock:
+                    task.root.pending -= 1
+                    finished = task.root.pending == 0
+                if finished:
+                    slots.release()
+                    found.put(_DONE)
+
+    def run(self, roots: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        fetch = self.fetch or get_fetcher().fetch
+        frontier: queue.Queue = queue.Queue()
+        found: queue.Queue = queue.Queue(maxsize=self.workers * 64)
+        slots = threading.Semaphore(self.max_roots)
+        fed: List[int] = []
+        stop = threading.Event()
+
+        def feed():
+            started = 0
+            try:
+                for url in roots:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    tasks = self._start(url)
+                    if not tasks:
+                        slots.release()
+                        continue
+                    started += 1
+                    self._count("roots")
+                    for task in tasks:
+                        frontier.put(task)
+            except Exception as e:
+                logger.error(f"Error reading discovery roots: {e}")
+            finally:
+                fed.append(started)
+                found.put(_DONE)
+
+        threads = [threading.Thread(target=self._work, args=(fetch, frontier, found, slots),
+                                    name=f"discovery-{n}", daemon=True) for n in range(self.workers)]
+        threads.append(threading.Thread(target=feed, name="discovery-feed", daemon=True))
+        for thread in threads:
+            thread.start()
+        done = 0
+        try:
+            # one _DONE per finished root plus one from the feeder
+            while not fed or done < fed[0] + 1:
+                item = found.get()
+                if item is _DONE:
+                    done += 1
+                else:
+                    yield item
+        finally:
+            stop.set()
+            slots.release()
+            for _ in range(self.workers):
+                frontier.put(None)
+            logger.info(f"Discovery: {self.report()}")
+
+    def report(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="List the portfolio company pages of VC websites")
+    parser.add_argument("inputs", nargs="*", default=["-"],
+                        help="CSV, JSON Lines or text files with VC home pages or portfolio listings, - for stdin")
+    parser.add_argument("--column", help="CSV column or JSON key holding the url (default: url, ...)")
+    parser.add_argument("-o", "--output", help="CSV file of vc,startup rows (default: stdout)")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="listing pages fetched per VC")
+    args = parser.parse_args(argv)
+
+    discovery = Discovery(workers=args.workers, max_pages=args.max_pages)
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["vc", "startup"])
+        for listing, url in discovery.run(read_urls(args.inputs, args.column)):
+            writer.writerow([listing, url])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Discovery: {discovery.report()}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
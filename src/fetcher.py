@@ -0,0 +1,302 @@
+import asyncio
+import codecs
+import re
+import threading
+import time
+import httpx
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from ratelimit import TokenBucket, parse_retry_after
+from http_cache import HTTPCache
+from logger import get_logger
+import metrics
+
+logger = get_logger(__name__)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Connection": "keep-alive",
+    "Referer": "https://www.google.com/",
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60  # seconds, urls whose server asks us to wait longer are given up on
+
+HTML_TYPES = {"text/html", "application/xhtml+xml", "text/plain", ""}
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024  # a portfolio page is far smaller, bigger downloads get cut off here
+SNIFF_BYTES = 1024  # a <meta charset> must appear this early in the page (HTML spec)
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# scripts may contain a stray "</body>" string, the closing pair is a safer sign the page is over
+PAGE_END = re.compile(r"</body\s*>\s*</html", re.IGNORECASE)
+BINARY_MAGIC = (b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff")
+# httpcore steps timed per request: DNS lookup plus TCP connect, TLS handshake, and the
+# wait for the response headers, i.e. the server's think time
+TRACED_STEPS = {"connect_tcp": "connect", "start_tls": "tls", "receive_response_headers": "server"}
+
+
+def sniff_encoding(content_type: str, head: bytes) -> str:
+    """Picks the charset from a BOM, the Content-Type header or a <meta> tag, else utf-8"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    names = []
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            names.append(value.strip(" \"'"))
+    match = META_CHARSET.search(head[:SNIFF_BYTES])
+    if match:
+        names.append(match.group(1).decode("ascii"))
+    for name in names:
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return "utf-8"
+
+
+def _decoder(url: str, content_type: str, head: bytes) -> Optional[codecs.IncrementalDecoder]:
+    """An incremental decoder for the page that starts with head, or None if it is not text"""
+    utf16 = head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE))
+    if head.startswith(BINARY_MAGIC) or (b"\x00" in head[:SNIFF_BYTES] and not utf16):
+        logger.warning(f"Skipping {url}: binary content")
+        return None
+    return codecs.getincrementaldecoder(sniff_encoding(content_type, head))(errors="replace")
+
+
+def _tracer() -> Callable:
+    """httpx trace hook recording how long the connection phases of one request took"""
+    started: Dict[str, float] = {}
+
+    async def trace(event: str, info: Dict):
+        step, _, state = event.rpartition(".")
+        phase = TRACED_STEPS.get(step.rpartition(".")[2])
+        if phase is None:
+            return
+        if state == "started":
+            started[phase] = time.perf_counter()
+        elif state == "complete" and phase in started:
+            metrics.observe("fetch_phase_seconds", time.perf_counter() - started.pop(phase), phase=phase)
+
+    return trace
+
+
+class AsyncFetcher:
+    """
+    Fetches pages over one shared httpx connection pool. Concurrency is capped globally and
+    per host, and every host has its own token bucket so we stay polite to each VC site.
+    Bodies are streamed: non-HTML responses are dropped after the headers, and reading stops
+    at </body></html> or after max_bytes, so each fetch in flight holds a bounded amount of memory.
+    """
+
+    def __init__(self, max_connections: int = 100, per_host: int = 2, host_rate: float = 1.0,
+                 host_burst: float = 2.0, retries: int = 3, backoff_factor: float = 1.0, timeout: float = 10,
+                 cache: Optional[HTTPCache] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 on_redirect: Optional[Callable[[str, str], None]] = None,
+                 host_schedule: Optional[Callable[[str], float]] = None):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.global_limit = asyncio.Semaphore(max_connections)
+        self.host_limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self.host_buckets: Dict[str, TokenBucket] = defaultdict(lambda: TokenBucket(host_rate, host_burst))
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.on_redirect = on_redirect  # called with (url, final url) after a redirected fetch
+        # politeness shared with other processes, e.g. WorkQueue.reserve_host: seconds to wait before a request to host
+        self.host_schedule = host_schedule
+
+    async def _get(self, url: str, headers: Dict[str, str]) -> Tuple[httpx.Response, Optional[str]]:
+        """Returns the response and, for a 200 with an HTML body, the decoded page"""
+        host = urlparse(url).netloc.lower()
+        t0 = time.perf_counter()
+        async with self.host_limits[host]:
+            await self.host_buckets[host].acquire_async()
+            if self.host_schedule is not None:
+                delay = await asyncio.to_thread(self.host_schedule, host)
+                if delay:
+                    await asyncio.sleep(delay)
+            async with self.global_limit:
+                # time spent queued behind the politeness limits
+                metrics.observe("fetch_phase_seconds", time.perf_counter() - t0, phase="wait")
+                async with self.client.stream("GET", url, headers=headers, extensions={"trace": _tracer()}) as response:
+                    metrics.count("fetch_responses_total", status=response.status_code)
+                    if response.status_code != 200:
+                        return response, None
+                    if self.on_redirect is not None and response.history:
+                        self.on_redirect(url, str(response.url))
+                    t1 = time.perf_counter()
+                    body = await self._read_html(url, response)
+                    metrics.observe("fetch_phase_seconds", time.perf_counter() - t1, phase="body")
+                    metrics.count("fetch_bytes_total", response.num_bytes_downloaded)
+                    return response, body
+
+    async def _read_html(self, url: str, response: httpx.Response) -> Optional[str]:
+        content_type = response.headers.get("Content-Type", "")
+        mime = content_type.split(";")[0].strip().lower()
+        if mime not in HTML_TYPES:
+            metrics.count("errors_total", stage="fetch", error="NotHTML")
+            logger.warning(f"Skipping {url}: content type {mime}")
+            return None
+        length = response.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            logger.info(f"Reading only the first {self.max_bytes} of {length} bytes of {url}")
+
+        head, decoder, parts = b"", None, []  # type: bytes, Optional[codecs.IncrementalDecoder], List[str]
+        received, tail = 0, ""
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:self.max_bytes - received]
+            received += len(chunk)
+            if decoder is None:
+                # hold the first bytes back until the charset can be sniffed from them
+                head += chunk
+                if len(head) < SNIFF_BYTES and received < self.max_bytes:
+                    continue
+                decoder = _decoder(url, content_type, head)
+                if decoder is None:
+                    return None
+                chunk = head
+            text = decoder.decode(chunk)
+            parts.append(text)
+            # the rest of the page is scripts and trackers, which extraction drops anyway
+            if PAGE_END.search(tail + text):
+                break
+            tail = (tail + text)[-64:]
+            if received >= self.max_bytes:
+                logger.info(f"Truncated {url} at {self.max_bytes} bytes")
+                break
+        if decoder is None:  # the whole body was shorter than SNIFF_BYTES
+            decoder = _decoder(url, content_type, head)
+            if decoder is None:
+                return None
+            parts.append(decoder.decode(head))
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts)
+
+    async def fetch(self, url: str) -> Optional[str]:
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached.is_fresh(self.cache.ttl):
+            metrics.count("http_cache_total", result="fresh")
+            return cached.body
+        headers = cached.conditional_headers() if cached else {}
+
+        attempt = 0
+        while True:
+            try:
+                response, body = await self._get(url, headers)
+                if response.status_code == 304 and cached:
+                    metrics.count("http_cache_total", result="revalidated")
+                    self.cache.revalidated(url)
+                    return cached.body
+                if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                    delay = parse_retry_after(response.headers.get("Retry-After"))
+                    if delay is not None and delay > MAX_RETRY_AFTER:
+                        # retrying sooner would ignore the server, and waiting that long would hold a worker
+                        metrics.count("errors_total", stage="fetch", error="rate_limited")
+                        logger.error(f"Got {response.status_code} for URL: {url}, asked to retry in {delay:.0f}s, "
+                                     f"giving up")
+                        return None
+                    if delay is None:
+                        delay = self.backoff_factor * 2 ** attempt  # Wait 1s, 2s, 4s between retries
+                    logger.warning(f"Got {response.status_code} for URL: {url}, retrying in {delay:.1f}s")
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()  # Raise error for bad status codes (4xx/5xx)
+                if body is None:
+                    return None
+                if self.cache:
+                    self.cache.put(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                return body
+
+            except httpx.HTTPStatusError as errh:
+                metrics.count("errors_total", stage="fetch", error=f"HTTP {errh.response.status_code}")
+                logger.error(f"HTTP Error: {errh} for URL: {url}")
+            except httpx.TimeoutException as errt:
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                    attempt += 1
+                    continue
+                metrics.count("errors_total", stage="fetch", error=type(errt).__name__)
+                logger.error(f"Timeout Error: {errt} for URL: {url}")
+            except httpx.TransportError as errc:
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                    attempt += 1
+                    continue
+                metrics.count("errors_total", stage="fetch", error=type(errc).__name__)
+                logger.error(f"Connection Error: {errc} for URL: {url}")
+            except httpx.HTTPError as err:
+                metrics.count("errors_total", stage="fetch", error=type(err).__name__)
+                logger.error(f"Unexpected Error: {err} for URL: {url}")
+            return None
+
+    async def aclose(self):
+        await self.client.aclose()
+        if self.cache:
+            self.cache.close()
+
+
+class FetcherThread:
+    """Runs an AsyncFetcher on a background event loop so threaded code can share its pool"""
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fetcher", daemon=True)
+        self.thread.start()
+        self.fetcher = self._call(self._create(kwargs))
+
+    @staticmethod
+    async def _create(kwargs) -> AsyncFetcher:
+        # asyncio primitives must be created on the loop that uses them
+        return AsyncFetcher(**kwargs)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def fetch(self, url: str) -> Optional[str]:
+        return self._call(self.fetcher.fetch(url))
+
+    def close(self):
+        self._call(self.fetcher.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+_fetcher: Optional[FetcherThread] = None
+_fetcher_options: Dict = {}
+_fetcher_lock = threading.Lock()
+
+
+def configure_fetcher(**kwargs):
+    """
+    Sets AsyncFetcher options for the process-wide fetcher, replacing one already running.
+    Unless a cache is passed, the fetcher uses the on-disk HTTP cache configured by HTTP_CACHE_* env vars.
+    """
+    global _fetcher, _fetcher_options
+    with _fetcher_lock:
+        _fetcher_options = kwargs
+        if _fetcher is not None:
+            _fetcher.close()
+            _fetcher = None
+
+
+def get_fetcher() -> FetcherThread:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            options = dict(_fetcher_options)
+            if "cache" not in options:
+                options["cache"] = HTTPCache.from_env()
+            _fetcher = FetcherThread(**options)
+        return _fetcher
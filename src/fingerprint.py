@@ -0,0 +1,55 @@
+import hashlib
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+BITS = 64
+SHINGLE = 3  # words per feature, so reordered sections change the hash but a changed word only a little
+# pages whose SimHashes differ in at most this many bits count as unchanged; 3 of 64 is the usual
+# near-duplicate threshold for web pages (Manku et al., WWW 2007)
+DEFAULT_MAX_DISTANCE = 3
+
+_WORD = re.compile(r"\w+")
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word shingles of text: similar texts get hashes a few bits apart"""
+    words = _WORD.findall(text.lower())
+    shingles = Counter(" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1)))
+    weights = [0] * BITS
+    for shingle, weight in shingles.items():
+        h = _hash64(shingle)
+        for bit in range(BITS):
+            weights[bit] += weight if h >> bit & 1 else -weight
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """What a page said when it was last extracted: an exact hash and a SimHash of its content"""
+    hash: str
+    simhash: int
+
+    @classmethod
+    def of(cls, text: str) -> "Fingerprint":
+        return cls(content_hash(text), simhash(text))
+
+    def compare(self, other: "Fingerprint", max_distance: int = DEFAULT_MAX_DISTANCE) -> str:
+        """Whether other is "unchanged", a "near_duplicate" (e.g. a rotating news teaser) or "changed" content"""
+        if self.hash == other.hash:
+            return "unchanged"
+        if distance(self.simhash, other.simhash) <= max_distance:
+            return "near_duplicate"
+        return "changed"
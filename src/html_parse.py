@@ -0,0 +1,299 @@
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from bs4.dammit import EntitySubstitution
+
+# tags dropped together with everything inside them before the text is collected
+REMOVED_TAGS = {"script", "style", "noscript", "meta", "header", "footer"}
+HEADING_TAGS = {"title", "h1", "h2", "h3"}
+# BeautifulSoup files text under these as special strings that stripped_strings/get_text skip
+HIDDEN_STRING_TAGS = {"template", "rt", "rp"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+             "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex",
+             "nextid", "spacer"}
+
+
+@dataclass
+class ParsedPage:
+    texts: List[str] = field(default_factory=list)  # stripped strings outside REMOVED_TAGS
+    links: List[Tuple[str, str]] = field(default_factory=list)  # (text, href) of <a> tags with both set
+    headings: Set[str] = field(default_factory=set)  # texts found inside HEADING_TAGS
+    hrefs: List[str] = field(default_factory=list)  # every <a href>, removed tags included
+
+
+def _parse_bs4(html: str) -> ParsedPage:
+    """The reference implementation: two walks over a BeautifulSoup tree"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = [link["href"] for link in soup.find_all("a", href=True)]
+    for tag in soup(list(REMOVED_TAGS)):
+        tag.extract()
+    links = []
+    for link in soup.find_all("a", href=True):
+        href, text = link["href"], link.get_text(strip=True)
+        if href and text:
+            links.append((text, href))
+    headings = {text for heading in soup.find_all(list(HEADING_TAGS)) for text in heading.stripped_strings}
+    return ParsedPage(list(soup.stripped_strings), links, headings, hrefs)
+
+
+class _PageParser(HTMLParser):
+    """
+    Collects texts, links and headings while tokenizing, without building a tree. Open
+    tags are tracked the way BeautifulSoup's html.parser builder nests them (an end tag
+    closes the latest open tag of that name, void tags never open), so the result is
+    the same as _parse_bs4's.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.page = ParsedPage()
+        self.stack: List[Tuple[str, Optional[list]]] = []
+        self.open: Dict[str, int] = defaultdict(int)
+        self.removed = self.hidden = self.heading = 0
+        self.open_links: List[list] = []
+        self.link_parts: List[Tuple[str, list]] = []
+        self.already_closed: List[str] = []
+        self.data: List[str] = []
+
+    def _flush(self, kind: str = "text"):
+        if not self.data:
+            return
+        text = "".join(self.data).strip()
+        self.data = []
+        if not text or self.removed or kind == "other" or (kind == "text" and self.hidden):
+            return
+        self.page.texts.append(text)
+        if self.heading:
+            self.page.headings.add(text)
+        for parts in self.open_links:
+            parts.append(text)
+
+    def _push(self, tag: str, attrs):
+        href = None
+        if tag == "a":
+            for key, value in attrs:  # the last duplicate wins, as in bs4
+                if key == "href":
+                    href = value or ""
+        parts = None
+        if href is not None:
+            self.page.hrefs.append(href)
+            if not self.removed:
+                parts = []
+                self.link_parts.append((href, parts))
+                self.open_links.append(parts)
+        self.stack.append((tag, parts))
+        self.open[tag] += 1
+        self._count(tag, 1)
+
+    def _count(self, tag: str, step: int):
+        if tag in REMOVED_TAGS:
+            self.removed += step
+        if tag in HIDDEN_STRING_TAGS:
+            self.hidden += step
+        if tag in HEADING_TAGS:
+            self.heading += step
+
+    def _pop_to(self, tag: str):
+        if not self.open[tag]:
+            return
+        while True:
+            name, parts = self.stack.pop()
+            self.open[name] -= 1
+            self._count(name, -1)
+            if parts is not None:
+                self.open_links.pop()
+            if name == tag:
+                return
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._push(tag, attrs)
+        if tag in VOID_TAGS:
+            self._pop_to(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._push(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed:
+            # bs4 swallows the end tag of a void element whole, text on both sides stays one string
+            self.already_closed.remove(tag)
+        else:
+            self._flush()
+            self._pop_to(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        # decoded the way bs4 does it, so both backends agree on odd references
+        number = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        data = None
+        if number < 256:
+            try:
+                data = bytearray([number]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(number)
+            except (ValueError, OverflowError):
+                pass
+        self.data.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.data.append(character if character is not None else f"&{name}")
+
+    def _special(self, data: str, kind: str):
+        self._flush()
+        self.data.append(data)
+        self._flush(kind)
+
+    def handle_comment(self, data):
+        self._special(data, "other")
+
+    def handle_decl(self, decl):
+        self._special(decl, "other")
+
+    def handle_pi(self, data):
+        self._special(data, "other")
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self._special(data[len("CDATA["):], "cdata")
+        else:
+            self._special(data, "other")
+
+    def result(self) -> ParsedPage:
+        self._flush()
+        page = self.page
+        for href, parts in self.link_parts:
+            text = "".join(parts)
+            if href and text:
+                page.links.append((text, href))
+        return page
+
+
+def _parse_stdlib(html: str) -> ParsedPage:
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
+
+
+def _parse_lxml(html: str) -> ParsedPage:
+    """libxml2 repairs broken markup its own way, so malformed pages may not match bs4 exactly"""
+    try:
+        from lxml import etree, html as lxml_html
+    except ImportError:
+        raise ValueError("The lxml parser needs lxml, install it with `pip install lxml`")
+    page = ParsedPage()
+    if not html.strip():
+        return page
+    root = lxml_html.document_fromstring(html)
+    link_parts: List[Tuple[str, list]] = []
+    open_links: List[list] = []
+    skip_depth = 0  # >0 while inside a removed tag
+    heading = 0
+
+    def add(text: Optional[str]):
+        text = text.strip() if text else ""
+        if text and not skip_depth:
+            page.texts.append(text)
+            if heading:
+                page.headings.add(text)
+            for parts in open_links:
+                parts.append(text)
+
+    for event, element in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        tag = element.tag if isinstance(element.tag, str) else None
+        if event == "start":
+            if tag == "a" and "href" in element.attrib:
+                href = element.attrib["href"]
+                page.hrefs.append(href)
+                if not skip_depth:
+                    parts = []
+                    link_parts.append((href, parts))
+                    open_links.append(parts)
+            if tag in REMOVED_TAGS:
+                skip_depth += 1
+            if tag in HEADING_TAGS:
+                heading += 1
+            if tag is not None:
+                add(element.text)
+            continue
+        if tag is not None and event == "end":
+            if tag in REMOVED_TAGS:
+                skip_depth -= 1
+            if tag in HEADING_TAGS:
+                heading -= 1
+            if tag == "a" and "href" in element.attrib and not skip_depth:
+                open_links.pop()
+        add(element.tail)
+
+    page.links = [(text, href) for href, text in ((href, "".join(parts)) for href, parts in link_parts)
+                  if href and text]
+    return page
+
+
+def _parse_selectolax(html: str) -> ParsedPage:
+    """lexbor follows the HTML5 tree rules, so malformed pages may not match bs4 exactly"""
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError:
+        raise ValueError("The selectolax parser needs selectolax, install it with `pip install selectolax`")
+    tree = LexborHTMLParser(html)
+    page = ParsedPage(hrefs=[node.attributes.get("href") or "" for node in tree.css("a[href]")])
+    tree.strip_tags(list(REMOVED_TAGS))
+    if tree.root is None:
+        return page
+    for node in tree.root.traverse(include_text=True):
+        if node.tag == "-text":
+            text = node.text_content.strip()
+            if text:
+                page.texts.append(text)
+        elif node.tag == "a" and "href" in node.attributes:
+            href, text = node.attributes["href"] or "", node.text(deep=True, separator="", strip=True)
+            if href and text:
+                page.links.append((text, href))
+        elif node.tag in HEADING_TAGS:
+            page.headings.update(text for text in (n.text_content.strip() for n in node.traverse(include_text=True)
+                                                   if n.tag == "-text") if text)
+    return page
+
+
+BACKENDS: Dict[str, Callable[[str], ParsedPage]] = {
+    "stdlib": _parse_stdlib,
+    "bs4": _parse_bs4,
+    "lxml": _parse_lxml,
+    "selectolax": _parse_selectolax,
+}
+
+_default_backend = os.getenv("HTML_PARSER", "stdlib")
+
+
+def configure_parser(backend: str):
+    """Sets the backend parse_html uses when none is given"""
+    global _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported HTML parser: {backend}")
+    _default_backend = backend
+
+
+def current_parser() -> str:
+    return _default_backend
+
+
+def parse_html(html: str, backend: Optional[str] = None) -> ParsedPage:
+    """Collects the texts, links and headings of a page in a single pass"""
+    backend = backend or _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported HTML parser: {backend}")
+    return BACKENDS[backend](html)
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urls import normalize_url
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "smartcrawler", "http")
+DEFAULT_TTL = 24 * 3600  # seconds a cached page is served without asking the server
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    """
+    Persistent page cache. Bodies are stored once per content hash under objects/, and a
+    SQLite index maps each normalized url to its body, validators and fetch time. The least
+    recently used entries are evicted once the bodies outgrow max_bytes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA busy_timeout=5000")  # scripts may share the cache with a running crawl
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.total_bytes = self._stored_bytes()
+
+    @classmethod
+    def from_env(cls) -> "HTTPCache":
+        return cls(
+            os.getenv("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR),
+            float(os.getenv("HTTP_CACHE_TTL", DEFAULT_TTL)),
+            int(os.getenv("HTTP_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        )
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, "objects", digest[:2], digest[2:])
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        key = normalize_url(url)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, etag, last_modified, fetched_at FROM entries WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), key))
+        digest, etag, last_modified, fetched_at = row
+        try:
+            with open(self._object_path(digest), "r", encoding="utf-8") as f:
+                body = f.read()
+        except OSError:
+            # body evicted by another process sharing the cache
+            return None
+        return CachedResponse(url, body, etag, last_modified, fetched_at)
+
+    def _write_object(self, object_path: str, data: bytes):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, object_path)
+
+    def put(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        data = body.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write_object(object_path, data)
+
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            # bodies are only deleted under the write lock, so the one checked here stays until the row is in
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if not os.path.exists(object_path):
+                    self._write_object(object_path, data)  # evicted by another writer after the check above
+                old = self.db.execute("SELECT size FROM entries WHERE url = ?", (key,)).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, digest, len(data), etag, last_modified, now, now))
+                total_bytes = self.total_bytes + len(data) - (old[0] if old else 0)
+                if total_bytes > self.max_bytes:
+                    total_bytes = self._evict()
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            self.total_bytes = total_bytes
+
+    def revalidated(self, url: str):
+        """Server answered 304 Not Modified, so the cached body is fresh again"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                            (now, now, normalize_url(url)))
+
+    def _stored_bytes(self) -> int:
+        # sizes are counted per entry, so pages sharing a body are over-counted; fine for a bound
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self) -> int:
+        """
+        Drops least recently used entries until the cache fits max_bytes, returns the bytes left.
+        Runs inside put's transaction: a body is deleted only once no entry refers to it, and no
+        other writer can add one before the transaction ends.
+        """
+        # other processes may have written to the cache since we last looked
+        total = self._stored_bytes()
+        evicted = 0
+        for url, digest, size in self.db.execute(
+                "SELECT url, digest, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if not self.db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                try:
+                    os.remove(self._object_path(digest))
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+        logger.debug(f"Evicted {evicted} pages from HTTP cache")
+        return total
+
+    def close(self):
+        with self.lock:
+            self.db.close()
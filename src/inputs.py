@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, TextIO
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+URL_COLUMNS = ("url", "startup", "source", "website", "company url", "portfolio")
+
+
+def _looks_like_url(value: str) -> bool:
+    value = value.strip().lower()
+    return value.startswith(("http://", "https://")) or (" " not in value and "." in value and "/" in value)
+
+
+def _pick_column(header: List[str], column: Optional[str]) -> Optional[int]:
+    names = [name.strip().lower() for name in header]
+    for name in ([column.lower()] if column else URL_COLUMNS):
+        if name in names:
+            return names.index(name)
+    return None
+
+
+def _read_csv(f: TextIO, column: Optional[str]) -> Iterator[str]:
+    reader = csv.reader(f)
+    first = next(reader, None)
+    if first is None:
+        return
+    index = _pick_column(first, column)
+    if index is None:
+        if column:
+            raise ValueError(f"Column {column} not found in CSV header {first}")
+        # no header, e.g. vcs_urls_all_portfolio.csv: take the last field holding a url
+        yield from _csv_field(first, None)
+    for row in reader:
+        yield from _csv_field(row, index)
+
+
+def _csv_field(row: List[str], index: Optional[int]) -> Iterator[str]:
+    if index is not None:
+        if index < len(row):
+            yield row[index]
+        return
+    for value in reversed(row):
+        if _looks_like_url(value):
+            yield value
+            return
+
+
+def _read_jsonl(f: TextIO, column: Optional[str]) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, str):
+            yield record
+        elif isinstance(record, dict):
+            value = record.get(column or "url")
+            if value:
+                yield value
+
+
+def _read_text(f: TextIO, column: Optional[str]) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+READERS = {".csv": _read_csv, ".jsonl": _read_jsonl, ".json": _read_jsonl, ".txt": _read_text}
+
+
+def read_urls(paths: Iterable[str], column: Optional[str] = None, input_format: Optional[str] = None) -> Iterator[str]:
+    """Yields raw urls from CSV, JSON Lines or text files one at a time; "-" reads stdin"""
+    for path in paths:
+        if path == "-":
+            reader = READERS.get(f".{input_format}" if input_format else ".txt", _read_text)
+            yield from reader(io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8"), column)
+            continue
+        extension = f".{input_format}" if input_format else os.path.splitext(path)[1].lower()
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from READERS.get(extension, _read_text)(f, column)
+
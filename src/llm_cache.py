@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smartcrawler", "llm.db")
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def cache_key(content: str, prompt: str, model: str) -> str:
+    # lengths keep ("ab", "c") and ("a", "bc") apart
+    digest = hashlib.sha256()
+    for part in (model, prompt, content):
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Persistent store of LLM responses with LRU eviction and hit/miss counters"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        return cls(os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                   int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self.lock:
+            inserted = self.db.execute(
+                "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now)).rowcount
+            self.entries += inserted
+            if self.entries > self.max_entries:
+                # drop the oldest tenth at once so we don't evict on every put
+                excess = self.entries - self.max_entries + max(1, self.max_entries // 10)
+                deleted = self.db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (excess,)).rowcount
+                self.entries -= deleted
+                self.evictions += deleted
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self.entries,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -1,26 +1,30 @@
 import os
+import json
+import re
+import math
 import openai
+import threading
 import time
 from dotenv import load_dotenv
+from functools import partial
 from abc import ABC, abstractmethod
+from collections import deque
 from openai import OpenAI
-from typing import Optional
-from logger import get_logger
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+from llm_cache import LLMCache, cache_key
+from reduce import estimate_tokens
+from ratelimit import AdaptiveLimiter, parse_retry_after
+from structured import REASK_PROMPT, ParseStats, batch_schema, company_schema, parse_outcome, response_format
+from logger import get_logger, log_payload
+import metrics
 
 logger = get_logger(__name__)
 load_dotenv()
 
-PROMPT = '''
+PROMPT_TEMPLATE = '''
     You are an expert in information extraction. Your task is to extract company information from the provided webpage content and return the data strictly in the following Python dictionary format:
 
-    {
-        "url": "<company_website_url>",
-        "name": "<company_name>",
-        "description": "<company_description>",
-        "country": "<country>",
-        "city": "<city>",
-        "email": "<email_address>"
-    }
+{format}
 
     ### Important Rules:
     1. **Strictly follow the Python dictionary format shown above.** Do NOT include any explanations, comments, or extra text outside the dictionary.
@@ -34,58 +38,452 @@ PROMPT = '''
     7. **For email addresses,** if there are multiple emails, combine them using commas (e.g., `"email": "info@example.com, contact@example.com"`).
 
     ### Example Output:
-    {
-        "url": "https://www.amphista.com",
-        "name": "Amphista Therapeutics",
-        "description": "A biotech company focused on targeted protein degradation.",
-        "country": "United Kingdom, Switzerland",
-        "city": "Cambridge, Zurich",
-        "email": "info@amphista.com, contact@amphista.com"
-    }
+{example}
 
     Now, extract the information from the following content and return the output strictly in the same Python dictionary format:
     ---
 '''
 
+# placeholder and example value of every field the model is asked for, in the order of PROMPT
+PROMPT_FIELDS = {
+    "url": ("<company_website_url>", "https://www.amphista.com"),
+    "name": ("<company_name>", "Amphista Therapeutics"),
+    "description": ("<company_description>", "A biotech company focused on targeted protein degradation."),
+    "country": ("<country>", "United Kingdom, Switzerland"),
+    "city": ("<city>", "Cambridge, Zurich"),
+    "email": ("<email_address>", "info@amphista.com, contact@amphista.com"),
+}
+BATCH_INSTRUCTIONS = '''    The content below contains several webpages, each starting with a line "### Page <index>".
+    Apply the rules above to every page separately and return a single JSON object whose "companies" list
+    holds one object per page. Each object has the fields shown above plus an "index" field holding the page index, e.g.
+    {"companies": [{"index": 0, "url": "...", "name": "...", ...}, {"index": 1, "url": "...", "name": "...", ...}]}
+    Use null for missing values. Do NOT include anything outside the JSON object.
+    ---
+'''
+
+
+def _dict_block(values: Dict[str, str]) -> str:
+    lines = ",\n".join(f'        "{name}": "{value}"' for name, value in values.items())
+    return f"    {{\n{lines}\n    }}"
+
+
+def company_prompt(fields: Optional[Sequence[str]] = None) -> str:
+    """PROMPT asking only for fields, e.g. those a page's structured data didn't give; all of them by default"""
+    names = [name for name in PROMPT_FIELDS if fields is None or name in fields]
+    return PROMPT_TEMPLATE.format(format=_dict_block({name: PROMPT_FIELDS[name][0] for name in names}),
+                                  example=_dict_block({name: PROMPT_FIELDS[name][1] for name in names}))
+
+
+def batch_prompt(fields: Optional[Sequence[str]] = None) -> str:
+    return company_prompt(fields).split("    Now, extract")[0] + BATCH_INSTRUCTIONS
+
+
+PROMPT = company_prompt()
+BATCH_PROMPT = batch_prompt()
+
+# OpenAI-compatible providers by name. Each reads <NAME>_API_KEY, <NAME>_MODEL, <NAME>_BASE_URL,
+# <NAME>_STRUCTURED (0 for servers without response_format) and the <NAME>_RPM, _TPM and
+# _MAX_CONCURRENCY limits; any other name works once <NAME>_BASE_URL is set.
+PROVIDERS = {
+    "openai": {"model": "gpt-4o-mini"},
+    "groq": {"base_url": "https://api.groq.com/openai/v1", "model": "llama-3.3-70b-versatile"},
+    "together": {"base_url": "https://api.together.xyz/v1", "model": "meta-llama/Llama-3.3-70B-Instruct-Turbo"},
+    # local servers, e.g. on CPU; they accept any api key and answer with the model they were started with
+    "llamacpp": {"base_url": "http://localhost:8080/v1", "model": "local", "api_key": "local"},
+    "vllm": {"base_url": "http://localhost:8000/v1", "api_key": "local"},
+    "ollama": {"base_url": "http://localhost:11434/v1", "model": "llama3.1", "api_key": "local"},
+}
+
+COMPLETION_TOKENS = 300  # rough size of one answer, reserved against the tokens/min quota
+BATCH_TOKEN_BUDGET = 12000  # page tokens packed into one batched request
+BATCH_MAX_PAGES = 8
+
+
+def pack_batches(texts: List[str], token_budget: int = BATCH_TOKEN_BUDGET,
+                 max_pages: int = BATCH_MAX_PAGES) -> List[List[int]]:
+    """Groups page indices into batches whose content fits token_budget"""
+    batches, current, used = [], [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (used + tokens > token_budget or len(current) >= max_pages):
+            batches.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_output(llm_output: Optional[str]) -> Dict[int, Dict]:
+    """Maps page index to its result dict from a {"companies": [...]} answer, skipping anything malformed"""
+    data, _ = parse_outcome(llm_output)
+    items = data.get("companies") if data is not None else None
+    if not isinstance(items, list):
+        if llm_output:
+            logger.error("Error parsing batched LLM output")
+        return {}
+    results = {}
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("index"), int):
+            results[item.pop("index")] = item
+    return results
+
+
+def _retry_after(headers) -> Optional[float]:
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_retry_after(headers.get("retry-after"))
+
 
 class LLMAPI(ABC):
     """Abstract class for LLM providers"""
+    parse_stats: Optional[ParseStats] = None
 
     @abstractmethod
-    def get_company_info(self, text: str) -> Optional[str]:
-        """Takes all text from html and extracts company info"""
+    def get_company_info(self, text: str, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+        """Takes all text from html and extracts company info, only the given fields if any"""
         pass
 
+    def get_companies_info(self, texts: List[str], fields: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        """Extracts company info for several pages, one result per page in the same order"""
+        return [self.get_company_info(text, fields) for text in texts]
+
+
+def env_prefix(name: str) -> str:
+    return re.sub(r"[^A-Z0-9]+", "_", name.upper())
+
 
 class OpenAIAPI(LLMAPI):
-    """Implementation using OpenAI API"""
+    """Implementation using the OpenAI chat API, of OpenAI or any compatible server (see PROVIDERS)"""
+
+    def __init__(self, batch_token_budget: int = BATCH_TOKEN_BUDGET, batch_max_pages: int = BATCH_MAX_PAGES,
+                 limiter: Optional[AdaptiveLimiter] = None, structured: bool = True, max_reasks: int = 1,
+                 name: str = "openai"):
+        prefix = env_prefix(name)
+        defaults = PROVIDERS.get(name, {})
+        self.name = name
+        self.api_key = os.getenv(f"{prefix}_API_KEY", defaults.get("api_key"))
+        self.model = os.getenv(f"{prefix}_MODEL", defaults.get("model"))
+        base_url = os.getenv(f"{prefix}_BASE_URL", defaults.get("base_url"))
+        if name not in PROVIDERS and not base_url:
+            raise ValueError(f"Unsupported LLM {name}, set {prefix}_BASE_URL to use an OpenAI-compatible server")
+        if not self.model:
+            raise ValueError(f"Set {prefix}_MODEL to the model the {name} server runs")
+        # Retries are left to the limiter, which all workers sharing this client go through.
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
+        self.limiter = limiter or AdaptiveLimiter.from_env(prefix)
+        self.batch_token_budget = batch_token_budget
+        self.batch_max_pages = batch_max_pages
+        # with structured=True the answer is constrained to the Company JSON schema;
+        # servers that don't support response_format need structured=False
+        self.structured = structured and os.getenv(f"{prefix}_STRUCTURED", "1").lower() not in ("0", "false", "no")
+        self.max_reasks = max_reasks
+        self.parse_stats = ParseStats()
+
+    def get_company_info(self, text: str, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+        """
+        Returns the page's company as a JSON object, with only the given fields if any. Answers
+        that don't parse are repaired locally first; only if that fails is the model asked
+        again, up to max_reasks times.
+        """
+        messages = [{"role": "user", "content": f"{company_prompt(fields)}\n{text}"}]
+        output = self._complete(messages, self._format(partial(company_schema, fields), "company"))
+        for attempt in range(self.max_reasks + 1):
+            if not output:
+                return None  # the request failed, nothing to parse
+            data, outcome = parse_outcome(output)
+            if data is not None:
+                self.parse_stats.count(outcome)
+                return json.dumps(data, ensure_ascii=False)
+            if attempt == self.max_reasks:
+                break
+            logger.warning("Unparseable LLM output, asking again")
+            self.parse_stats.count("reasks")
+            messages += [{"role": "assistant", "content": output}, {"role": "user", "content": REASK_PROMPT}]
+            output = self._complete(messages, self._format(partial(company_schema, fields), "company"))
+        self.parse_stats.count("failed")
+        log_payload(logger, "Last LLM answer", output)
+        logger.error("Error parsing LLM output, giving up")
+        return None
+
+    def _format(self, schema, name: str) -> Optional[Dict]:
+        return response_format(schema(), name) if self.structured else None
 
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # Default to gpt-4o-mini
-        self.client = OpenAI(api_key=self.api_key)
+    def get_companies_info(self, texts: List[str], fields: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        """
+        Packs several pages into one request to save the repeated prompt and round-trips.
+        Each result is the page's JSON object, just like get_company_info returns.
+        """
+        results: List[Optional[str]] = [None] * len(texts)
+        for batch in pack_batches(texts, self.batch_token_budget, self.batch_max_pages):
+            self._extract_batch(texts, batch, results, fields)
+        return results
 
-    def get_company_info(self, text: str) -> Optional[str]:
+    def _extract_batch(self, texts: List[str], indices: List[int], results: List[Optional[str]],
+                       fields: Optional[Sequence[str]] = None):
+        if len(indices) == 1:
+            results[indices[0]] = self.get_company_info(texts[indices[0]], fields)
+            return
+
+        content = "\n\n".join(f"### Page {n}\n{texts[i]}" for n, i in enumerate(indices))
+        messages = [{"role": "user", "content": f"{batch_prompt(fields)}\n{content}"}]
+        items = parse_batch_output(self._complete(messages, self._format(partial(batch_schema, fields), "companies")))
+        missing = []
+        for n, i in enumerate(indices):
+            if n in items:
+                results[i] = json.dumps(items[n], ensure_ascii=False)
+                self.parse_stats.count("parsed")
+            else:
+                missing.append(i)
+        if missing:
+            self.parse_stats.count("reasks", len(missing))
+
+        if len(missing) == len(indices):
+            # the whole batch failed, retry each half on its own
+            logger.warning(f"Batch of {len(indices)} pages failed, splitting")
+            half = len(indices) // 2
+            self._extract_batch(texts, indices[:half], results, fields)
+            self._extract_batch(texts, indices[half:], results, fields)
+        elif missing:
+            self._extract_batch(texts, missing, results, fields)
+
+    def _complete(self, messages: List[Dict], response_format: Optional[Dict] = None) -> Optional[str]:
+        # budget for the prompt plus a typical answer
+        tokens = sum(estimate_tokens(message["content"]) for message in messages) + COMPLETION_TOKENS
+        options = {"response_format": response_format} if response_format else {}
+        for attempt in range(self.limiter.max_retries + 1):
+            try:
+                with self.limiter.slot(tokens):
+                    with metrics.timer("llm_request", provider=self.name):
+                        response = self.client.chat.completions.with_raw_response.create(
+                            model=self.model,
+                            messages=messages,
+                            **options
+                        )
+                self.limiter.on_success(response.headers)
+                completion = response.parse()
+                if completion.usage is not None:
+                    metrics.count("llm_tokens_total", completion.usage.prompt_tokens, kind="prompt")
+                    metrics.count("llm_tokens_total", completion.usage.completion_tokens, kind="completion")
+                return completion.choices[0].message.content
+            except openai.RateLimitError as e:
+                metrics.count("errors_total", stage="llm", error=type(e).__name__)
+                self.limiter.on_rate_limited(e.response.headers)
+                if attempt == self.limiter.max_retries:
+                    break
+                delay = self.limiter.backoff(attempt, _retry_after(e.response.headers))
+                logger.warning(f"Rate limit exceeded, retrying in {delay:.1f}s")
+                time.sleep(delay)
+            except openai.APITimeoutError as e:
+                metrics.count("errors_total", stage="llm", error=type(e).__name__)
+                logger.error(f"Timeout Error: {e}")
+                return
+            except openai.AuthenticationError as e:
+                metrics.count("errors_total", stage="llm", error=type(e).__name__)
+                logger.error(f"Authentication Error: {e}")
+                return
+            except Exception as e:
+                metrics.count("errors_total", stage="llm", error=type(e).__name__)
+                logger.error(f"General LLM Error: {e}")
+                return
+        logger.error(f"Rate limit exceeded, giving up after {self.limiter.max_retries} retries.")
+
+
+T = TypeVar("T")
+
+
+class _Route:
+    """Recent latencies and outcomes of one provider behind an LLMRouter"""
+
+    def __init__(self, llm: LLMAPI, window: int):
+        self.llm = llm
+        self.name = getattr(llm, "name", type(llm).__name__)
+        self.latencies = deque(maxlen=window)  # seconds per page of answered requests
+        self.outcomes = deque(maxlen=window)  # share of pages answered per request
+        self.in_flight = 0
+        self.requests = self.errors = 0
+        self.cooling_until = 0.0
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def headroom(self) -> float:
+        limiter = getattr(self.llm, "limiter", None)
+        return limiter.headroom() if limiter is not None else 1.0
+
+    def capacity(self) -> int:
+        limiter = getattr(self.llm, "limiter", None)
+        return max(1, int(limiter.concurrency)) if limiter is not None else 1
+
+
+class LLMRouter(LLMAPI):
+    """
+    Spreads requests over several providers. Each request goes to the provider with the
+    lowest expected latency: its recent p95, raised by the requests it has in flight, its
+    recent error rate and how little of its quota is left. A request that fails is retried
+    on the next best provider, and a provider failing most of its recent requests is left
+    alone for cooldown seconds.
+    """
+
+    def __init__(self, providers: List[LLMAPI], window: int = 100, min_samples: int = 5, cooldown: float = 30.0,
+                 failover_retries: int = 1):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.routes = [_Route(llm, window) for llm in providers]
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.model = "+".join(getattr(llm, "model", type(llm).__name__) for llm in providers)
+        self.parse_stats = ParseStats()
+        for llm in providers:
+            if llm.parse_stats is not None:
+                llm.parse_stats = self.parse_stats
+            # rather than waiting out a 429 on one provider, fail over to another
+            limiter = getattr(llm, "limiter", None)
+            if limiter is not None and len(providers) > 1:
+                limiter.max_retries = min(limiter.max_retries, failover_retries)
+
+    def _score(self, route: _Route, fallback: float, now: float) -> float:
+        if route.cooling_until > now:
+            return math.inf
+        known = route.p95() if len(route.latencies) >= self.min_samples else None
+        latency = known if known is not None else fallback / 2  # optimistic until there is data, so it gets tried
+        load = 1 + route.in_flight / route.capacity()
+        # smoothed, so one early failure doesn't rule a provider out for good
+        errors = (len(route.outcomes) - sum(route.outcomes)) / (len(route.outcomes) + self.min_samples)
+        return latency * load / (1 - errors) / max(route.headroom(), 0.05)
+
+    def _ranked(self) -> List[_Route]:
+        """All providers, best first; cooling ones last, as a final resort"""
+        now = time.monotonic()
+        with self.lock:
+            known = [route.p95() for route in self.routes if len(route.latencies) >= self.min_samples]
+            fallback = min(known) if known else 1.0
+            scores = {id(route): self._score(route, fallback, now) for route in self.routes}
+            cooling = {id(route): route.cooling_until for route in self.routes}
+        return sorted(self.routes, key=lambda route: (scores[id(route)], cooling[id(route)]))
+
+    def _call(self, route: _Route, call: Callable[[LLMAPI], T], pages: int, answered: Callable[[T], int],
+              default: T) -> T:
+        with self.lock:
+            route.in_flight += 1
+            route.requests += 1
+        t0 = time.perf_counter()
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": f"{PROMPT}\n{text}"}]
-            )
-            return completion.choices[0].message.content
-        except openai.RateLimitError:
-            logger.error("Rate limit exceeded.")
-            time.sleep(5) # may cause loop
-            return self.get_company_info(text)
-        except openai.APITimeoutError as e:
-            logger.error(f"Timeout Error: {e}")
-        except openai.AuthenticationError as e:
-            logger.error(f"Authentication Error: {e}")
+            result = call(route.llm)
         except Exception as e:
-            logger.error(f"General LLM Error: {e}")
+            logger.error(f"LLM provider {route.name} failed: {e}")
+            result = default
+        seconds = time.perf_counter() - t0
+        share = answered(result) / pages
+        metrics.observe("llm_provider_seconds", seconds, provider=route.name)
+        metrics.count("llm_routed_total", pages, provider=route.name)
+        with self.lock:
+            route.in_flight -= 1
+            if share:  # failures are often fast, they would make a broken provider look quick
+                route.latencies.append(seconds / pages)
+            route.outcomes.append(share)
+            if share < 1:
+                route.errors += 1
+            if len(route.outcomes) >= self.min_samples and route.error_rate() > 0.5:
+                logger.warning(f"LLM provider {route.name} failing {route.error_rate():.0%} of requests, "
+                               f"pausing it for {self.cooldown:.0f}s")
+                route.cooling_until = time.monotonic() + self.cooldown
+                route.outcomes.clear()  # judged afresh once the cooldown is over
+        return result
+
+    def get_company_info(self, text: str, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+        for route in self._ranked():
+            output = self._call(route, lambda llm: llm.get_company_info(text, fields), 1, lambda out: int(bool(out)),
+                                None)
+            if output:
+                return output
+            metrics.count("llm_failovers_total", provider=route.name)
+        return None
+
+    def get_companies_info(self, texts: List[str], fields: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        results: List[Optional[str]] = [None] * len(texts)
+        missing = list(range(len(texts)))
+        for route in self._ranked():
+            pending = missing
+            outputs = self._call(route, lambda llm: llm.get_companies_info([texts[i] for i in pending], fields),
+                                 len(pending), lambda outs: sum(1 for out in outs if out), [None] * len(pending))
+            for i, output in zip(pending, outputs):
+                results[i] = output
+            missing = [i for i in pending if results[i] is None]
+            if not missing:
+                break
+            metrics.count("llm_failovers_total", len(missing), provider=route.name)
+        return results
+
+    def report(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        with self.lock:
+            return {route.name: {
+                "requests": route.requests,
+                "errors": route.errors,
+                "error_rate": round(route.error_rate(), 4),
+                "p95": round(route.p95() or 0.0, 3),
+                "headroom": round(route.headroom(), 3),
+                "cooling": route.cooling_until > now,
+            } for route in self.routes}
+
+
+class CachedLLM(LLMAPI):
+    """Serves repeated requests from an LLMCache in front of any LLMAPI implementation"""
+
+    def __init__(self, llm: LLMAPI, cache: LLMCache):
+        self.llm = llm
+        self.cache = cache
+        self.model = getattr(llm, "model", type(llm).__name__)
+        self.parse_stats = llm.parse_stats
+
+    def get_company_info(self, text: str, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+        key = cache_key(text, company_prompt(fields), self.model)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        output = self.llm.get_company_info(text, fields)
+        if output:  # failed calls are retried next run
+            self.cache.put(key, output)
+        return output
+
+    def get_companies_info(self, texts: List[str], fields: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        prompt = company_prompt(fields)
+        keys = [cache_key(text, prompt, self.model) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            outputs = self.llm.get_companies_info([texts[i] for i in misses], fields)
+            for i, output in zip(misses, outputs):
+                results[i] = output
+                if output:
+                    self.cache.put(keys[i], output)
+        return results
 
 
-def get_llm(provider_name: str) -> LLMAPI:
-    if provider_name == "openai":
-        return OpenAIAPI()
-    else:
-        raise ValueError("Unsupported LLM")
\ No newline at end of file
+def get_llm(provider_name: str, cache: bool = True, cache_path: Optional[str] = None,
+            structured: bool = True) -> LLMAPI:
+    """
+    provider_name is one of PROVIDERS, or any name with <NAME>_BASE_URL set; several names
+    separated by commas, e.g. "openai,llamacpp", are spread over by an LLMRouter
+    """
+    names = [name.strip() for name in provider_name.split(",") if name.strip()]
+    if not names:
+        raise ValueError("Unsupported LLM")
+    providers = [OpenAIAPI(structured=structured, name=name) for name in names]
+    llm = providers[0] if len(providers) == 1 else LLMRouter(providers)
+    if not cache:
+        return llm
+    return CachedLLM(llm, LLMCache(cache_path) if cache_path else LLMCache.from_env())
\ No newline at end of file
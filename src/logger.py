@@ -1,20 +1,123 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import zlib
+from typing import Dict, Optional
 
-def get_logger(name):
-    logger = logging.getLogger(name)
-    if not logger.hasHandlers():  # Avoid adding handlers multiple times
-        logger.setLevel(logging.DEBUG)
+DEFAULT_LOG_FILE = "crawler.log"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # rotate the log file past this size
+DEFAULT_BACKUPS = 5
+DEFAULT_PAYLOAD_SAMPLE = 0.01  # share of large debug payloads (page contents, LLM answers) that get logged
+DEFAULT_PAYLOAD_CHARS = 2000  # logged payloads are cut to this length
+
+FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s'
+
+_lock = threading.Lock()
+_loggers: Dict[str, logging.Logger] = {}
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_level = logging.INFO
+_payload_sample = DEFAULT_PAYLOAD_SAMPLE
+_payload_chars = DEFAULT_PAYLOAD_CHARS
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def configure_logging(level: Optional[str] = None, filename: Optional[str] = None, max_bytes: Optional[int] = None,
+                      backups: Optional[int] = None, compress: Optional[bool] = None,
+                      payload_sample: Optional[float] = None, payload_chars: Optional[int] = None):
+    """
+    Sets up (or replaces) the background log writer. Loggers only put records on a queue;
+    one listener thread formats them and writes to stderr and a rotating log file, gzipping
+    rotated files if compress is set. Unset arguments come from LOG_LEVEL, LOG_FILE (empty
+    for no file), LOG_MAX_BYTES, LOG_BACKUPS, LOG_COMPRESS, LOG_PAYLOAD_SAMPLE and
+    LOG_PAYLOAD_CHARS, then the defaults above.
+    """
+    global _queue_handler, _listener, _level, _payload_sample, _payload_chars
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    filename = filename if filename is not None else os.getenv("LOG_FILE", DEFAULT_LOG_FILE)
+    max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LOG_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backups = backups if backups is not None else int(os.getenv("LOG_BACKUPS", DEFAULT_BACKUPS))
+    if compress is None:
+        compress = os.getenv("LOG_COMPRESS", "").lower() in ("1", "true", "yes")
+    if payload_sample is None:
+        payload_sample = float(os.getenv("LOG_PAYLOAD_SAMPLE", DEFAULT_PAYLOAD_SAMPLE))
+    if payload_chars is None:
+        payload_chars = int(os.getenv("LOG_PAYLOAD_CHARS", DEFAULT_PAYLOAD_CHARS))
 
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s')
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.StreamHandler()]
+    # worker processes (see offload.py) leave the file to the main process, rotation isn't multi-process safe
+    if filename and multiprocessing.current_process().name == "MainProcess":
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+        if compress:
+            file_handler.namer = lambda name: name + ".gz"
+            file_handler.rotator = _gzip_rotator
+        handlers.append(file_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
 
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+    with _lock:
+        if _listener is not None:
+            _listener.stop()  # flushes what was queued to the old handlers
+            for handler in _listener.handlers:
+                handler.close()
+        records = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        _level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        _payload_sample = payload_sample
+        _payload_chars = payload_chars
+        for logger in _loggers.values():
+            logger.removeHandler(_queue_handler)
+            logger.addHandler(queue_handler)
+            logger.setLevel(_level)
+        _queue_handler = queue_handler
+
+
+def _stop():
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+atexit.register(_stop)
+
+
+def get_logger(name):
+    if _queue_handler is None:
+        configure_logging()
+    with _lock:
+        logger = _loggers.get(name)
+        if logger is None:
+            logger = _loggers[name] = logging.getLogger(name)
+            logger.setLevel(_level)
+            logger.addHandler(_queue_handler)
+    return logger
 
-        # File handler
-        file_handler = logging.FileHandler('crawler.log')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
-    return logger
\ No newline at end of file
+def log_payload(logger: logging.Logger, message: str, payload: Optional[str], key: Optional[str] = None):
+    """
+    Debug-logs a large payload, cut to LOG_PAYLOAD_CHARS. With a key (e.g. the url) only a
+    LOG_PAYLOAD_SAMPLE share of keys is logged, the same ones every run; without one the
+    payload is always logged, for rare events like an unparseable answer.
+    """
+    if payload is None or not logger.isEnabledFor(logging.DEBUG):
+        return
+    if key is not None and zlib.crc32(key.encode("utf-8")) / 2 ** 32 >= _payload_sample:
+        return
+    if len(payload) > _payload_chars:
+        payload = f"{payload[:_payload_chars]}... ({len(payload) - _payload_chars} more characters)"
+    logger.debug(f"{message}:\n{payload}")
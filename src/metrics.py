@@ -0,0 +1,195 @@
+"""
+Process-wide counters and latency histograms for the hot paths of a crawl.
+
+    import metrics
+    with metrics.timer("fetch"):
+        ...
+    metrics.count("fetch_bytes_total", len(body))
+    metrics.summary()       # dict for the run report
+    metrics.serve(9100)     # Prometheus text format on http://localhost:9100/metrics
+"""
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Tuple
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+SAMPLE_SIZE = 2048  # observations kept per histogram for the quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "smartcrawler_"
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """Count, sum and max of all observations, plus a uniform sample of them for quantiles"""
+
+    def __init__(self, size: int = SAMPLE_SIZE):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample: List[float] = []
+        self.rng = random.Random(0)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            # reservoir sampling keeps every observation equally likely to be in the sample
+            slot = self.rng.randrange(self.count)
+            if slot < self.size:
+                self.sample[slot] = value
+
+    def quantile(self, q: float) -> float:
+        if not self.sample:
+            return 0.0
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def as_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            **{f"p{int(q * 100)}": round(self.quantile(q), 6) for q in QUANTILES},
+            "max": round(self.max, 6),
+        }
+
+
+def _key(name: str, labels: Dict[str, object]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra) -> str:
+    pairs = list(labels) + [(label, str(value)) for label, value in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and histograms, keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Key, float] = {}
+        self.gauges: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str, name: str = "stage_seconds", **labels) -> Iterator[None]:
+        """Observes the seconds spent in the block, whether it returns or raises"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, stage=stage, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                "histograms": [{"name": name, "labels": dict(labels), **histogram.as_dict()}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def prometheus_text(self) -> str:
+        """The metrics in the Prometheus text exposition format, histograms as summaries"""
+        lines, typed = [], set()
+
+        def declare(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                declare(name, "counter")
+                lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                declare(name, "gauge")
+                lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                declare(name, "summary")
+                for q in QUANTILES:
+                    lines.append(f"{PREFIX}{name}{_labels(labels, quantile=q)} {histogram.quantile(q)}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {histogram.total}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = Registry()
+count = _registry.count
+gauge = _registry.gauge
+observe = _registry.observe
+timer = _registry.timer
+reset = _registry.reset
+summary = _registry.summary
+prometheus_text = _registry.prometheus_text
+
+
+def write_summary(path: str, **extra):
+    """Writes the run report: every metric plus any extra sections, e.g. the pipeline stage stats"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**extra, **summary()}, f, indent=2)
+    logger.info(f"Run metrics written to {path}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics for Prometheus from a background thread; call shutdown() on the result to stop"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
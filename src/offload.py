@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# pages shorter than this (in characters) parse faster in-process than a round trip to a worker takes
+DEFAULT_MIN_SIZE = 32 * 1024
+
+
+class ProcessOffload:
+    """
+    Runs a CPU-bound func(data, *args) in a pool of worker processes, so threads calling it
+    are not serialized by the GIL. Only data and the small args are pickled to the worker
+    and only func's result comes back. Inputs shorter than min_size run in the calling
+    thread. Use at least `processes` calling threads to keep the pool busy.
+    """
+
+    def __init__(self, func: Callable, processes: Optional[int] = None, min_size: int = DEFAULT_MIN_SIZE,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.func = func
+        self.processes = processes or os.cpu_count() or 1
+        self.min_size = min_size
+        # workers are started fresh rather than forked from a process full of threads
+        self.pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=initializer, initargs=initargs)
+        self.lock = threading.Lock()
+        self.offloaded = 0
+        self.inline = 0
+
+    def __call__(self, data, *args):
+        if len(data) < self.min_size:
+            with self.lock:
+                self.inline += 1
+            return self.func(data, *args)
+        with self.lock:
+            self.offloaded += 1
+        return self.pool.submit(self.func, data, *args).result()
+
+    def close(self):
+        self.pool.shutdown()
+        logger.info(f"{self.func.__name__}: {self.offloaded} calls in {self.processes} worker processes, "
+                    f"{self.inline} in-process")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
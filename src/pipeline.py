@@ -0,0 +1,215 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from logger import get_logger
+import metrics
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """A pipeline step served by its own bounded pool of worker threads"""
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 0  # 0 -> 2 * workers
+    batch_size: int = 1  # >1 hands func a list of up to batch_size items and expects a list back
+    batch_wait: float = 0.5  # seconds to wait for a batch to fill up
+
+
+@dataclass
+class StageStats:
+    """Counters collected for one stage during a run"""
+    name: str
+    workers: int
+    processed: int = 0
+    dropped: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items handed to the next stage per second of wall time"""
+        return self.processed / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Share of the workers' time spent busy; the stage closest to 1 is the bottleneck"""
+        return self.busy_seconds / (self.workers * self.wall_seconds) if self.wall_seconds else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "throughput": round(self.throughput, 3),
+            "utilization": round(self.utilization, 3),
+        }
+
+
+class _Envelope:
+    __slots__ = ("seq", "item")
+
+    def __init__(self, seq: int, item: Any):
+        self.seq = seq
+        self.item = item
+
+
+class _Sequencer:
+    """Releases items into the final stage in input order"""
+
+    def __init__(self, out_queue: queue.Queue):
+        self.out_queue = out_queue
+        self.next_seq = 0
+        self.pending: Dict[int, Optional[_Envelope]] = {}
+        self.lock = threading.Lock()
+
+    def put(self, seq: int, envelope: Optional[_Envelope]):
+        # None marks an item dropped by an earlier stage
+        with self.lock:
+            self.pending[seq] = envelope
+            while self.next_seq in self.pending:
+                ready = self.pending.pop(self.next_seq)
+                self.next_seq += 1
+                if ready is not None:
+                    self.out_queue.put(ready)
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages. Every stage has its own worker pool and a
+    bounded input queue, so a slow stage blocks the ones in front of it (backpressure)
+    instead of buffering the whole input in memory.
+
+    A stage function returns the item for the next stage, or None to drop it. Batched
+    stages get a list of items and return a list of results in the same order.
+    With ordered=True the last stage sees items in the same order as the input.
+    on_drop, if given, is called with every item a stage drops or fails on, the stage
+    name and whether the stage raised.
+    """
+
+    def __init__(self, stages: List[Stage], ordered: bool = False, max_in_flight: int = 0,
+                 on_drop: Optional[Callable[[Any, str, bool], None]] = None):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.ordered = ordered
+        total_workers = sum(stage.workers for stage in stages)
+        # ordered runs hold finished items until the slowest one catches up, so cap the window
+        self.max_in_flight = max_in_flight or 4 * total_workers
+        self.on_drop = on_drop
+        self.stats = [StageStats(stage.name, stage.workers) for stage in stages]
+
+    def run(self, items: Iterable[Any]) -> List[StageStats]:
+        queues = [queue.Queue(maxsize=stage.queue_size or 2 * stage.workers) for stage in self.stages]
+        window = threading.BoundedSemaphore(self.max_in_flight) if self.ordered else None
+        sequencer = _Sequencer(queues[-1]) if self.ordered and len(self.stages) > 1 else None
+        stats_lock = threading.Lock()
+        started = time.perf_counter()
+
+        def finish(envelope: _Envelope, index: int, result: Any):
+            """Routes the result of stage `index` onwards"""
+            last = index == len(self.stages) - 1
+            if result is None or last:
+                if sequencer is not None and not last:
+                    sequencer.put(envelope.seq, None)
+                if window is not None:
+                    window.release()
+                return
+            envelope.item = result
+            if sequencer is not None and index == len(self.stages) - 2:
+                sequencer.put(envelope.seq, envelope)
+            else:
+                queues[index + 1].put(envelope)
+
+        def next_batch(index: int) -> List:
+            """Blocks for one item, then tops the batch up until it is full or batch_wait passes"""
+            stage = self.stages[index]
+            batch = [queues[index].get()]
+            deadline = time.monotonic() + stage.batch_wait
+            while batch[-1] is not _STOP and len(batch) < stage.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(queues[index].get(timeout=timeout))
+                except queue.Empty:
+                    break
+            return batch
+
+        def worker(index: int):
+            stage = self.stages[index]
+            stats = self.stats[index]
+            while True:
+                envelopes = next_batch(index)
+                metrics.observe("queue_depth", queues[index].qsize(), stage=stage.name)
+                stop = envelopes[-1] is _STOP
+                if stop:
+                    envelopes.pop()
+                if envelopes:
+                    t0 = time.perf_counter()
+                    try:
+                        if stage.batch_size > 1:
+                            results = stage.func([envelope.item for envelope in envelopes])
+                        else:
+                            results = [stage.func(envelopes[0].item)]
+                        error = False
+                    except Exception as e:
+                        metrics.count("errors_total", stage=stage.name, error=type(e).__name__)
+                        logger.error(f"Unexpected Error in stage {stage.name}: {e}")
+                        results, error = [None] * len(envelopes), True
+                    elapsed = time.perf_counter() - t0
+                    with stats_lock:
+                        stats.busy_seconds += elapsed
+                        for result in results:
+                            if error:
+                                stats.errors += 1
+                            elif result is None:
+                                stats.dropped += 1
+                            else:
+                                stats.processed += 1
+                    for envelope, result in zip(envelopes, results):
+                        if result is None and self.on_drop is not None:
+                            try:
+                                self.on_drop(envelope.item, stage.name, error)
+                            except Exception as e:
+                                logger.error(f"Error handling an item dropped in stage {stage.name}: {e}")
+                        finish(envelope, index, result)
+                if stop:
+                    return
+
+        pools = []
+        for index, stage in enumerate(self.stages):
+            threads = [threading.Thread(target=worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                       for n in range(stage.workers)]
+            for thread in threads:
+                thread.start()
+            pools.append(threads)
+
+        for seq, item in enumerate(items):
+            if window is not None:
+                window.acquire()
+            queues[0].put(_Envelope(seq, item))
+
+        # shut stages down front to back so no in-flight item is lost
+        for index, threads in enumerate(pools):
+            for _ in threads:
+                queues[index].put(_STOP)
+            for thread in threads:
+                thread.join()
+            self.stats[index].wall_seconds = time.perf_counter() - started
+
+        for stats in self.stats:
+            logger.info(f"Stage {stats.name}: {stats.processed} ok, {stats.dropped} dropped, "
+                        f"{stats.errors} errors, {stats.throughput:.2f} items/s")
+        return self.stats
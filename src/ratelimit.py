@@ -0,0 +1,187 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either a number of seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parses OpenAI reset headers such as 1s, 20ms or 6m0s into seconds"""
+    if not value:
+        return None
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve tokens up front and are told how long to
+    wait, so concurrent callers queue up behind each other instead of all retrying at once.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Takes tokens (possibly going into debt) and returns the seconds to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def level(self) -> float:
+        """Tokens available right now, without taking any"""
+        with self.lock:
+            return min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+    def acquire(self, tokens: float = 1.0):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    Shared by every worker calling one LLM provider. Keeps request and token rates under the
+    per-minute quota, follows the provider's rate-limit headers, and adapts the number of
+    concurrent calls AIMD-style: +1 after a window of successes, halved on a 429.
+    """
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 200_000,
+                 max_concurrency: int = 16, min_concurrency: int = 1, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        # up to 10s of quota may be used in a burst
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 6))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max(min_concurrency, max_concurrency // 2))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.active = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+        self.rate_limited = 0
+        # share of the provider's quota left by its last headers, and until when that holds
+        self.quota_left: Dict[str, Tuple[float, float]] = {}
+
+    @classmethod
+    def from_env(cls, prefix: str = "OPENAI") -> "AdaptiveLimiter":
+        return cls(float(os.getenv(f"{prefix}_RPM", 500)), float(os.getenv(f"{prefix}_TPM", 200_000)),
+                   int(os.getenv(f"{prefix}_MAX_CONCURRENCY", 16)))
+
+    @contextmanager
+    def slot(self, tokens: float = 0):
+        """Waits for a concurrency slot and for request/token budget, then holds the slot"""
+        with self.condition:
+            while self.active >= int(self.concurrency):
+                self.condition.wait()
+            self.active += 1
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            self.request_bucket.acquire()
+            if tokens:
+                self.token_bucket.acquire(min(tokens, self.token_bucket.capacity))
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify()
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        with self.condition:
+            if self.concurrency < self.max_concurrency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.condition.notify()
+        if headers:
+            self.update_from_headers(headers)
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]] = None):
+        now = time.monotonic()
+        with self.condition:
+            self.rate_limited += 1
+            # in-flight calls all fail together; count that as a single congestion signal
+            if now - self.last_decrease > 1.0:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                self.last_decrease = now
+                logger.warning(f"Rate limited, lowering LLM concurrency to {int(self.concurrency)}")
+        if headers:
+            self.update_from_headers(headers)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Adopts the provider's per-minute limits when they are lower than ours, and pauses
+        everyone until the quota resets once the provider says it is used up.
+        """
+        for kind, bucket in (("requests", self.request_bucket), ("tokens", self.token_bucket)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if limit is not None and float(limit) / 60 < bucket.rate:
+                with bucket.lock:
+                    bucket.rate = float(limit) / 60
+                    bucket.capacity = max(1.0, float(limit) / 6)
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and limit is not None and float(limit) > 0:
+                self.quota_left[kind] = (float(remaining) / float(limit), time.monotonic() + (reset or 60))
+            if remaining is not None and reset and float(remaining) <= 0:
+                with self.condition:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+
+    def headroom(self) -> float:
+        """Share of the request and token budget left, by our buckets or the provider's headers; 0 while paused"""
+        now = time.monotonic()
+        if self.paused_until > now:
+            return 0.0
+        shares = [bucket.level() / bucket.capacity for bucket in (self.request_bucket, self.token_bucket)]
+        shares += [share for share, until in list(self.quota_left.values()) if until > now]
+        return max(0.0, min(1.0, *shares))
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Jittered exponential delay before retry number attempt (0-based)"""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay / 2)
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
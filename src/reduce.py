@@ -0,0 +1,146 @@
+import re
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from urls import site_domain
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional, the estimate below is close enough for budgeting
+    _encoding = None
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_BOILERPLATE = re.compile(
+    r"^(share( on| this)?|tweet|follow us|subscribe|sign up|log ?in|menu|search|back( to .*)?|"
+    r"next|previous|read more|learn more|view all|skip to .*|close|cookie.*|accept( all)?|"
+    r"privacy policy|terms( of (use|service))?|all rights reserved.*|©.*|copyright.*)$",
+    re.IGNORECASE,
+)
+_SHARE_LINK = re.compile(
+    r"(twitter\.com/(intent|share)|x\.com/intent|facebook\.com/(sharer|share\.php)|"
+    r"linkedin\.com/share|pinterest\.com/pin/create|"
+    r"api\.whatsapp\.com/send|wa\.me/\?|reddit\.com/submit|^mailto:\?)",
+    re.IGNORECASE,
+)
+_SLUG_STOPWORDS = {"inc", "co", "the", "and", "ai", "io", "com", "www", "llc", "ltd"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token count: exact with tiktoken installed, otherwise a word-piece estimate"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # long words split into several BPE tokens, roughly one per 6 characters
+    return sum(1 + (len(piece) - 1) // 6 for piece in _PIECE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest start of text that estimate_tokens counts as at most max_tokens"""
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens]).rstrip()
+    tokens, end = 0, 0
+    for piece in _PIECE.finditer(text):
+        tokens += 1 + (len(piece.group()) - 1) // 6
+        if tokens > max_tokens:
+            break
+        end = piece.end()
+    return text[:end]
+
+
+def name_tokens(source_url: str) -> Set[str]:
+    # https://www.nvfund.com/portfolio/amphista -> {"amphista"}
+    path = urlparse(source_url).path.rstrip("/")
+    slug = path.rsplit("/", 1)[-1].lower()
+    return {t for t in re.split(r"[^a-z0-9]+", slug) if len(t) > 2 and not t.isdigit() and t not in _SLUG_STOPWORDS}
+
+
+def _score_texts(texts: List[str], headings: Set[str], names: Set[str]) -> List[Optional[float]]:
+    """None marks a block to drop outright"""
+    scores: List[Optional[float]] = []
+    seen = set()
+    anchors = []
+    for index, text in enumerate(texts):
+        key = text.casefold()
+        if key in seen or _BOILERPLATE.match(text) or not _PIECE.search(text) or not any(c.isalnum() for c in text):
+            scores.append(None)
+            continue
+        seen.add(key)
+        score = 1.0
+        if text in headings:
+            score += 3
+            anchors.append(index)
+        if names and any(name in key for name in names):
+            score += 3
+            anchors.append(index)
+        scores.append(score)
+
+    # blocks right after a heading or a mention of the company are usually its description
+    for anchor in anchors:
+        for distance in range(1, 8):
+            index = anchor + distance
+            if index < len(scores) and scores[index] is not None:
+                scores[index] += max(0.0, 2.0 - 0.25 * distance)
+    return scores
+
+
+def _score_links(links: List[Tuple[str, str]], source_url: str, names: Set[str]) -> List[Optional[float]]:
+    source_domain = site_domain(urlparse(source_url).netloc)
+    scores: List[Optional[float]] = []
+    seen = set()
+    for text, href in links:
+        key = href.strip().rstrip("/").lower()
+        if key in seen or _SHARE_LINK.search(href) or href.startswith(("javascript:", "#")):
+            scores.append(None)
+            continue
+        seen.add(key)
+        if href.startswith("mailto:"):
+            scores.append(4.0)
+            continue
+        domain = site_domain(urlparse(href).netloc)
+        if not domain or domain == source_domain or domain.endswith(f".{source_domain}"):
+            scores.append(0.5)  # navigation inside the VC site
+            continue
+        score = 4.0
+        if names and any(name in domain for name in names):
+            score += 3
+        scores.append(score)
+    return scores
+
+
+def reduce_content(texts: List[str], links: List[Tuple[str, str]], source_url: str, token_budget: int,
+                   headings: Optional[Set[str]] = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Keeps the highest scoring text blocks and links that fit in token_budget, in page order.
+    Text near headings or mentions of the company (taken from the url slug) and links leaving
+    the VC site score highest; duplicate navigation and share widgets are dropped. A text
+    block that no longer fits is cut to the tokens left, links are only kept whole.
+    """
+    names = name_tokens(source_url)
+    candidates = []
+    for index, (text, score) in enumerate(zip(texts, _score_texts(texts, headings or set(), names))):
+        if score is not None:
+            candidates.append((score, 0, index, estimate_tokens(text)))
+    for index, (link, score) in enumerate(zip(links, _score_links(links, source_url, names))):
+        if score is not None:
+            candidates.append((score, 1, index, estimate_tokens(f"{link[0]}: {link[1]}") + 1))
+
+    # best first, earlier on the page breaks ties
+    candidates.sort(key=lambda c: (-c[0], c[2]))
+    remaining = token_budget
+    kept_texts, kept_links = {}, set()
+    for score, kind, index, tokens in candidates:
+        if kind == 0 and tokens > remaining > 0:
+            truncated = truncate_tokens(texts[index], remaining)
+            if truncated:
+                kept_texts[index] = truncated
+                remaining = max(0, remaining - estimate_tokens(truncated))
+            continue
+        if tokens > remaining:
+            continue
+        remaining -= tokens
+        if kind == 0:
+            kept_texts[index] = texts[index]
+        else:
+            kept_links.add(index)
+
+    return ([kept_texts[i] for i in sorted(kept_texts)],
+            [link for i, link in enumerate(links) if i in kept_links])
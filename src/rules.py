@@ -0,0 +1,216 @@
+"""
+Deterministic extraction of Company fields, run before the LLM. Portfolio pages often carry
+the company in machine-readable form: a JSON-LD Organization and OpenGraph tags. Fields
+found there win over the LLM's, which is only asked for the rest; a page where they fill
+every field skips the LLM altogether. The page's links give guesses too: mailto addresses and a
+single outbound link to the company's website. Guesses never override the LLM, they only
+fill fields it left empty.
+"""
+import html
+import json
+import re
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from company import Company
+from reduce import name_tokens
+from structured import SERVER_FIELDS
+from urls import site_domain
+
+FIELDS = [name for name in Company.model_fields if name not in SERVER_FIELDS]
+
+ORGANIZATION_TYPES = {"organization", "corporation", "localbusiness", "company", "ngo", "educationalorganization",
+                      "medicalorganization", "sportsorganization", "onlinebusiness"}
+# outbound links that are never the company's own website
+PROFILE_DOMAINS = {"linkedin.com", "twitter.com", "x.com", "facebook.com", "instagram.com", "youtube.com",
+                   "youtu.be", "vimeo.com", "tiktok.com", "medium.com", "github.com", "crunchbase.com",
+                   "angel.co", "wellfound.com", "pitchbook.com", "apps.apple.com", "play.google.com",
+                   "google.com", "goo.gl", "bit.ly", "t.co", "wikipedia.org"}
+TITLE_SEPARATOR = re.compile(r"\s+[|\-–—·:»]\s+")
+JSON_LD = re.compile(r"<script[^>]*type\s*=\s*[\"']?application/ld\+json[^>]*>(.*?)</script\s*>",
+                     re.IGNORECASE | re.DOTALL)
+META = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r"""([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+TITLE = re.compile(r"<title[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+LINK_LINE = re.compile(r"^(.*): (\S+)$", re.MULTILINE)  # "text: href" lines of extract_html output
+EMAIL = re.compile(r"^[^@\s:/]+@[^@\s:/]+\.[a-zA-Z]{2,}$")
+
+
+def _text(value) -> Optional[str]:
+    if isinstance(value, list):
+        value = next((item for item in value if isinstance(item, (str, dict))), None)
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("@value")
+    if not isinstance(value, str):
+        return None
+    value = " ".join(html.unescape(value).split())
+    return value or None
+
+
+def _json_ld_objects(raw_html: str) -> Iterator[Dict]:
+    for match in JSON_LD.finditer(raw_html):
+        try:
+            data = json.loads(match.group(1).strip(), strict=False)
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(reversed(item))
+            elif isinstance(item, dict):
+                if "@graph" in item:
+                    stack.append(item["@graph"])
+                yield item
+
+
+def _meta_tags(raw_html: str) -> Dict[str, str]:
+    """content of <meta property|name=...> tags by lower-case key, first one wins"""
+    tags: Dict[str, str] = {}
+    for tag in META.finditer(raw_html):
+        attributes = {name.lower(): next(v for v in values if v is not None) if any(v is not None for v in values)
+                      else "" for name, *values in ATTRIBUTE.findall(tag.group(0))}
+        key = (attributes.get("property") or attributes.get("name") or "").lower()
+        content = _text(attributes.get("content"))
+        if key and content:
+            tags.setdefault(key, content)
+    return tags
+
+
+def _mentions(text: Optional[str], names: Set[str]) -> bool:
+    if not text:
+        return False
+    folded = re.sub(r"[^a-z0-9]+", "", text.lower())
+    return any(name in folded for name in names)
+
+
+def _organization(raw_html: str, source_domain: str, names: Set[str]) -> Dict[str, Optional[str]]:
+    """Fields of the JSON-LD Organization describing the company, not the VC publishing the page"""
+    for item in _json_ld_objects(raw_html):
+        types = item.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if not any(isinstance(t, str) and t.lower() in ORGANIZATION_TYPES for t in types):
+            continue
+        url = _text(item.get("url"))
+        name = _text(item.get("name"))
+        if url and site_domain(url) == source_domain:
+            continue  # the VC itself, e.g. a site-wide SEO plugin block
+        if not url and not _mentions(name, names):
+            continue
+        address = item.get("address")
+        address = address[0] if isinstance(address, list) and address else address
+        address = address if isinstance(address, dict) else {}
+        email = _text(item.get("email"))
+        return {
+            "url": url if url and url.startswith(("http://", "https://")) else None,
+            "name": name,
+            "description": _text(item.get("description")),
+            "country": _text(address.get("addressCountry")),
+            "city": _text(address.get("addressLocality")),
+            "email": email.removeprefix("mailto:") if email else None,
+        }
+    return {}
+
+
+def _title_name(title: Optional[str], site_name: Optional[str], names: Set[str]) -> Optional[str]:
+    """The company's part of a page title such as "Acme Robotics | Example Ventures" """
+    if not title:
+        return None
+    site = (site_name or "").casefold()
+    for part in TITLE_SEPARATOR.split(title):
+        part = part.strip()
+        if part and not (site and (site in part.casefold() or part.casefold() in site)) and _mentions(part, names):
+            return part
+    return None
+
+
+def _links(content: str) -> List[str]:
+    _, _, links = content.partition("\n\nHyperlinks:\n")
+    return [href for _, href in LINK_LINE.findall(links)]
+
+
+def _website(hrefs: List[str], source_domain: str, names: Set[str]) -> Optional[str]:
+    """The one outbound link that can be the company's website, preferring one named like the page"""
+    sites: Dict[str, str] = {}
+    for href in hrefs:
+        parts = urlsplit(href)
+        domain = site_domain(href)
+        if parts.scheme not in ("http", "https") or not domain:
+            continue
+        if domain == source_domain or domain.endswith(f".{source_domain}"):
+            continue
+        if any(domain == profile or domain.endswith(f".{profile}") for profile in PROFILE_DOMAINS):
+            continue
+        sites.setdefault(domain, f"{parts.scheme}://{parts.netloc}")
+    named = [url for domain, url in sites.items() if _mentions(domain, names)]
+    if len(named) == 1:
+        return named[0]
+    return next(iter(sites.values())) if len(sites) == 1 else None
+
+
+def _emails(hrefs: List[str], source_domain: str, website: Optional[str]) -> Optional[str]:
+    """mailto addresses not at the VC's domain, those at the company's domain first"""
+    emails = []
+    for href in hrefs:
+        if not href.lower().startswith("mailto:"):
+            continue
+        for email in href[len("mailto:"):].split("?")[0].split(","):
+            email = email.strip().lower()
+            if EMAIL.match(email) and email.split("@")[-1] != source_domain and email not in emails:
+                emails.append(email)
+    company_domain = site_domain(website)
+    emails.sort(key=lambda email: email.split("@")[-1] != company_domain)
+    return ", ".join(emails) or None
+
+
+def extract_fields(raw_html: str, content: str,
+                   source_url: str) -> Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]]:
+    """
+    Company fields found without the LLM: those from the page's structured data, and those
+    guessed from its links, each None where nothing was found. raw_html is the page as
+    fetched (its meta and JSON-LD are gone from content), content the extract_html output
+    whose links are searched for the website and emails. A name or description from the
+    page's own tags is only taken if it mentions the company, whose name is guessed from
+    the url slug.
+    """
+    source_domain = site_domain(source_url)
+    names = {name.replace("-", "") for name in name_tokens(source_url)}
+    fields: Dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    fields.update({key: value for key, value in _organization(raw_html, source_domain, names).items() if key in fields})
+
+    meta = _meta_tags(raw_html)
+    title = meta.get("og:title") or meta.get("twitter:title")
+    if title is None:
+        match = TITLE.search(raw_html)
+        title = _text(match.group(1)) if match else None
+    fields["name"] = fields["name"] or _title_name(title, meta.get("og:site_name"), names)
+    if fields["description"] is None:
+        description = meta.get("og:description") or meta.get("description") or meta.get("twitter:description")
+        if _mentions(description, names | ({fields["name"].lower().replace(" ", "")} if fields["name"] else set())):
+            fields["description"] = description
+
+    hrefs = _links(content)
+    guessed: Dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    guessed["url"] = _website(hrefs, source_domain, names)
+    guessed["email"] = _emails(hrefs, source_domain, fields["url"] or guessed["url"])
+    return fields, guessed
+
+
+def resolved(fields: Dict[str, Optional[str]]) -> bool:
+    """Whether the structured data gave every field, so there is nothing left to ask the LLM"""
+    return bool(fields) and all(fields.get(name) for name in FIELDS)
+
+
+def missing_fields(fields: Dict[str, Optional[str]]) -> Optional[List[str]]:
+    """The fields still to ask the LLM for, None (all of them) when the structured data gave none"""
+    if not any(fields.values()):
+        return None
+    return [name for name in FIELDS if not fields.get(name)]
+
+
+def fill_missing(fields: Dict[str, Optional[str]], llm_data: Dict,
+                 guessed: Optional[Dict[str, Optional[str]]] = None) -> Dict:
+    """The LLM's answer with the structured fields taking precedence and guesses filling what is still empty"""
+    merged = {**dict.fromkeys(FIELDS), **llm_data}
+    merged.update({name: value for name, value in fields.items() if value})
+    merged.update({name: value for name, value in (guessed or {}).items() if value and not merged.get(name)})
+    return merged
@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fingerprint import Fingerprint
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# a page that fails validation will fail again (the LLM answer is cached), so don't pay to retry it;
+# the same goes for pages the classifier rejected
+PERMANENT_ERRORS = {"validate_failed", "classify_failed"}
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class StateStore:
+    """
+    Records how far each url got in the crawl: the last stage reached, the outcome, the
+    error class of a failure, attempt count and per-stage timings. Backed by SQLite in WAL
+    mode so a run that dies can be resumed, skipping completed work.
+    """
+
+    def __init__(self, path: str = "crawl_state.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                stage TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                timings TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            )""")
+        # the content each url's record was extracted from, for incremental runs
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                simhash TEXT NOT NULL,
+                record TEXT NOT NULL,
+                extracted_at REAL NOT NULL
+            )""")
+
+    def start(self, url: str):
+        with self.lock:
+            self.db.execute("""
+                INSERT INTO urls (url, stage, status, attempts, updated_at) VALUES (?, NULL, 'running', 1, ?)
+                ON CONFLICT(url) DO UPDATE SET stage = NULL, status = 'running', error = NULL,
+                    attempts = attempts + 1, updated_at = excluded.updated_at""", (url, time.time()))
+
+    def record(self, url: str, stage: str, status: str, error: Optional[str] = None, seconds: Optional[float] = None):
+        with self.lock:
+            self.db.execute("""
+                UPDATE urls SET stage = ?, status = ?, error = ?, updated_at = ?,
+                    timings = CASE WHEN ? IS NULL THEN timings ELSE json_set(timings, '$.' || ?, ?) END
+                WHERE url = ?""", (stage, status, error, time.time(), seconds, stage, seconds, url))
+
+    def done(self, urls: List[str]):
+        """Marks urls whose results are safely in the output file"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany("UPDATE urls SET status = 'done', error = NULL, updated_at = ? WHERE url = ?",
+                                [(now, url) for url in urls])
+            self.db.execute("COMMIT")
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, stage, status, error, attempts, timings FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("url", "stage", "status", "error", "attempts", "timings"), row))
+
+    def should_skip(self, url: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> bool:
+        """True when a resumed run has nothing left to do for url"""
+        state = self.get(url)
+        if state is None:
+            return False
+        if state["status"] in ("done", "skipped"):
+            return True
+        if state["status"] == "failed":
+            return state["error"] in PERMANENT_ERRORS or state["attempts"] >= max_attempts
+        return False  # never finished, e.g. the process died mid-flight
+
+    def track(self, stage: str, func: Callable, key: Callable[[Any], str], final: bool = False,
+              batched: bool = False) -> Callable:
+        """
+        Wraps a pipeline stage function so every outcome is recorded. Success in a final
+        stage marks the url done; otherwise call done() once the result is persisted.
+        """
+
+        def recorded(item, result, seconds, error=None):
+            skipped = getattr(item, "skipped", None)  # dropped on purpose, e.g. a redirect to a page already crawled
+            if error is None and result is None and skipped:
+                self.record(key(item), stage, "skipped", skipped, seconds)
+                return
+            if error is None and result is None:
+                error = f"{stage}_failed"
+            if error is not None:
+                self.record(key(item), stage, "failed", error, seconds)
+            else:
+                self.record(key(item), stage, "done" if final else "running", None, seconds)
+
+        def wrapper(item):
+            items = item if batched else [item]
+            t0 = time.perf_counter()
+            try:
+                result = func(item)
+            except Exception as e:
+                seconds = (time.perf_counter() - t0) / len(items)
+                for one in items:
+                    recorded(one, None, seconds, type(e).__name__)
+                raise
+            seconds = (time.perf_counter() - t0) / len(items)
+            for one, one_result in zip(items, result if batched else [result]):
+                recorded(one, one_result, seconds)
+            return result
+
+        return wrapper
+
+    def remember(self, url: str, fingerprint: Fingerprint, record: str):
+        """Stores the record (Company JSON) extracted from the page with this fingerprint"""
+        with self.lock:
+            self.db.execute("""
+                INSERT INTO pages (url, hash, simhash, record, extracted_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET hash = excluded.hash, simhash = excluded.simhash,
+                    record = excluded.record, extracted_at = excluded.extracted_at""",
+                (url, fingerprint.hash, f"{fingerprint.simhash:016x}", record, time.time()))
+
+    def recall(self, url: str) -> Optional[Tuple[Fingerprint, str]]:
+        """The fingerprint and record remembered for url, if it was extracted before"""
+        with self.lock:
+            row = self.db.execute("SELECT hash, simhash, record FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return Fingerprint(row[0], int(row[1], 16)), row[2]
+
+    def outcomes(self) -> List[Tuple[str, str, Optional[str]]]:
+        """(url, status, error) of every url seen"""
+        with self.lock:
+            return self.db.execute("SELECT url, status, error FROM urls").fetchall()
+
+    def summary(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT status || COALESCE(':' || error, ''), COUNT(*) FROM urls GROUP BY 1""").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,113 @@
+import ast
+import re
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+from pydantic_core import from_json
+from company import Company
+from logger import get_logger, log_payload
+
+logger = get_logger(__name__)
+
+# filled in by the crawler, not asked from the model
+SERVER_FIELDS = {"source"}
+REASK_PROMPT = ("Your answer could not be parsed. Reply again with only the JSON object described above, "
+                "no code fences, comments or other text. Use null for missing values.")
+
+CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+PYTHON_LITERAL = re.compile(r"([:\[,]\s*)(None|True|False)\b")
+JSON_LITERALS = {"None": "null", "True": "true", "False": "false"}
+
+
+def company_schema(fields: Optional[Sequence[str]] = None) -> Dict:
+    """JSON schema of the fields the model fills in, or only of fields, strict enough for schema-constrained output"""
+    properties = {
+        name: {"type": ["string", "null"], "description": field.description}
+        for name, field in Company.model_fields.items()
+        if name not in SERVER_FIELDS and (fields is None or name in fields)
+    }
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def batch_schema(fields: Optional[Sequence[str]] = None) -> Dict:
+    """One company object per page, tagged with the page index, for batched requests"""
+    item = company_schema(fields)
+    item["properties"] = {"index": {"type": "integer"}, **item["properties"]}
+    item["required"] = ["index", *item["required"]]
+    return {"type": "object", "properties": {"companies": {"type": "array", "items": item}},
+            "required": ["companies"], "additionalProperties": False}
+
+
+def response_format(schema: Dict, name: str) -> Dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def repair_json(text: str) -> Optional[Dict]:
+    """
+    Recovers the object from output that is almost JSON: code fences or prose around it,
+    a Python dict literal (the old prompt format, still in the LLM cache), trailing commas,
+    or an answer cut off mid-object, in which case only its complete fields are kept.
+    """
+    text = CODE_FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = text.rfind("}")
+    candidate = text[start:end + 1] if end > start else text[start:]
+    try:
+        data = ast.literal_eval(candidate)
+    except (SyntaxError, ValueError, MemoryError, RecursionError):
+        candidate = TRAILING_COMMA.sub(r"\1", candidate)
+        candidate = PYTHON_LITERAL.sub(lambda m: m.group(1) + JSON_LITERALS[m.group(2)], candidate)
+        try:
+            data = from_json(candidate, allow_partial=True)
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
+class ParseStats:
+    """How often model output parsed as is, needed repair, needed a re-ask, or was lost"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parsed = self.repaired = self.reasks = self.failed = 0
+
+    def count(self, outcome: str, n: int = 1):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + n)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            total = self.parsed + self.repaired + self.failed
+            return {
+                "parsed": self.parsed,
+                "repaired": self.repaired,
+                "reasks": self.reasks,
+                "failed": self.failed,
+                "success_rate": round((self.parsed + self.repaired) / total, 4) if total else 1.0,
+            }
+
+
+def parse_outcome(text: Optional[str]) -> Tuple[Optional[Dict], str]:
+    """Parses a model answer with the fast JSON parser, falling back to repair_json"""
+    if not text:
+        return None, "failed"
+    try:
+        data = from_json(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        return data, "parsed"
+    data = repair_json(text)
+    return data, "repaired" if data is not None else "failed"
+
+
+def parse_company_output(text: Optional[str], stats: Optional[ParseStats] = None) -> Optional[Dict]:
+    data, outcome = parse_outcome(text)
+    if stats is not None:
+        stats.count(outcome)
+    if data is None:
+        log_payload(logger, "Unparseable LLM output", text)
+        logger.error("Error parsing LLM output")
+    return data
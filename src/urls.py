@@ -0,0 +1,208 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smartcrawler", "urls.db")
+# query parameters that only tell the site where a visitor came from
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "dclid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+                   "ref", "ref_src"}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+MAX_REDIRECT_HOPS = 5
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a url: lower-case scheme and host, no default port, no fragment"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def canonical_url(url: str) -> str:
+    """
+    Identity of a page for deduplication, not a fetchable url: no scheme, lower-case host
+    without www., no default port, trailing slash or fragment, and tracking parameters
+    dropped with the rest sorted. http://www.vc.com/a/?utm_source=x -> vc.com/a
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES))
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{urlencode(query)}" if query else f"{host}{path}"
+
+
+def site_domain(url: Optional[str]) -> str:
+    """Lower-case host without www. or port, scheme optional: http://www.vc.com:8080/a -> vc.com"""
+    if not url:
+        return ""
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    host = (urlsplit(url).hostname or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def dedup_urls(urls: Iterable[str]) -> List[str]:
+    """Keeps the first url of every canonical url, in order"""
+    first: Dict[str, str] = {}
+    for url in urls:
+        first.setdefault(canonical_url(url), url)
+    return list(first.values())
+
+
+class BloomFilter:
+    """Fixed-size set membership with a tunable false positive rate, for inputs too big for a set"""
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: bytes) -> bool:
+        """Adds key and returns True if it was (probably) there already"""
+        present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+
+class DigestSet:
+    """Exact-enough set that keeps an 8-byte digest per url instead of the url itself"""
+
+    def __init__(self):
+        self.digests = set()
+
+    def add(self, key: bytes) -> bool:
+        digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        if digest in self.digests:
+            return True
+        self.digests.add(digest)
+        return False
+
+
+class UrlIndex:
+    """
+    Shared by the crawler and the scripts so near-duplicate urls cost one fetch and one LLM
+    call. Persists, per canonical url, the first url seen for it and where it redirects, so
+    every later run and script uses the same spelling and caches keep hitting. Within a
+    run, unique() drops urls whose canonical url was already seen, and add_redirect() flags
+    urls that turned out to redirect to a page already in the run.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, dedup: str = "set"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS urls (canonical TEXT PRIMARY KEY, url TEXT NOT NULL, first_seen REAL NOT NULL)""")
+        self.db.execute("CREATE TABLE IF NOT EXISTS redirects (canonical TEXT PRIMARY KEY, target TEXT NOT NULL)")
+        self.seen = BloomFilter() if dedup == "bloom" else DigestSet()
+        self.redirected: set = set()  # urls of this run that redirect to a page already in it
+        self.resolved: Dict[str, str] = {}  # redirect target -> the url unique() yielded for it, from earlier runs
+        self.total = self.duplicates = self.rewritten = 0
+
+    @classmethod
+    def from_env(cls) -> "UrlIndex":
+        return cls(os.getenv("URL_INDEX_PATH", DEFAULT_INDEX_PATH))
+
+    def key(self, url: str) -> str:
+        """Canonical url of the page url ends up on, as far as redirects are known"""
+        key = canonical_url(url)
+        with self.lock:
+            for _ in range(MAX_REDIRECT_HOPS):
+                row = self.db.execute("SELECT target FROM redirects WHERE canonical = ?", (key,)).fetchone()
+                if row is None:
+                    break
+                key = row[0]
+        return key
+
+    def _representative(self, key: str, url: str) -> str:
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO urls VALUES (?, ?, ?)", (key, url, time.time()))
+            return self.db.execute("SELECT url FROM urls WHERE canonical = ?", (key,)).fetchone()[0]
+
+    def unique(self, urls: Iterable[str]) -> Iterator[str]:
+        """Yields each page once, spelled the way it was first seen in any run"""
+        for url in urls:
+            url = url.strip()
+            if not url:
+                continue
+            if "://" not in url:
+                url = f"http://{url}"
+            self.total += 1
+            key = self.key(url)
+            # add_redirect() marks pages seen from the fetch workers at the same time
+            with self.lock:
+                seen = self.seen.add(key.encode("utf-8"))
+            if seen:
+                self.duplicates += 1
+                continue
+            representative = self._representative(key, url)
+            if representative != url:
+                self.rewritten += 1
+            if key != canonical_url(representative):
+                with self.lock:
+                    self.resolved[key] = representative
+            yield representative
+
+    def add_redirect(self, url: str, final_url: str):
+        """Called by the fetcher when url redirected; remembers it for later runs"""
+        source, target = canonical_url(url), canonical_url(final_url)
+        if source == target:
+            return
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO redirects VALUES (?, ?)", (source, target))
+            # a known redirect was claimed by this url in unique(), so it only leads back to itself
+            if self.seen.add(target.encode("utf-8")) and self.resolved.get(target) != url:
+                self.redirected.add(url)
+
+    def is_duplicate(self, url: str) -> bool:
+        """True when url redirected to a page another url of this run already covers"""
+        with self.lock:
+            return url in self.redirected
+
+    def report(self) -> Dict[str, int]:
+        with self.lock:
+            redirected = len(self.redirected)
+        return {
+            "urls": self.total,
+            "duplicates": self.duplicates,
+            "redirect_duplicates": redirected,
+            "rewritten": self.rewritten,
+            "fetches_avoided": self.duplicates,
+            "llm_calls_avoided": self.duplicates + redirected,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,526 @@
+"""
+A url backlog shared by crawler processes on any number of machines.
+
+    python crawler.py urls.csv --queue redis://queue-host/0            # fill the queue
+    python crawler.py --queue redis://queue-host/0 --worker            # on every node
+    python workqueue.py export redis://queue-host/0 -o companies.csv   # the one result sink
+
+A worker leases a few urls at a time. A lease hides its url from other workers for a
+visibility timeout, which the worker keeps extending while the url is in flight. The url is
+acknowledged with its record once extracted, or failed and queued again, up to max_attempts.
+If a worker dies, its leases run out and other workers pick those urls up. Records are stored
+in the queue, so all nodes write to one sink. The queue also holds a token bucket per host,
+so the combined request rate of all workers to a website stays within --host-rate.
+
+A SQLite file works for processes on one machine or a shared disk, and for tests. Redis works
+across machines and needs `pip install redis`.
+"""
+import argparse
+import itertools
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+from company import Company
+from logger import get_logger
+from state import DEFAULT_MAX_ATTEMPTS, PERMANENT_ERRORS
+from writer import RecordWriter
+import metrics
+
+logger = get_logger(__name__)
+
+DEFAULT_VISIBILITY = 300.0  # seconds a leased url stays hidden from other workers without a heartbeat
+DEFAULT_HOST_BURST = 2.0
+CHUNK = 1000
+
+
+@dataclass(frozen=True)
+class Lease:
+    """One url handed to one worker. The token tells a current lease from one that ran out and was re-leased"""
+    url: str
+    token: str
+    attempt: int
+
+
+def _chunks(items: Iterable, size: int = CHUNK) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class SQLiteQueue:
+    """Work queue in a SQLite file; every change is one IMMEDIATE transaction, so processes sharing it don't race"""
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'queued',
+                token TEXT,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                record TEXT,
+                updated_at REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS queue_status ON queue (status, lease_until)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS hosts (
+                host TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )""")
+
+    def _transaction(self, func):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(time.time())
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return result
+
+    def put(self, urls: Iterable[str]) -> int:
+        """Adds urls not queued before, returns how many were new"""
+        added = 0
+        for chunk in _chunks(urls):
+            added += self._transaction(lambda now: self.db.executemany(
+                "INSERT OR IGNORE INTO queue (url, updated_at) VALUES (?, ?)", [(url, now) for url in chunk]).rowcount)
+        return added
+
+    def lease(self, worker: str, n: int, visibility: float = DEFAULT_VISIBILITY) -> List[Lease]:
+        def lease(now):
+            self.db.execute("""
+                UPDATE queue SET status = 'failed', error = 'lease_expired', token = NULL, updated_at = ?
+                WHERE status = 'leased' AND lease_until < ? AND attempts >= ?""", (now, now, self.max_attempts))
+            rows = self.db.execute("""
+                SELECT url, attempts FROM queue WHERE status = 'leased' AND lease_until < ? LIMIT ?""",
+                                   (now, n)).fetchall()
+            rows += self.db.execute("SELECT url, attempts FROM queue WHERE status = 'queued' ORDER BY rowid LIMIT ?",
+                                    (n - len(rows),)).fetchall()
+            leases = [Lease(url, secrets.token_hex(8), attempts + 1) for url, attempts in rows]
+            self.db.executemany("""
+                UPDATE queue SET status = 'leased', token = ?, worker = ?, lease_until = ?, attempts = ?, updated_at = ?
+                WHERE url = ?""", [(lease.token, worker, now + visibility, lease.attempt, now, lease.url)
+                                   for lease in leases])
+            return leases
+        return self._transaction(lease)
+
+    def extend(self, leases: List[Lease], visibility: float = DEFAULT_VISIBILITY) -> int:
+        """Pushes the timeout of leases still held back to visibility from now, returns how many were"""
+        return self._transaction(lambda now: self.db.executemany(
+            "UPDATE queue SET lease_until = ? WHERE url = ? AND token = ?",
+            [(now + visibility, lease.url, lease.token) for lease in leases]).rowcount)
+
+    def ack(self, lease: Lease, record: str) -> bool:
+        """Stores the record of a finished url; False if the lease had run out and the url went to another worker"""
+        return self._transaction(lambda now: self.db.execute("""
+            UPDATE queue SET status = 'done', record = ?, error = NULL, token = NULL, lease_until = NULL,
+                updated_at = ? WHERE url = ? AND token = ?""", (record, now, lease.url, lease.token)).rowcount == 1)
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        """Queues the url again, unless the error is permanent or its attempts are used up"""
+        final = error in PERMANENT_ERRORS or lease.attempt >= self.max_attempts
+        return self._transaction(lambda now: self.db.execute("""
+            UPDATE queue SET status = ?, error = ?, token = NULL, lease_until = NULL, updated_at = ?
+            WHERE url = ? AND token = ?""", ("failed" if final else "queued", error, now, lease.url,
+                                             lease.token)).rowcount == 1)
+
+    def skip(self, lease: Lease, reason: str) -> bool:
+        """Finishes a url that was left out on purpose, e.g. by the page gate, without a record"""
+        return self._transaction(lambda now: self.db.execute("""
+            UPDATE queue SET status = 'skipped', error = ?, token = NULL, lease_until = NULL, updated_at = ?
+            WHERE url = ? AND token = ?""", (reason, now, lease.url, lease.token)).rowcount == 1)
+
+    def release(self, leases: List[Lease]):
+        """Hands unfinished urls back without counting the attempt, e.g. when a worker shuts down"""
+        self._transaction(lambda now: self.db.executemany("""
+            UPDATE queue SET status = 'queued', token = NULL, lease_until = NULL, attempts = attempts - 1,
+                updated_at = ? WHERE url = ? AND token = ?""", [(now, lease.url, lease.token) for lease in leases]))
+
+    def reserve_host(self, host: str, rate: float, burst: float = DEFAULT_HOST_BURST) -> float:
+        """Takes a token from the host's shared bucket, returns the seconds to wait before the request"""
+        def reserve(now):
+            row = self.db.execute("SELECT tokens, updated FROM hosts WHERE host = ?", (host,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate) - 1
+            self.db.execute("INSERT OR REPLACE INTO hosts (host, tokens, updated) VALUES (?, ?, ?)",
+                            (host, tokens, now))
+            return max(0.0, -tokens / rate)
+        return self._transaction(reserve)
+
+    def idle(self) -> bool:
+        """Nothing queued and nothing leased"""
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM queue WHERE status IN ('queued', 'leased') LIMIT 1").fetchone() is None
+
+    def results(self) -> Iterator[str]:
+        """Records of the finished urls, in the order the urls were queued"""
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute("""
+                    SELECT rowid, record FROM queue WHERE status = 'done' AND rowid > ? ORDER BY rowid LIMIT ?""",
+                                       (last, CHUNK)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield from (record for _, record in rows)
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT status || COALESCE(':' || error, ''), COUNT(*) FROM queue GROUP BY 1""").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+# Redis keeps the queue in a few keys under one prefix: a list of ready urls, a sorted set of
+# leases by deadline, hashes of status, attempts, lease tokens, errors and records, and a list of
+# finished urls in order. Every change is one Lua script, so it is atomic, and the clock is the
+# server's, so workers' clocks don't have to agree.
+_NOW = "local t = redis.call('TIME') local now = tonumber(t[1]) + tonumber(t[2]) / 1000000 "
+
+_PUT = """
+local added = 0
+for _, url in ipairs(ARGV) do
+    if redis.call('HSETNX', KEYS[1], url, 'queued') == 1 then
+        redis.call('RPUSH', KEYS[2], url)
+        added = added + 1
+    end
+end
+return added"""
+
+# KEYS: status, attempts, tokens, errors, leases, ready; ARGV: n, visibility, max attempts, token prefix, worker
+_LEASE = _NOW + """
+local n, max_attempts = tonumber(ARGV[1]), tonumber(ARGV[3])
+local urls = {}
+for _, url in ipairs(redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', now, 'LIMIT', 0, n)) do
+    redis.call('ZREM', KEYS[5], url)
+    if tonumber(redis.call('HGET', KEYS[2], url) or '0') >= max_attempts then
+        redis.call('HSET', KEYS[1], url, 'failed')
+        redis.call('HSET', KEYS[4], url, 'lease_expired')
+        redis.call('HDEL', KEYS[3], url)
+    else
+        table.insert(urls, url)
+    end
+end
+while #urls < n do
+    local url = redis.call('LPOP', KEYS[6])
+    if not url then break end
+    table.insert(urls, url)
+end
+local leases = {}
+for i, url in ipairs(urls) do
+    local token = ARGV[4] .. ':' .. i
+    local attempt = redis.call('HINCRBY', KEYS[2], url, 1)
+    redis.call('HSET', KEYS[1], url, 'leased')
+    redis.call('HSET', KEYS[3], url, token)
+    redis.call('ZADD', KEYS[5], now + tonumber(ARGV[2]), url)
+    table.insert(leases, url)
+    table.insert(leases, token)
+    table.insert(leases, attempt)
+end
+return leases"""
+
+# KEYS: tokens, leases; ARGV: visibility, url, token, url, token ...
+_EXTEND = _NOW + """
+local extended = 0
+for i = 2, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('ZADD', KEYS[2], 'XX', now + tonumber(ARGV[1]), ARGV[i])
+        extended = extended + 1
+    end
+end
+return extended"""
+
+# KEYS: status, tokens, leases, errors, records, done; ARGV: url, token, record
+_ACK = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+redis.call('HSET', KEYS[1], ARGV[1], 'done')
+redis.call('HSET', KEYS[5], ARGV[1], ARGV[3])
+redis.call('RPUSH', KEYS[6], ARGV[1])
+return 1"""
+
+# KEYS: status, tokens, leases, errors, ready; ARGV: url, token, error, new status (queued, failed or skipped)
+_FAIL = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[4])
+if ARGV[4] == 'queued' then
+    redis.call('RPUSH', KEYS[5], ARGV[1])
+end
+return 1"""
+
+# KEYS: status, attempts, tokens, leases, ready; ARGV: url, token, url, token ...
+_RELEASE = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[3], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[3], ARGV[i])
+        redis.call('ZREM', KEYS[4], ARGV[i])
+        redis.call('HINCRBY', KEYS[2], ARGV[i], -1)
+        redis.call('HSET', KEYS[1], ARGV[i], 'queued')
+        redis.call('LPUSH', KEYS[5], ARGV[i])
+    end
+end
+return 0"""
+
+# KEYS: host bucket; ARGV: rate, burst. Returns the wait as a string, Lua numbers come back truncated to integers
+_RESERVE = _NOW + """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(math.max(0, -tokens / rate))"""
+
+
+class RedisQueue:
+    """Work queue in Redis, shared by workers on any machine that can reach the server"""
+
+    def __init__(self, url: str, prefix: str = "smartcrawler", max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("A Redis work queue needs redis, install it with `pip install redis`")
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self.keys = {name: f"{prefix}:{name}" for name in
+                     ("status", "attempts", "tokens", "errors", "records", "leases", "ready", "done")}
+        self.scripts = {name: self.redis.register_script(script) for name, script in
+                        (("put", _PUT), ("lease", _LEASE), ("extend", _EXTEND), ("ack", _ACK), ("fail", _FAIL),
+                         ("release", _RELEASE), ("reserve", _RESERVE))}
+
+    def _keys(self, *names: str) -> List[str]:
+        return [self.keys[name] for name in names]
+
+    def put(self, urls: Iterable[str]) -> int:
+        return sum(self.scripts["put"](keys=self._keys("status", "ready"), args=chunk) for chunk in _chunks(urls))
+
+    def lease(self, worker: str, n: int, visibility: float = DEFAULT_VISIBILITY) -> List[Lease]:
+        reply = self.scripts["lease"](keys=self._keys("status", "attempts", "tokens", "errors", "leases", "ready"),
+                                      args=[n, visibility, self.max_attempts, f"{worker}:{secrets.token_hex(6)}"])
+        return [Lease(reply[i], reply[i + 1], int(reply[i + 2])) for i in range(0, len(reply), 3)]
+
+    def extend(self, leases: List[Lease], visibility: float = DEFAULT_VISIBILITY) -> int:
+        if not leases:
+            return 0
+        args = [visibility] + [value for lease in leases for value in (lease.url, lease.token)]
+        return self.scripts["extend"](keys=self._keys("tokens", "leases"), args=args)
+
+    def ack(self, lease: Lease, record: str) -> bool:
+        return self.scripts["ack"](keys=self._keys("status", "tokens", "leases", "errors", "records", "done"),
+                                   args=[lease.url, lease.token, record]) == 1
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        final = error in PERMANENT_ERRORS or lease.attempt >= self.max_attempts
+        return self.scripts["fail"](keys=self._keys("status", "tokens", "leases", "errors", "ready"),
+                                    args=[lease.url, lease.token, error, "failed" if final else "queued"]) == 1
+
+    def skip(self, lease: Lease, reason: str) -> bool:
+        return self.scripts["fail"](keys=self._keys("status", "tokens", "leases", "errors", "ready"),
+                                    args=[lease.url, lease.token, reason, "skipped"]) == 1
+
+    def release(self, leases: List[Lease]):
+        if leases:
+            self.scripts["release"](keys=self._keys("status", "attempts", "tokens", "leases", "ready"),
+                                    args=[value for lease in leases for value in (lease.url, lease.token)])
+
+    def reserve_host(self, host: str, rate: float, burst: float = DEFAULT_HOST_BURST) -> float:
+        return float(self.scripts["reserve"](keys=[f"{self.prefix}:host:{host}"], args=[rate, burst]))
+
+    def idle(self) -> bool:
+        return self.redis.llen(self.keys["ready"]) == 0 and self.redis.zcard(self.keys["leases"]) == 0
+
+    def results(self) -> Iterator[str]:
+        start = 0
+        while True:
+            urls = self.redis.lrange(self.keys["done"], start, start + CHUNK - 1)
+            if not urls:
+                return
+            start += len(urls)
+            yield from (record for record in self.redis.hmget(self.keys["records"], urls) if record)
+
+    def counts(self) -> Dict[str, int]:
+        errors = self.redis.hgetall(self.keys["errors"])
+        counts: Dict[str, int] = {}
+        for url, status in self.redis.hscan_iter(self.keys["status"]):
+            key = f"{status}:{errors[url]}" if url in errors else status
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def close(self):
+        self.redis.close()
+
+
+def open_queue(location: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    """A RedisQueue for redis:// urls, a SQLiteQueue for file paths"""
+    if location.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQueue(location, max_attempts=max_attempts)
+    return SQLiteQueue(location, max_attempts=max_attempts)
+
+
+class QueueWorker:
+    """
+    Runs a crawl off a work queue: urls() leases urls and feeds them to crawl(), and the
+    worker also serves as the crawl's sink and drop handler, acknowledging every url with
+    its record or failing it. While crawl() has it open, a heartbeat thread extends the
+    leases of urls in flight; on close, urls never finished are handed back.
+
+        worker = QueueWorker(queue)
+        crawl(worker.urls(), llm, sink=worker, on_dropped=worker.dropped)
+    """
+
+    def __init__(self, queue, worker_id: Optional[str] = None, batch: int = 16,
+                 visibility: float = DEFAULT_VISIBILITY, poll: float = 1.0):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch = batch
+        self.visibility = visibility
+        self.poll = poll
+        self.on_written = None  # set by crawl() like a RecordWriter's
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, Lease] = {}
+        self.stop = threading.Event()
+        self.heartbeat: Optional[threading.Thread] = None
+        self.counts = {"leased": 0, "acked": 0, "failed": 0, "skipped": 0, "lost": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counts[name] += n
+        metrics.count("workqueue_total", n, result=name)
+
+    def urls(self) -> Iterator[str]:
+        """Leased urls, until the queue has nothing queued or leased left"""
+        while not self.stop.is_set():
+            leases = self.queue.lease(self.worker_id, self.batch, self.visibility)
+            if not leases:
+                if self.queue.idle():
+                    return
+                time.sleep(self.poll)  # urls leased elsewhere may yet be failed or run out
+                continue
+            with self.lock:
+                self.in_flight.update((lease.url, lease) for lease in leases)
+            self._count("leased", len(leases))
+            for lease in leases:
+                yield lease.url
+
+    def _take(self, url: str) -> Optional[Lease]:
+        with self.lock:
+            return self.in_flight.pop(url, None)
+
+    def put(self, company: Company):
+        lease = self._take(company.source)
+        if lease is None:
+            logger.warning(f"No lease held for {company.source}, its record is dropped")
+            return
+        if self.queue.ack(lease, company.model_dump_json()):
+            self._count("acked")
+            if self.on_written is not None:
+                self.on_written([company.source])
+        else:
+            self._count("lost")
+            logger.warning(f"Lease on {lease.url} ran out before it was finished, another worker has it")
+
+    def dropped(self, job, stage: str, errored: bool):
+        """on_dropped hook of crawl(): the url failed in stage, raised there, or was skipped on purpose"""
+        lease = self._take(job.url)
+        if lease is None:
+            return
+        if job.skipped:
+            result, held = "skipped", self.queue.skip(lease, job.skipped)
+        else:
+            result, held = "failed", self.queue.fail(lease, f"{stage}_{'error' if errored else 'failed'}")
+        self._count(result if held else "lost")
+
+    def _beat(self):
+        while not self.stop.wait(self.visibility / 3):
+            with self.lock:
+                leases = list(self.in_flight.values())
+            try:
+                self.queue.extend(leases, self.visibility)
+            except Exception as e:
+                logger.error(f"Error extending {len(leases)} leases: {e}")
+
+    def __enter__(self):
+        self.stop.clear()
+        self.heartbeat = threading.Thread(target=self._beat, name="workqueue-heartbeat", daemon=True)
+        self.heartbeat.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.stop.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+            self.heartbeat = None
+        with self.lock:
+            leases, self.in_flight = list(self.in_flight.values()), {}
+        if leases:
+            self.queue.release(leases)
+        logger.info(f"Queue worker {self.worker_id}: {self.report()}, handed back {len(leases)} urls")
+
+    def report(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+
+
+def export(queue, output: str, format: Optional[str] = None) -> int:
+    """Writes the records of all finished urls to output, returns how many"""
+    with RecordWriter(output, format) as writer:
+        count = 0
+        for record in queue.results():
+            writer.put(Company.model_validate_json(record))
+            count += 1
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect a shared crawl work queue or export its records")
+    parser.add_argument("command", choices=["status", "export"])
+    parser.add_argument("queue", help="SQLite file or redis:// url of the queue")
+    parser.add_argument("-o", "--output", default="output.csv", help="output file of export")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="output format (default: from the extension)")
+    args = parser.parse_args(argv)
+
+    queue = open_queue(args.queue)
+    try:
+        if args.command == "status":
+            print(queue.counts())
+        else:
+            print(f"Exported {export(queue, args.output, args.format)} records to {args.output}")
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
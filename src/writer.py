@@ -0,0 +1,214 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from company import Company
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+FIELDS = list(Company.model_fields.keys())
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".parquet": "parquet"}
+
+_STOP = object()
+
+
+def infer_format(filename: str) -> str:
+    return FORMATS.get(os.path.splitext(filename)[1].lower(), "csv")
+
+
+def _row(company: Company) -> Dict:
+    # mode="json" turns HttpUrl into the same string csv.DictWriter writes for it
+    return company.model_dump(mode="json")
+
+
+class _CSVSink:
+    durable = True  # rows are on disk once flushed with fsync
+
+    def __init__(self, filename: str):
+        write_header = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+        self.file = open(filename, mode="a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS, extrasaction='ignore')
+        if write_header:
+            self.writer.writeheader()
+
+    @staticmethod
+    def read_keys(filename: str) -> Set[Tuple]:
+        with open(filename, newline="", encoding="utf-8") as f:
+            return {(row.get("url") or None, row.get("source") or None) for row in csv.DictReader(f)}
+
+    def write(self, rows: List[Dict]):
+        self.writer.writerows(rows)
+
+    def flush(self, fsync: bool):
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush(fsync=True)
+        self.file.close()
+
+
+class _JSONLSink(_CSVSink):
+    def __init__(self, filename: str):
+        self.file = open(filename, mode="a", encoding="utf-8")
+
+    @staticmethod
+    def read_keys(filename: str) -> Set[Tuple]:
+        keys = set()
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    keys.add((row.get("url"), row.get("source")))
+        return keys
+
+    def write(self, rows: List[Dict]):
+        self.file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+
+class _ParquetSink:
+    """
+    Parquet files can't be appended to, so rows go to a new file that replaces the old one on
+    close. Its footer is only written then, so the rows of a run that dies are lost.
+    """
+    durable = False
+
+    def __init__(self, filename: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet output needs pyarrow, install it with `pip install pyarrow`")
+        self.pa, self.pq = pa, pq
+        self.filename = filename
+        self.tmp_filename = f"{filename}.tmp"
+        self.schema = pa.schema([(field, pa.string()) for field in FIELDS])
+        self.writer = pq.ParquetWriter(self.tmp_filename, self.schema)
+        if os.path.isfile(filename):
+            self.writer.write_table(pq.read_table(filename).cast(self.schema))
+
+    @staticmethod
+    def read_keys(filename: str) -> Set[Tuple]:
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename, columns=["url", "source"]).to_pydict()
+        return set(zip(table["url"], table["source"]))
+
+    def write(self, rows: List[Dict]):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def flush(self, fsync: bool):
+        pass  # each write is already a complete row group
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_filename, self.filename)
+
+
+SINKS = {"csv": _CSVSink, "jsonl": _JSONLSink, "parquet": _ParquetSink}
+
+
+class RecordWriter:
+    """
+    Single owner of an output file. Workers hand validated companies to put(), and one
+    background thread deduplicates them on (url, source) and writes them in batches,
+    fsyncing every fsync_interval seconds. Rows already in the file are loaded into the
+    dedup index once, when the writer starts. on_written, if given, is called with the
+    source urls of the rows written (duplicates included) once they are fsynced to disk.
+    For parquet that is only once the file is closed, so after a crash a resumed run redoes
+    the whole run's urls.
+    """
+
+    def __init__(self, filename: str, format: Optional[str] = None, batch_size: int = 100,
+                 flush_interval: float = 1.0, fsync_interval: float = 5.0, max_queue: int = 10000,
+                 on_written: Optional[Callable[[List[str]], None]] = None):
+        self.filename = filename
+        self.format = format or infer_format(filename)
+        if self.format not in SINKS:
+            raise ValueError(f"Unsupported output format: {self.format}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.on_written = on_written
+        self.written = 0
+        self.duplicates = 0
+        self.unconfirmed: List[str] = []  # sources of rows written but not yet known to be on disk
+
+        sink_class = SINKS[self.format]
+        self.seen = sink_class.read_keys(filename) if os.path.isfile(filename) else set()
+        self.sink = sink_class(filename)
+        self.thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self.thread.start()
+
+    def put(self, company: Company):
+        self.queue.put(company)
+
+    def _run(self):
+        batch, sources = [], []
+        last_flush = last_fsync = time.monotonic()
+        while True:
+            try:
+                company = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                company = None
+            if company is _STOP:
+                break
+            if company is not None:
+                row = _row(company)
+                key = (row["url"], row["source"])
+                sources.append(row["source"])
+                if key in self.seen:
+                    self.duplicates += 1
+                else:
+                    self.seen.add(key)
+                    batch.append(row)
+            now = time.monotonic()
+            if sources and (len(sources) >= self.batch_size or now - last_flush >= self.flush_interval):
+                self._write(batch, sources)
+                batch, sources = [], []
+                last_flush = now
+            if time.monotonic() - last_fsync >= self.fsync_interval:
+                self.sink.flush(fsync=True)
+                if self.sink.durable:
+                    self._confirm()
+                last_fsync = time.monotonic()
+        if sources:
+            self._write(batch, sources)
+        try:
+            self.sink.close()
+        except Exception as e:
+            logger.error(f"Error closing {self.filename}: {e}")
+            return
+        self._confirm()
+
+    def _confirm(self):
+        if self.unconfirmed and self.on_written is not None:
+            self.on_written(self.unconfirmed)
+        self.unconfirmed = []
+
+    def _write(self, rows: List[Dict], sources: List[str]):
+        try:
+            if rows:
+                self.sink.write(rows)
+                self.sink.flush(fsync=False)
+            self.written += len(rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} rows to {self.filename}: {e}")
+            return
+        self.unconfirmed.extend(sources)
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+        logger.info(f"Wrote {self.written} companies to {self.filename}, skipped {self.duplicates} duplicates")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
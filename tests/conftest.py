@@ -0,0 +1,4 @@
+import os
+
+# test runs must not append to crawler.log in the working directory
+os.environ["LOG_FILE"] = ""
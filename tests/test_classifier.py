@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from classifier import PageClassifier, PageGate, labelled_pages, non_company_url, page_features
+from crawler import extract_html
+from http_cache import HTTPCache
+from state import StateStore
+
+COMPANY = ("Texts:\nAcme Robotics builds warehouse robots. Founded 2019 in Austin, Texas. Visit website"
+           "\n\nHyperlinks:\nVisit website: https://acme.ai\nEmail: mailto:hi@acme.ai")
+NOT_COMPANY = ("Texts:\nPrivacy policy. We collect cookies and personal data to improve our services."
+               "\n\nHyperlinks:\nHome: https://vc.com/\nTeam: https://vc.com/team")
+
+
+class TestUrlRules(unittest.TestCase):
+
+    def test_non_company_urls(self):
+        for url in ("http://www.techsquareventures.com/portfolio/privacy-policy",
+                    "http://www.bfgpartners.com/portfolio/about",
+                    "http://www.differential.vc/portfolio/category/Acquired",
+                    "http://www.eternacapital.com/portfolio/legal/terms-and-conditions",
+                    "http://www.starvestpartners.com/portfolio/portfolio",
+                    "https://www.founderscircle.com/companies/",
+                    "https://vc.com/portfolio/news/acme-raises-series-a", "https://vc.com/team.html"):
+            with self.subTest(url=url):
+                self.assertIsNotNone(non_company_url(url))
+
+    def test_company_urls(self):
+        for url in ("https://www.nvfund.com/portfolio/anokion", "https://www.heavybit.com/portfolio/mobot",
+                    "https://vc.com/portfolio/pagerduty", "http://www.nea.com/portfolio/patreon",
+                    "https://vc.com/portfolio/team-snap", "https://vc.com/portfolio/search-ai",
+                    "https://vc.com/companies/fox-news", "https://vc.com/portfolio/about-time-labs"):
+            with self.subTest(url=url):
+                self.assertIsNone(non_company_url(url))
+
+
+class TestPageGate(unittest.TestCase):
+
+    def setUp(self):
+        samples = [(page_features(COMPANY.replace("Acme", f"Acme{i}"), "https://vc.com/portfolio/acme"), 1)
+                   for i in range(20)]
+        samples += [(page_features(NOT_COMPANY.replace("Privacy", f"Privacy{i}"), "https://vc.com/portfolio/x"), 0)
+                    for i in range(20)]
+        self.classifier = PageClassifier().fit(samples)
+
+    def test_classifier_separates_pages(self):
+        self.assertGreater(self.classifier.probability(page_features(COMPANY, "https://vc.com/p/a")), 0.8)
+        self.assertLess(self.classifier.probability(page_features(NOT_COMPANY, "https://vc.com/p/b")), 0.2)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.json")
+            self.classifier.save(path)
+            gate = PageGate.from_path(path)
+        features = page_features(COMPANY, "https://vc.com/p/a")
+        self.assertAlmostEqual(gate.classifier.probability(features), self.classifier.probability(features), 2)
+
+    def test_gate_counts_skips_and_audits(self):
+        gate = PageGate(self.classifier, threshold=0.5, audit_rate=0.0)
+        urls = list(gate.filter_urls(["https://vc.com/portfolio/acme", "https://vc.com/portfolio/about"]))
+        self.assertEqual(urls, ["https://vc.com/portfolio/acme"])
+        self.assertEqual(gate.check_page("https://vc.com/portfolio/acme", COMPANY), (True, False))
+        self.assertEqual(gate.check_page("https://vc.com/portfolio/b", NOT_COMPANY), (False, False))
+        report = gate.report(companies=1)
+        self.assertEqual(report["llm_calls_avoided"], 2)
+        self.assertEqual(report["fetches_avoided"], 1)
+
+        gate = PageGate(self.classifier, threshold=0.5, audit_rate=1.0)
+        self.assertEqual(gate.check_page("https://vc.com/portfolio/b", NOT_COMPANY), (True, True))
+        gate.audit_hit()
+        self.assertEqual(gate.report(companies=4)["estimated_recall"], 0.75)
+
+    def test_url_rules_are_audited(self):
+        gate = PageGate(audit_rate=1.0)
+        self.assertEqual(list(gate.filter_urls(["https://vc.com/portfolio/about"])), ["https://vc.com/portfolio/about"])
+        self.assertTrue(gate.audits_url("https://vc.com/portfolio/about"))
+        gate.audit_hit("https://vc.com/portfolio/about")
+        report = gate.report(companies=2)
+        self.assertEqual((report["urls_skipped"], report["urls_audited"], report["url_audited_companies"]), (0, 1, 1))
+        self.assertEqual(report["estimated_recall"], 0.5)
+
+
+
+class TestTrainingData(unittest.TestCase):
+
+    def test_only_llm_verdicts_are_labelled(self):
+        page = "<html><body>" + "".join(f"<p>Acme news item {i} about robots.</p>" for i in range(50)) + "</body></html>"
+        outcomes = {"https://vc.com/portfolio/acme": ("done", None),
+                    "https://vc.com/portfolio/fund-news": ("skipped", "no_company"),
+                    "https://vc.com/portfolio/outage": ("failed", "llm_failed"),
+                    "https://vc.com/portfolio/garbled": ("failed", "validate_failed")}
+        with tempfile.TemporaryDirectory() as tmp:
+            state = StateStore(os.path.join(tmp, "state.db"))
+            cache = HTTPCache(os.path.join(tmp, "http"))
+            for url, (status, error) in outcomes.items():
+                state.start(url)
+                state.record(url, "validate", status, error)
+                cache.put(url, page)
+            state.close()
+            cache.close()
+            pages = sorted(labelled_pages(os.path.join(tmp, "state.db"), os.path.join(tmp, "http"), token_budget=30))
+        self.assertEqual([(url, label) for url, _, label in pages],
+                         [("https://vc.com/portfolio/acme", 1), ("https://vc.com/portfolio/fund-news", 0)])
+        self.assertEqual(pages[0][1], extract_html(page, "https://vc.com/portfolio/acme", 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import csv
+import unittest
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from discovery import Discovery, is_company_link, is_listing, is_next_page, main, portfolio_keyword, root_url
+
+
+def links(*hrefs):
+    return "<html><body>" + "".join(f'<a href="{href}">{href}</a>' for href in hrefs) + "</body></html>"
+
+
+SITES = {
+    # home page links to the listing under a name no probe guesses, listing has three pages
+    "https://vc.com/": links("/about/", "/our-portfolio/", "/team/", "https://twitter.com/vc"),
+    "https://vc.com/our-portfolio/": links("/our-portfolio/acme/", "/our-portfolio/beta", "/our-portfolio/?page=2",
+                                           "/our-portfolio/category/ai/", "/privacy-policy/"),
+    "https://vc.com/our-portfolio/?page=2": links("/our-portfolio/gamma/", "/our-portfolio/?page=1",
+                                                  "/our-portfolio/?page=3"),
+    "https://vc.com/our-portfolio/?page=3": links("/our-portfolio/delta/", "/our-portfolio/gamma",
+                                                  "/our-portfolio/?page=2", "/our-portfolio/?page=4"),
+    "https://vc.com/our-portfolio/?page=4": links("/our-portfolio/epsilon/"),
+    "https://vc.com/portfolio/": links("/our-portfolio/"),
+    # probed listing, one company also listed by vc.com
+    "https://other.vc/": links("/news/"),
+    "https://other.vc/companies/": links("/companies/zeta", "/companies/acme/", "/companies/page/2/",
+                                         "#modal", "javascript:void(0)", "mailto:hi@other.vc"),
+    "https://other.vc/companies/page/2/": links("/companies/eta"),
+    "https://other.vc/company/": links("/company/careers"),
+}
+
+
+class FakeSite:
+    def __init__(self, pages=SITES):
+        self.pages = pages
+        self.lock = threading.Lock()
+        self.fetched = []
+
+    def fetch(self, url):
+        with self.lock:
+            self.fetched.append(url)
+        return self.pages.get(url)
+
+
+class TestUrlRules(unittest.TestCase):
+    def test_listing(self):
+        self.assertTrue(is_listing("https://vc.com/portfolio/"))
+        self.assertTrue(is_listing("https://vc.com/portfolio/exited"))
+        self.assertFalse(is_listing("https://vc.com/portfolio/acme"))
+        self.assertFalse(is_listing("https://vc.com/"))
+        self.assertEqual(portfolio_keyword("https://vc.com/portfolio/exited/"), "portfolio")
+        self.assertEqual(portfolio_keyword("https://vc.com/our-work/page/2/"), "our-work")
+        self.assertEqual(root_url("vc.com"), "http://vc.com/")
+
+    def test_company_link(self):
+        listing = "https://www.vc.com/portfolio/"
+        self.assertTrue(is_company_link("https://vc.com/portfolio/acme/", listing, "portfolio"))
+        self.assertFalse(is_company_link("https://vc.com/portfolio/", listing, "portfolio"))
+        self.assertFalse(is_company_link("https://vc.com/portfolio/?sector=20", listing, "portfolio"))
+        self.assertFalse(is_company_link("https://vc.com/portfolio/privacy-policy", listing, "portfolio"))
+        self.assertFalse(is_company_link("https://acme.com/portfolio/acme", listing, "portfolio"))
+        self.assertFalse(is_company_link("https://vc.com/news/acme", listing, "portfolio"))
+
+    def test_next_page(self):
+        listing = "https://vc.com/portfolio/"
+        self.assertTrue(is_next_page("https://vc.com/portfolio/?page=2", listing))
+        self.assertTrue(is_next_page("https://vc.com/portfolio?e4b2_page=3", listing))
+        self.assertTrue(is_next_page("https://vc.com/portfolio/page/2/", listing))
+        self.assertFalse(is_next_page("https://vc.com/portfolio/?sector=ai", listing))
+        self.assertFalse(is_next_page("https://vc.com/news/?page=2", listing))
+
+
+class TestDiscovery(unittest.TestCase):
+    def test_discovers_companies_once_fetching_each_page_once(self):
+        site = FakeSite()
+        discovery = Discovery(workers=4, fetch=site.fetch)
+        found = list(discovery.run(["https://vc.com/", "https://other.vc/", "https://vc.com"]))
+
+        companies = sorted(url.rstrip("/").rsplit("/", 1)[-1] for _, url in found)
+        self.assertEqual(companies, ["acme", "acme", "beta", "delta", "epsilon", "eta", "gamma", "zeta"])
+        self.assertEqual(len(site.fetched), len(set(site.fetched)))
+        self.assertNotIn("https://vc.com/team/", site.fetched)
+        report = discovery.report()
+        self.assertEqual(report["roots"], 2)
+        self.assertEqual(report["companies"], 8)
+        self.assertEqual(report["duplicates"], 1)  # gamma on two pages of the listing
+        self.assertEqual(report["not_listings"], 2)  # vc.com/portfolio/ and other.vc/company/
+
+    def test_listing_pages_are_bounded_per_root(self):
+        site = FakeSite()
+        discovery = Discovery(workers=2, max_pages=2, fetch=site.fetch)
+        found = [url for _, url in discovery.run(["https://vc.com/our-portfolio/"])]
+
+        self.assertEqual(sorted(found), ["https://vc.com/our-portfolio/acme/", "https://vc.com/our-portfolio/beta",
+                                         "https://vc.com/our-portfolio/gamma/"])
+        self.assertEqual(site.fetched[0], "https://vc.com/our-portfolio/")  # a listing root is not probed
+        self.assertEqual(len(site.fetched), 2)
+        self.assertGreater(discovery.report()["page_limit"], 0)
+
+    def test_streams_while_roots_are_read(self):
+        site = FakeSite()
+        released = threading.Event()
+
+        def roots():
+            yield "https://other.vc/"
+            released.wait(5)
+            yield "https://vc.com/"
+
+        run = Discovery(workers=2, max_roots=1, fetch=site.fetch).run(roots())
+        first = next(run)
+        self.assertEqual(first[0], "https://other.vc/companies/")
+        released.set()
+        self.assertEqual(len([first, *run]), 8)
+
+    def test_unreachable_roots_finish(self):
+        site = FakeSite({})
+        discovery = Discovery(workers=3, fetch=site.fetch)
+        self.assertEqual(list(discovery.run([f"https://vc{n}.com/" for n in range(10)])), [])
+        self.assertEqual(discovery.report()["failed"], 40)
+
+
+class TestMain(unittest.TestCase):
+    def test_rows_are_quoted(self):
+        found = [("https://vc.com/portfolio/", "https://vc.com/portfolio/acme,-inc"),
+                 ("https://vc.com/portfolio/", 'https://vc.com/portfolio/"beta"')]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(Discovery, "run", lambda self, roots: found):
+            path = os.path.join(tmp, "startups.csv")
+            main(["https://vc.com/", "-o", path])
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows, [["vc", "startup"], *map(list, found)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import csv
+import os
+import sys
+import tempfile
+import zlib
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import crawler
+from crawler import CrawlOptions
+from fetcher import configure_fetcher
+from llms import OpenAIAPI
+from ratelimit import AdaptiveLimiter
+from standins import CorpusServer, FakeOpenAI, synthetic_page
+
+
+class TestOfflineCrawl(unittest.TestCase):
+    """The full crawl against the local stand-ins from benchmarks/standins.py"""
+
+    def setUp(self):
+        self.site = CorpusServer([synthetic_page(n) for n in range(20)], latency=0.0, slow_share=0.1,
+                                 slow_latency=0.2, fail_share=0.1)
+        self.llm_server = FakeOpenAI(latency=0.01, jitter=0.0, rate_limit_share=0.3, retry_after=0.01)
+        self.tmp = tempfile.TemporaryDirectory()
+        configure_fetcher(per_host=8, host_rate=1000, host_burst=1000, cache=None, retries=1, backoff_factor=0.01)
+
+    def tearDown(self):
+        configure_fetcher()
+        self.site.shutdown()
+        self.llm_server.shutdown()
+        self.tmp.cleanup()
+
+    def test_crawl(self):
+        env = {"OPENAI_API_KEY": "test", "OPENAI_MODEL": "stub", "OPENAI_BASE_URL": self.llm_server.base_url}
+        with mock.patch.dict(os.environ, env):
+            llm = OpenAIAPI(limiter=AdaptiveLimiter(max_retries=5, base_delay=0.01))
+        output = os.path.join(self.tmp.name, "companies.csv")
+        stats = crawler.crawl(self.site.urls(), llm, output, CrawlOptions(fetch_workers=8, llm_workers=4))
+
+        with open(output, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        failing = sum(1 for n in range(20) if 1 - zlib.crc32(str(n).encode()) / 2 ** 32 < 0.1)
+        self.assertEqual(len(rows), 20 - failing)
+        self.assertEqual(stats[-1].processed, len(rows))
+        self.assertTrue(all(row["email"].startswith("hello@") and row["url"].startswith("https://www.")
+                            for row in rows))
+        self.assertGreater(self.llm_server.take_counts()["rate_limited"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from crawler import extract_html
+from html_parse import parse_html
+from reduce import estimate_tokens, reduce_content
+
+VCS_HTML = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'VCs.html')
+
+MALFORMED = [
+    "<p>one<br>two</br>three<br/>four</p>",
+    "<a href='/a'>outer <a href='/b'>inner</a> tail</a><a href=''>empty</a><a>no href</a>",
+    "<header><a href='/skip'>Skip</a></header><a href=x href=y>dup</a><footer>gone",
+    "<h1>Title &amp; more&nbsp;</h1>&#150;&#129;&bogus; x<!-- note --><![CDATA[ data ]]>",
+    "<template>hidden<b>too</b></template><ruby>kan<rt>ji</rt></ruby><script>var a = '<a>';</script>",
+    "<div><span>unclosed <i>tags</div> after</span></b><p>end",
+]
+
+PAGE = '''<html><head><title>Amphista Therapeutics | NV Fund</title></head><body>
+<nav><a href="/portfolio">Portfolio</a><a href="/team">Team</a><a href="/news">News</a></nav>
+<h1>Amphista Therapeutics</h1>
+<p>A biotech company focused on targeted protein degradation.</p>
+<p>Cambridge, United Kingdom</p>
+<a href="https://www.amphista.com">Visit website</a>
+<a href="mailto:info@amphista.com">Email</a>
+<a href="https://twitter.com/intent/tweet?url=x">Share</a>
+<a href="https://twitter.com/intent/tweet?url=x">Share</a>
+{filler}
+<nav><a href="/portfolio">Portfolio</a><a href="/team">Team</a></nav>
+</body></html>'''
+
+
+class TestReduce(unittest.TestCase):
+
+    def setUp(self):
+        filler = "\n".join(f"<p>Unrelated fund news item number {i} about markets.</p>" for i in range(300))
+        self.html = PAGE.format(filler=filler)
+        self.url = "https://www.nvfund.com/portfolio/amphista"
+
+    def test_no_budget_keeps_everything(self):
+        content = extract_html(self.html, self.url)
+        self.assertIn("Unrelated fund news item number 299", content)
+        self.assertIn("Share: https://twitter.com/intent/tweet?url=x", content)
+
+    def test_budget_keeps_company_details(self):
+        content = extract_html(self.html, self.url, token_budget=120)
+        self.assertLessEqual(estimate_tokens(content), 120 + 10)
+        for expected in ("Amphista Therapeutics", "targeted protein degradation", "Cambridge, United Kingdom",
+                         "Visit website: https://www.amphista.com", "Email: mailto:info@amphista.com"):
+            self.assertIn(expected, content)
+        self.assertNotIn("twitter.com/intent", content)
+        self.assertNotIn("number 299", content)
+
+    def test_block_over_budget_is_cut(self):
+        description = "Amphista Therapeutics " + "develops protein degraders " * 40
+        texts, links = reduce_content([description, "Cambridge"], [], self.url, 30)
+        self.assertTrue(texts[0].startswith("Amphista Therapeutics develops"))
+        self.assertLess(len(texts[0]), len(description))
+        self.assertLessEqual(sum(estimate_tokens(text) for text in texts), 30)
+
+
+def backend_available(name):
+    try:
+        parse_html("<p>x</p>", name)
+        return True
+    except ValueError:
+        return False
+
+
+class TestParsers(unittest.TestCase):
+
+    def assertSamePage(self, html, backend):
+        expected, actual = parse_html(html, "bs4"), parse_html(html, backend)
+        self.assertEqual(actual.texts, expected.texts)
+        self.assertEqual(actual.links, expected.links)
+        self.assertEqual(actual.headings, expected.headings)
+        self.assertEqual(actual.hrefs, expected.hrefs)
+
+    def test_stdlib_matches_bs4_on_malformed_markup(self):
+        for html in MALFORMED:
+            with self.subTest(html=html):
+                self.assertSamePage(html, "stdlib")
+
+    def test_backends_match_bs4_on_saved_page(self):
+        with open(VCS_HTML, encoding="utf-8") as f:
+            html = f.read()
+        for backend in ("stdlib", "lxml", "selectolax"):
+            if backend_available(backend):
+                with self.subTest(backend=backend):
+                    self.assertSamePage(html, backend)
+
+    def test_extract_html_output_unchanged(self):
+        html = PAGE.format(filler="<p>filler</p>")
+        self.assertEqual(extract_html(html, parser="stdlib"), extract_html(html, parser="bs4"))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            parse_html("<p>x</p>", "html5lib")
+
+
+if __name__ == "__main__":
+    unittest.main()
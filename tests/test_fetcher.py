@@ -0,0 +1,254 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import metrics
+from fetcher import FetcherThread
+from ratelimit import parse_retry_after
+from http_cache import HTTPCache
+from urls import normalize_url
+
+
+PAGES = {
+    "/report.pdf": ("application/pdf", b"%PDF-1.4 binary"),
+    "/unlabelled.pdf": ("", b"%PDF-1.4" + b"\x00" * 2000),
+    "/huge": ("text/html", b"<html><body>" + b"<p>spa bundle</p>" * 100000),
+    "/ends": ("text/html", b"<html><body><p>kept</p><script>'</body>'</script><p>also kept</p></body>\n</html>"
+                           b"<script>" + b"x" * 100000 + b"</script>"),
+    "/latin1": ("text/html; charset=ISO-8859-1", "<html><body>Zürich</body></html>".encode("latin-1")),
+    "/meta": ("text/html", '<html><head><meta charset="windows-1252"></head><body>Café – Köln</body></html>'
+                           .encode("cp1252")),
+    "/nocharset": ("text/html", "<html><body>Malmö</body></html>".encode("utf-8")),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = {}
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            Handler.hits[self.path] = Handler.hits.get(self.path, 0) + 1
+            Handler.active += 1
+            Handler.max_active = max(Handler.max_active, Handler.active)
+            hits = Handler.hits[self.path]
+        time.sleep(0.05)
+        with self.lock:
+            Handler.active -= 1
+
+        if self.path == "/flaky" and hits < 3:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        if self.path == "/busy":
+            self.send_response(429)
+            self.send_header("Retry-After", "3600")
+            self.end_headers()
+            return
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.path == "/moved":
+            self.send_response(301)
+            self.send_header("Location", "/landing")
+            self.end_headers()
+            return
+        if self.path == "/missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path in PAGES:
+            content_type, body = PAGES[self.path]
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = f"<html><body>{self.path}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = None
+BASE = None
+
+
+def setUpModule():
+    global server, BASE
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BASE = f"http://127.0.0.1:{server.server_port}"
+
+
+def tearDownModule():
+    server.shutdown()
+
+
+class TestFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.base = BASE
+        Handler.hits = {}
+        Handler.max_active = 0
+        self.fetcher = FetcherThread(per_host=2, host_rate=1000, host_burst=1000, backoff_factor=0.01)
+
+    def tearDown(self):
+        self.fetcher.close()
+
+    def test_retries_honor_retry_after(self):
+        self.assertIn("/flaky", self.fetcher.fetch(f"{self.base}/flaky"))
+        self.assertEqual(Handler.hits["/flaky"], 3)
+
+    def test_long_retry_after_gives_up(self):
+        t0 = time.monotonic()
+        self.assertIsNone(self.fetcher.fetch(f"{self.base}/busy"))
+        self.assertEqual(Handler.hits["/busy"], 1)
+        self.assertLess(time.monotonic() - t0, 5)
+
+    def test_non_html_is_skipped(self):
+        self.assertIsNone(self.fetcher.fetch(f"{self.base}/report.pdf"))
+        self.assertIsNone(self.fetcher.fetch(f"{self.base}/unlabelled.pdf"))
+
+    def test_download_is_capped(self):
+        fetcher = FetcherThread(host_rate=1000, host_burst=1000, max_bytes=10000)
+        try:
+            body = fetcher.fetch(f"{self.base}/huge")
+        finally:
+            fetcher.close()
+        self.assertEqual(len(body), 10000)
+        self.assertTrue(body.startswith("<html><body><p>spa bundle</p>"))
+
+    def test_download_stops_at_end_of_page(self):
+        body = self.fetcher.fetch(f"{self.base}/ends")
+        self.assertIn("also kept", body)
+        self.assertLess(len(body), 70000)
+
+    def test_charset_from_header_meta_or_default(self):
+        self.assertIn("Zürich", self.fetcher.fetch(f"{self.base}/latin1"))
+        self.assertIn("Café – Köln", self.fetcher.fetch(f"{self.base}/meta"))
+        self.assertIn("Malmö", self.fetcher.fetch(f"{self.base}/nocharset"))
+
+    def test_redirects_are_reported(self):
+        redirects = []
+        fetcher = FetcherThread(host_rate=1000, host_burst=1000, on_redirect=lambda *urls: redirects.append(urls))
+        try:
+            self.assertIn("/landing", fetcher.fetch(f"{self.base}/moved"))
+            fetcher.fetch(f"{self.base}/landing")
+        finally:
+            fetcher.close()
+        self.assertEqual(redirects, [(f"{self.base}/moved", f"{self.base}/landing")])
+
+    def test_client_errors_are_not_retried(self):
+        self.assertIsNone(self.fetcher.fetch(f"{self.base}/missing"))
+        self.assertEqual(Handler.hits["/missing"], 1)
+
+    def test_per_host_concurrency_cap(self):
+        threads = [threading.Thread(target=self.fetcher.fetch, args=(f"{self.base}/page{i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(Handler.hits), 8)
+        self.assertLessEqual(Handler.max_active, 2)
+
+    def test_fetch_phases_are_timed(self):
+        metrics.reset()
+        self.assertIn("Malmö", self.fetcher.fetch(f"{self.base}/nocharset"))
+        self.assertIsNone(self.fetcher.fetch(f"{self.base}/missing"))
+        summary = metrics.summary()
+        phases = {h["labels"]["phase"] for h in summary["histograms"] if h["name"] == "fetch_phase_seconds"}
+        self.assertEqual(phases, {"wait", "connect", "server", "body"})
+        counters = {(c["name"], *c["labels"].values()): c["value"] for c in summary["counters"]}
+        self.assertEqual(counters["errors_total", "HTTP 404", "fetch"], 1)
+        self.assertGreater(counters["fetch_bytes_total",], 0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.base = BASE
+        self.tmp = tempfile.TemporaryDirectory()
+        Handler.hits = {}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fetch(self, url, ttl):
+        fetcher = FetcherThread(host_rate=1000, cache=HTTPCache(self.tmp.name, ttl=ttl))
+        try:
+            return fetcher.fetch(url)
+        finally:
+            fetcher.close()
+
+    def test_fresh_pages_skip_the_network(self):
+        first = self.fetch(f"{self.base}/etag", ttl=60)
+        second = self.fetch(f"{self.base}/etag", ttl=60)
+        self.assertEqual(first, second)
+        self.assertEqual(Handler.hits["/etag"], 1)
+
+    def test_stale_pages_are_revalidated(self):
+        first = self.fetch(f"{self.base}/etag", ttl=0)
+        second = self.fetch(f"{self.base}/etag", ttl=0)
+        self.assertEqual(first, second)
+        self.assertEqual(Handler.hits["/etag"], 2)  # second request answered with 304
+
+    def test_lru_eviction(self):
+        cache = HTTPCache(self.tmp.name, max_bytes=25)
+        cache.put("https://a.com/", "a" * 10)
+        cache.put("https://b.com/", "b" * 10)
+        cache.get("https://a.com/")
+        time.sleep(0.01)
+        cache.put("https://c.com/", "c" * 10)
+        self.assertIsNotNone(cache.get("https://a.com/"))
+        self.assertIsNone(cache.get("https://b.com/"))
+        self.assertIsNotNone(cache.get("https://c.com/"))
+        cache.close()
+
+    def test_shared_body_outlives_evicted_entry(self):
+        cache = HTTPCache(self.tmp.name, max_bytes=25)
+        cache.put("https://a.com/", "x" * 10)
+        cache.put("https://b.com/", "x" * 10)
+        time.sleep(0.01)
+        cache.put("https://c.com/", "c" * 10)
+        self.assertIsNone(cache.get("https://a.com/"))
+        self.assertEqual(cache.get("https://b.com/").body, "x" * 10)
+        cache.close()
+
+    def test_body_evicted_during_put_is_written_again(self):
+        cache = HTTPCache(self.tmp.name)
+        exists = os.path.exists
+        answers = [True]  # the body looks stored when put starts, then another process evicts it
+        with mock.patch("http_cache.os.path.exists", lambda path: answers.pop() if answers else exists(path)):
+            cache.put("https://a.com/", "body")
+        self.assertEqual(cache.get("https://a.com/").body, "body")
+        cache.close()
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url("HTTPS://OSS.Capital:443/portfolio/x#team"), "https://oss.capital/portfolio/x")
+        self.assertEqual(normalize_url("http://vc.com"), "http://vc.com/")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+import random
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from fingerprint import Fingerprint, distance, simhash
+
+WORDS = ["platform", "biotech", "payments", "robotics", "climate", "data", "security", "health", "logistics",
+         "energy", "software", "materials", "fintech", "analytics", "devices", "learning", "founded", "in"]
+
+
+def page(seed, words=1500):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(words))
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_unchanged(self):
+        text = page(1)
+        self.assertEqual(Fingerprint.of(text).compare(Fingerprint.of(text)), "unchanged")
+        self.assertEqual(simhash(text), simhash(text.upper()))
+
+    def test_small_edit_is_a_near_duplicate(self):
+        text = page(1)
+        words = text.split()
+        edited = " ".join(words[:200] + ["news"] + words[201:])
+        self.assertLessEqual(distance(simhash(text), simhash(edited)), 3)
+        self.assertEqual(Fingerprint.of(text).compare(Fingerprint.of(edited)), "near_duplicate")
+
+    def test_rewrite_is_a_change(self):
+        text = page(1)
+        rewritten = " ".join(text.split()[:750]) + " " + page(2, 750)
+        self.assertGreater(distance(simhash(text), simhash(rewritten)), 3)
+        self.assertEqual(Fingerprint.of(text).compare(Fingerprint.of(page(2))), "changed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from inputs import read_urls
+from urls import BloomFilter
+
+
+class TestInputs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_csv_with_header(self):
+        path = self.write("in.csv", "name,startup\nA,https://a.com/\nB,https://b.com/x\n")
+        self.assertEqual(list(read_urls([path])), ["https://a.com/", "https://b.com/x"])
+
+    def test_csv_without_header(self):
+        path = self.write("in.csv", "1,vc.com,https://vc.com/portfolio/a\n2,vc.com,https://vc.com/portfolio/b\n")
+        self.assertEqual(list(read_urls([path])), ["https://vc.com/portfolio/a", "https://vc.com/portfolio/b"])
+
+    def test_jsonl_and_text(self):
+        jsonl = self.write("in.jsonl", '{"url": "https://a.com"}\n\n"https://b.com"\n')
+        text = self.write("in.txt", "# comment\nhttps://c.com\n\n")
+        self.assertEqual(list(read_urls([jsonl, text])), ["https://a.com", "https://b.com", "https://c.com"])
+
+    def test_missing_column(self):
+        path = self.write("in.csv", "name,link\nA,https://a.com\n")
+        with self.assertRaises(ValueError):
+            list(read_urls([path], column="url"))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        added = [bloom.add(f"https://a.com/{i}".encode()) for i in range(1000)]
+        self.assertLess(sum(added), 30)
+        self.assertTrue(all(bloom.add(f"https://a.com/{i}".encode()) for i in range(1000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,353 @@
+import unittest
+import os
+import sys
+import json
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from llms import LLMAPI, CachedLLM, LLMRouter, OpenAIAPI, get_llm, pack_batches, parse_batch_output
+from structured import ParseStats, company_schema, parse_company_output, repair_json
+from llm_cache import LLMCache
+from ratelimit import AdaptiveLimiter, parse_reset_duration
+
+
+class CountingLLM(LLMAPI):
+    model = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_company_info(self, text, fields=None):
+        self.calls += 1
+        return None if "fail" in text else f"{{'name': '{text}'}}"
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "llm.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hits_skip_the_provider(self):
+        llm = CountingLLM()
+        cached = CachedLLM(llm, LLMCache(self.path))
+        self.assertEqual(cached.get_company_info("acme"), cached.get_company_info("acme"))
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(cached.cache.stats()["hits"], 1)
+        self.assertEqual(cached.cache.stats()["misses"], 1)
+
+        # persisted across runs
+        rerun = CachedLLM(llm, LLMCache(self.path))
+        rerun.get_company_info("acme")
+        self.assertEqual(llm.calls, 1)
+
+    def test_failures_are_not_cached(self):
+        llm = CountingLLM()
+        cached = CachedLLM(llm, LLMCache(self.path))
+        self.assertIsNone(cached.get_company_info("fail"))
+        self.assertIsNone(cached.get_company_info("fail"))
+        self.assertEqual(llm.calls, 2)
+
+    def test_eviction(self):
+        cache = LLMCache(self.path, max_entries=10)
+        for i in range(25):
+            cache.put(str(i), "x")
+        self.assertLessEqual(cache.stats()["entries"], 10)
+        self.assertGreater(cache.stats()["evictions"], 0)
+        self.assertIsNotNone(cache.get("24"))
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    """
+    Speaks just enough of the OpenAI chat API; pages mentioning BROKEN make a batch unparseable,
+    GARBLED pages get an unparseable first answer and CHATTY pages one wrapped in prose
+    """
+    requests = []
+    formats = []
+    throttle = 0  # answer this many requests with 429 first
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = body["messages"][0]["content"]
+        StubOpenAI.requests.append(content)
+        StubOpenAI.formats.append(body.get("response_format"))
+        if StubOpenAI.throttle > 0:
+            StubOpenAI.throttle -= 1
+            self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                       {"retry-after-ms": "10", "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "20ms"})
+            return
+        pages = re.findall(r"### Page (\d+)\nCompany: (\w+)", content)
+        if pages:
+            if any(name == "BROKEN" for _, name in pages):
+                answer = "Sorry, I can't help with that."
+            else:
+                answer = json.dumps({"companies": [{"index": int(n), "url": f"https://{name}.com", "name": name,
+                                                    "email": None} for n, name in pages]})
+        else:
+            name = re.search(r"Company: (\w+)", content).group(1)
+            answer = json.dumps({"url": f"https://{name}.com", "name": name, "email": None})
+            if name == "GARBLED" and len(body["messages"]) == 1:
+                answer = "I found the company GARBLED but no details."
+            elif name == "CHATTY":
+                answer = f"Here is the data:\n```json\n{answer}\n```"
+        self.reply(200, {
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+        })
+
+    def reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBatchedExtraction(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StubOpenAI.requests = []
+        StubOpenAI.formats = []
+        StubOpenAI.throttle = 0
+        env = {"OPENAI_API_KEY": "test", "OPENAI_MODEL": "stub",
+               "OPENAI_BASE_URL": f"http://127.0.0.1:{self.server.server_port}/v1"}
+        with mock.patch.dict(os.environ, env):
+            self.llm = OpenAIAPI(batch_max_pages=4, limiter=AdaptiveLimiter(max_retries=2, base_delay=0.01))
+
+    def test_results_map_back_to_pages(self):
+        texts = [f"Company: acme{i}" for i in range(6)]
+        results = self.llm.get_companies_info(texts)
+        self.assertEqual([json.loads(r)["name"] for r in results], [f"acme{i}" for i in range(6)])
+        self.assertEqual(len(StubOpenAI.requests), 2)
+
+    def test_failed_batches_are_split(self):
+        texts = ["Company: alpha", "Company: BROKEN", "Company: gamma", "Company: delta"]
+        results = self.llm.get_companies_info(texts)
+        self.assertEqual(json.loads(results[0])["name"], "alpha")
+        self.assertEqual(json.loads(results[1])["name"], "BROKEN")  # answered by a single-page request
+        self.assertEqual(json.loads(results[3])["name"], "delta")
+
+    def test_rate_limits_are_retried(self):
+        StubOpenAI.throttle = 2
+        self.assertIn("acme", self.llm.get_company_info("Company: acme"))
+        self.assertEqual(self.llm.limiter.rate_limited, 2)
+
+    def test_retries_are_capped(self):
+        StubOpenAI.throttle = 100
+        self.assertIsNone(self.llm.get_company_info("Company: acme"))
+        self.assertEqual(len(StubOpenAI.requests), 3)
+
+    def test_schema_constrained_output(self):
+        self.assertEqual(json.loads(self.llm.get_company_info("Company: acme"))["name"], "acme")
+        self.assertEqual(StubOpenAI.formats[-1]["json_schema"]["schema"], company_schema())
+        self.llm.get_companies_info(["Company: a", "Company: b"])
+        self.assertEqual(StubOpenAI.formats[-1]["json_schema"]["name"], "companies")
+
+    def test_only_missing_fields_are_asked_for(self):
+        self.llm.get_company_info("Company: acme", fields=["country", "city"])
+        self.assertEqual(list(StubOpenAI.formats[-1]["json_schema"]["schema"]["properties"]), ["country", "city"])
+        self.assertIn('"city": "<city>"', StubOpenAI.requests[-1])
+        self.assertNotIn("<company_website_url>", StubOpenAI.requests[-1])
+        self.llm.get_companies_info(["Company: a", "Company: b"], fields=["email"])
+        schema = StubOpenAI.formats[-1]["json_schema"]["schema"]
+        self.assertEqual(list(schema["properties"]["companies"]["items"]["properties"]), ["index", "email"])
+
+    def test_repair_before_reask(self):
+        self.assertEqual(json.loads(self.llm.get_company_info("Company: CHATTY"))["name"], "CHATTY")
+        self.assertEqual(len(StubOpenAI.requests), 1)
+        self.assertEqual(json.loads(self.llm.get_company_info("Company: GARBLED"))["name"], "GARBLED")
+        self.assertEqual(len(StubOpenAI.requests), 3)
+        stats = self.llm.parse_stats.stats()
+        self.assertEqual((stats["parsed"], stats["repaired"], stats["reasks"], stats["failed"]), (1, 1, 1, 0))
+
+    def test_reasks_are_capped(self):
+        self.llm.max_reasks = 0
+        self.assertIsNone(self.llm.get_company_info("Company: GARBLED"))
+        self.assertEqual(self.llm.parse_stats.stats()["failed"], 1)
+        self.assertEqual(self.llm.parse_stats.stats()["success_rate"], 0)
+
+    def test_text_mode(self):
+        self.llm.structured = False
+        self.llm.get_company_info("Company: acme")
+        self.assertIsNone(StubOpenAI.formats[-1])
+
+    def test_pack_batches(self):
+        self.assertEqual(pack_batches(["a b c"] * 5, token_budget=6, max_pages=4), [[0, 1], [2, 3], [4]])
+        self.assertEqual(pack_batches(["x " * 50, "y"], token_budget=6), [[0], [1]])
+
+    def test_parse_batch_output(self):
+        output = '```json\n{"companies": [{"index": 1, "name": "b"}, {"name": "no index"}, {"index": 0, "name": null}]}\n```'
+        self.assertEqual(parse_batch_output(output), {1: {"name": "b"}, 0: {"name": None}})
+        self.assertEqual(parse_batch_output('{"companies": [{"index": 0, "name": "a", "tags": ["x"]}], "note": [1]}'),
+                         {0: {"name": "a", "tags": ["x"]}})
+        self.assertEqual(parse_batch_output('[{"index": 0, "name": "a"}]'), {})
+        self.assertEqual(parse_batch_output("no list here"), {})
+
+
+class TestStructuredOutput(unittest.TestCase):
+
+    def test_schema(self):
+        schema = company_schema()
+        self.assertNotIn("source", schema["properties"])
+        self.assertEqual(sorted(schema["required"]), sorted(schema["properties"]))
+        self.assertFalse(schema["additionalProperties"])
+
+    def test_repair(self):
+        expected = {"url": "https://a.com", "name": "A", "email": None}
+        self.assertEqual(repair_json('Sure!\n```json\n{"url": "https://a.com", "name": "A", "email": null}\n```'), expected)
+        self.assertEqual(repair_json("{'url': 'https://a.com', 'name': 'A', 'email': None}"), expected)
+        self.assertEqual(repair_json('{"url": "https://a.com", "name": "A", "email": None,}'), expected)
+        self.assertEqual(repair_json('{"url": "https://a.com", "name": "A", "email": null, "city": "Cam'), expected)
+        self.assertIsNone(repair_json("no company on this page"))
+        self.assertIsNone(repair_json("{'a', 'b'}"))
+
+    def test_parse_stats(self):
+        stats = ParseStats()
+        self.assertEqual(parse_company_output('{"name": "A"}', stats), {"name": "A"})
+        self.assertEqual(parse_company_output("{'name': 'A'}", stats), {"name": "A"})
+        self.assertIsNone(parse_company_output("nothing", stats))
+        self.assertEqual(stats.stats(), {"parsed": 1, "repaired": 1, "reasks": 0, "failed": 1, "success_rate": 0.6667})
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_aimd(self):
+        limiter = AdaptiveLimiter(max_concurrency=8)
+        self.assertEqual(limiter.concurrency, 4)
+        limiter.on_rate_limited()
+        limiter.on_rate_limited()  # same congestion event, not halved twice
+        self.assertEqual(limiter.concurrency, 2)
+        for _ in range(10):
+            limiter.on_success()
+        self.assertGreater(limiter.concurrency, 4)
+        self.assertLessEqual(limiter.concurrency, 8)
+
+    def test_headers(self):
+        limiter = AdaptiveLimiter(requests_per_minute=600)
+        limiter.update_from_headers({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0",
+                                     "x-ratelimit-reset-requests": "6m0s"})
+        self.assertEqual(limiter.request_bucket.rate, 1)
+        self.assertGreater(limiter.paused_until, 0)
+        self.assertEqual(parse_reset_duration("1m30.5s"), 90.5)
+        self.assertEqual(parse_reset_duration("20ms"), 0.02)
+
+    def test_headroom(self):
+        limiter = AdaptiveLimiter(requests_per_minute=600)
+        self.assertAlmostEqual(limiter.headroom(), 1.0, places=2)
+        limiter.update_from_headers({"x-ratelimit-limit-requests": "1000", "x-ratelimit-remaining-requests": "100",
+                                     "x-ratelimit-reset-requests": "6s"})
+        self.assertAlmostEqual(limiter.headroom(), 0.1, places=2)
+        limiter.update_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "6s"})
+        self.assertEqual(limiter.headroom(), 0.0)
+
+    def test_backoff_is_capped(self):
+        limiter = AdaptiveLimiter(base_delay=1, max_delay=10)
+        self.assertLessEqual(limiter.backoff(20), 10)
+        self.assertGreaterEqual(limiter.backoff(20), 5)
+
+
+class FakeProvider(LLMAPI):
+    """Answers after delay seconds, or not at all for the first fail_first calls and pages containing fail_on"""
+
+    def __init__(self, name, delay=0.0, fail_first=0, fail_on=None):
+        self.name = name
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_on = fail_on
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_company_info(self, text, fields=None):
+        with self.lock:
+            self.calls += 1
+            failing = self.calls <= self.fail_first
+        time.sleep(self.delay)
+        if failing or (self.fail_on and self.fail_on in text):
+            return None
+        return json.dumps({"name": text, "by": self.name})
+
+
+class TestLLMRouter(unittest.TestCase):
+
+    def test_prefers_the_faster_provider(self):
+        slow, fast = FakeProvider("slow", delay=0.02), FakeProvider("fast", delay=0.002)
+        router = LLMRouter([slow, fast], min_samples=3)
+        for i in range(40):
+            router.get_company_info(f"acme{i}")
+        self.assertGreater(fast.calls, 3 * slow.calls)
+        self.assertLess(router.report()["fast"]["p95"], router.report()["slow"]["p95"])
+
+    def test_spreads_concurrent_load(self):
+        first, second = FakeProvider("first", delay=0.02), FakeProvider("second", delay=0.02)
+        router = LLMRouter([first, second])
+        threads = [threading.Thread(target=router.get_company_info, args=(f"acme{i}",)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreater(second.calls, 0)
+        self.assertEqual(first.calls + second.calls, 16)
+
+    def test_fails_over_and_cools_down_a_failing_provider(self):
+        broken, backup = FakeProvider("broken", fail_first=100), FakeProvider("backup", delay=0.01)
+        router = LLMRouter([broken, backup], min_samples=3, cooldown=60)
+        for i in range(10):
+            self.assertEqual(json.loads(router.get_company_info(f"acme{i}"))["by"], "backup")
+        self.assertEqual(broken.calls, 3)  # then skipped for the cooldown
+        self.assertTrue(router.report()["broken"]["cooling"])
+
+    def test_batches_fail_over_missing_pages_only(self):
+        partial, backup = FakeProvider("partial", fail_on="b"), FakeProvider("backup", delay=0.5)
+        router = LLMRouter([partial, backup])
+        results = router.get_companies_info(["a1", "b1", "a2", "b2"])
+        self.assertEqual([json.loads(r)["by"] for r in results], ["partial", "backup", "partial", "backup"])
+        self.assertEqual(backup.calls, 2)
+
+    def test_openai_compatible_providers(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            local = OpenAIAPI(name="llamacpp")
+            self.assertEqual(str(local.client.base_url), "http://localhost:8080/v1/")
+            self.assertEqual(local.model, "local")
+            with self.assertRaises(ValueError):
+                OpenAIAPI(name="mine")
+            with self.assertRaises(ValueError):
+                OpenAIAPI(name="vllm")  # serves whatever model it was started with, so it must be named
+
+        env = {"MY_SERVER_BASE_URL": "http://10.0.0.5:9000/v1", "MY_SERVER_MODEL": "qwen2.5-7b",
+               "MY_SERVER_API_KEY": "x", "MY_SERVER_STRUCTURED": "0", "OPENAI_API_KEY": "test"}
+        with mock.patch.dict(os.environ, env):
+            mine = OpenAIAPI(name="my-server")
+            self.assertEqual(mine.model, "qwen2.5-7b")
+            self.assertFalse(mine.structured)
+            router = get_llm("openai, my-server", cache=False)
+        self.assertIsInstance(router, LLMRouter)
+        self.assertEqual([route.name for route in router.routes], ["openai", "my-server"])
+        self.assertTrue(all(route.llm.limiter.max_retries <= 1 for route in router.routes))
+
+
+if __name__ == "__main__":
+    unittest.main()
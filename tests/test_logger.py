@@ -0,0 +1,65 @@
+import unittest
+import glob
+import gzip
+import logging
+import os
+import sys
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from logger import configure_logging, get_logger, log_payload
+
+
+class TestLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "crawler.log")
+
+    def tearDown(self):
+        configure_logging()
+        self.tmp.cleanup()
+
+    def read_log(self):
+        configure_logging(filename="")  # stops the listener, flushing the queue
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_level_and_queue(self):
+        configure_logging(level="WARNING", filename=self.path)
+        logger = get_logger("test_level")
+        logger.info("not written")
+        logger.warning("written")
+        self.assertFalse(logger.isEnabledFor(logging.INFO))
+        log = self.read_log()
+        self.assertIn("WARNING - test_level - test_level_and_queue - written", log)
+        self.assertNotIn("not written", log)
+
+    def test_rotation_with_compression(self):
+        configure_logging(level="INFO", filename=self.path, max_bytes=2000, backups=2, compress=True)
+        logger = get_logger("test_rotation")
+        for i in range(100):
+            logger.info(f"line {i} " + "x" * 50)
+        self.read_log()
+        rotated = sorted(glob.glob(self.path + ".*.gz"))
+        self.assertEqual(len(rotated), 2)
+        with gzip.open(rotated[0], "rt", encoding="utf-8") as f:
+            self.assertIn("line", f.read())
+
+    def test_payloads_are_sampled_and_cut(self):
+        configure_logging(level="DEBUG", filename=self.path, payload_sample=0.5, payload_chars=10)
+        logger = get_logger("test_payload")
+        urls = [f"https://vc.com/portfolio/{i}" for i in range(200)]
+        for url in urls:
+            log_payload(logger, f"content of {url}", "y" * 100, key=url)
+        log_payload(logger, "always", "z" * 100)
+        log = self.read_log()
+        logged = log.count("content of")
+        self.assertGreater(logged, 60)
+        self.assertLess(logged, 140)
+        self.assertIn("yyyyyyyyyy... (90 more characters)", log)
+        self.assertIn("always", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
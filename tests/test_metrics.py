@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+import urllib.request
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import metrics
+from metrics import Histogram, Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(size=500)
+        for value in range(1, 10001):
+            histogram.observe(value)
+        summary = histogram.as_dict()
+        self.assertEqual(summary["count"], 10000)
+        self.assertEqual(summary["max"], 10000)
+        self.assertEqual(len(histogram.sample), 500)
+        self.assertAlmostEqual(summary["p50"], 5000, delta=700)
+        self.assertAlmostEqual(summary["p95"], 9500, delta=300)
+
+    def test_counters_and_timers(self):
+        registry = Registry()
+        registry.count("errors_total", stage="fetch", error="ConnectError")
+        registry.count("errors_total", 2, error="ConnectError", stage="fetch")
+        with self.assertRaises(ValueError):
+            with registry.timer("parse"):
+                raise ValueError
+        summary = registry.summary()
+        self.assertEqual(summary["counters"], [
+            {"name": "errors_total", "labels": {"error": "ConnectError", "stage": "fetch"}, "value": 3}])
+        self.assertEqual(summary["histograms"][0]["labels"], {"stage": "parse"})
+        self.assertEqual(summary["histograms"][0]["count"], 1)
+
+    def test_prometheus_text(self):
+        registry = Registry()
+        registry.count("fetch_bytes_total", 512)
+        registry.gauge("workers", 4, stage='say "hi"')
+        registry.observe("stage_seconds", 0.25, stage="llm")
+        text = registry.prometheus_text()
+        self.assertIn("# TYPE smartcrawler_fetch_bytes_total counter\nsmartcrawler_fetch_bytes_total 512", text)
+        self.assertIn('smartcrawler_workers{stage="say \\"hi\\""} 4', text)
+        self.assertIn('smartcrawler_stage_seconds{stage="llm",quantile="0.95"} 0.25', text)
+        self.assertIn('smartcrawler_stage_seconds_count{stage="llm"} 1', text)
+
+    def test_endpoint(self):
+        metrics.reset()
+        metrics.count("pages_total", 3)
+        server = metrics.serve(0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+                self.assertIn("smartcrawler_pages_total 3", response.read().decode())
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+import unittest
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import crawler
+from crawler import CrawlOptions
+from llms import LLMAPI
+from pipeline import Pipeline, Stage
+from classifier import PageClassifier, PageGate
+from state import StateStore
+from urls import UrlIndex
+
+PAGE = '''<html><body><h1>{name}</h1><p>We build {name}.</p>
+<a href="https://{name}.com">Website</a></body></html>'''
+
+
+class FakeLLM(LLMAPI):
+    """Answers with a dict literal built from the page, after a random delay"""
+
+    def get_company_info(self, text, fields=None):
+        time.sleep(random.uniform(0, 0.01))
+        name = text.split()[1]
+        return str({"url": f"https://{name}.com", "name": name, "description": None,
+                    "country": None, "city": None, "email": None})
+
+
+def fake_get_html(url):
+    time.sleep(random.uniform(0, 0.01))
+    name = url.rstrip('/').split('/')[-1]
+    if name.startswith('missing'):
+        return None
+    return PAGE.format(name=name)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_ordered_output_and_stats(self):
+        seen = []
+        stats = Pipeline([
+            Stage("double", lambda x: x * 2, 4),
+            Stage("odd", lambda x: None if x % 3 == 0 else x, 2),
+            Stage("collect", lambda x: seen.append(x) or x, 1),
+        ], ordered=True).run(range(50))
+
+        expected = [x * 2 for x in range(50) if (x * 2) % 3]
+        self.assertEqual(seen, expected)
+        self.assertEqual(stats[0].processed, 50)
+        self.assertEqual(stats[1].dropped, 50 - len(expected))
+        self.assertEqual(stats[2].processed, len(expected))
+
+    def test_stage_errors_are_counted(self):
+        def boom(x):
+            if x == 3:
+                raise RuntimeError("boom")
+            return x
+        stats = Pipeline([Stage("boom", boom, 2), Stage("sink", lambda x: x)]).run(range(5))
+        self.assertEqual(stats[0].errors, 1)
+        self.assertEqual(stats[1].processed, 4)
+
+
+class TestCrawl(unittest.TestCase):
+
+    def setUp(self):
+        self.urls = [f"https://vc.com/portfolio/{name}" for name in
+                     ("alpha", "beta", "missing1", "gamma", "delta", "missing2", "epsilon")]
+        self.sequential_file = "test_sequential.csv"
+        self.pipeline_file = "test_pipeline.csv"
+
+    def tearDown(self):
+        for filename in (self.sequential_file, self.pipeline_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_matches_sequential_run(self):
+        llm = FakeLLM()
+        with mock.patch.object(crawler, "get_html", fake_get_html):
+            for url in self.urls:
+                crawler.process_company(url, llm, self.sequential_file)
+            crawler.crawl(self.urls, llm, self.pipeline_file, CrawlOptions(fetch_workers=4, llm_workers=3))
+
+        with open(self.sequential_file, encoding="utf-8") as f:
+            sequential = f.read()
+        with open(self.pipeline_file, encoding="utf-8") as f:
+            pipelined = f.read()
+        self.assertEqual(sequential, pipelined)
+        self.assertEqual(len(pipelined.strip().splitlines()), 6)
+
+    def test_parse_in_process_pool(self):
+        llm = FakeLLM()
+        with mock.patch.object(crawler, "get_html", fake_get_html):
+            for url in self.urls:
+                crawler.process_company(url, llm, self.sequential_file)
+            stats = crawler.crawl(self.urls, llm, self.pipeline_file, CrawlOptions(parse_processes=2, parse_min_size=0))
+
+        with open(self.sequential_file, encoding="utf-8") as f, open(self.pipeline_file, encoding="utf-8") as g:
+            self.assertEqual(f.read(), g.read())
+        self.assertEqual(stats[1].workers, 2)
+
+    def test_url_index_drops_duplicates_and_redirects(self):
+        index = UrlIndex(":memory:")
+
+        def redirecting_get_html(url):
+            if url.endswith("/old-alpha"):
+                index.add_redirect(url, "https://vc.com/portfolio/alpha")
+            return fake_get_html(url)
+
+        urls = self.urls + ["http://www.vc.com/portfolio/beta/", "https://vc.com/portfolio/old-alpha"]
+        state = StateStore(":memory:")
+        with mock.patch.object(crawler, "get_html", redirecting_get_html):
+            stats = crawler.crawl(index.unique(urls), FakeLLM(), self.pipeline_file, url_index=index, state=state)
+        self.assertEqual(stats[-1].processed, 5)
+        self.assertEqual(index.report()["fetches_avoided"], 1)
+        self.assertEqual(index.report()["llm_calls_avoided"], 2)
+        old = state.get("https://vc.com/portfolio/old-alpha")
+        self.assertEqual((old["status"], old["error"]), ("skipped", "redirect_duplicate"))
+        self.assertTrue(state.should_skip("https://vc.com/portfolio/old-alpha"))
+        state.close()
+
+    def test_known_redirects_are_not_their_own_duplicates(self):
+        def redirecting_get_html(url):
+            if url.endswith("/old-alpha"):
+                index.add_redirect(url, "https://vc.com/portfolio/alpha-renamed")
+            return fake_get_html(url)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for run in range(2):
+                index = UrlIndex(os.path.join(tmp, "urls.db"))
+                state = StateStore(os.path.join(tmp, "state.db"))
+                with mock.patch.object(crawler, "get_html", redirecting_get_html):
+                    crawler.crawl(index.unique(self.urls + ["https://vc.com/portfolio/old-alpha"]), FakeLLM(),
+                                  self.pipeline_file, url_index=index, state=state)
+                self.assertEqual(index.report()["redirect_duplicates"], 0)
+                self.assertEqual(state.get("https://vc.com/portfolio/old-alpha")["status"], "done")
+                state.close()
+                index.close()
+
+    def test_page_gate_skips_llm_calls(self):
+        gate = PageGate(PageClassifier({"gamma": -10.0}, bias=5.0), audit_rate=0.0)
+        with mock.patch.object(crawler, "get_html", fake_get_html):
+            stats = crawler.crawl(self.urls + ["https://vc.com/portfolio/about"], FakeLLM(), self.pipeline_file,
+                                  gate=gate)
+        self.assertEqual([stage.name for stage in stats], ["fetch", "extract", "classify", "llm", "validate", "save"])
+        self.assertEqual(stats[-1].processed, 4)
+        self.assertEqual(gate.report(companies=4)["llm_calls_avoided"], 2)
+
+    def test_run_report(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(crawler, "get_html", fake_get_html):
+            path = os.path.join(tmp, "metrics.json")
+            crawler.crawl(self.urls, FakeLLM(), self.pipeline_file, CrawlOptions(metrics_path=path))
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        self.assertEqual([stage["stage"] for stage in report["stages"]], ["fetch", "extract", "llm", "validate", "save"])
+        self.assertIn(report["bottleneck"], {"fetch", "extract", "llm", "validate", "save"})
+        timings = {h["labels"]["stage"]: h for h in report["histograms"] if h["name"] == "stage_seconds"}
+        self.assertEqual(set(timings), {"fetch", "extract", "rules", "llm", "parse", "validate", "save"})
+        self.assertEqual(timings["fetch"]["count"], 7)
+        self.assertEqual(timings["parse"]["count"], 5)
+        self.assertTrue(all(timings["llm"][q] > 0 for q in ("p50", "p95", "p99")))
+        depths = {h["labels"]["stage"] for h in report["histograms"] if h["name"] == "queue_depth"}
+        self.assertEqual(depths, {"fetch", "extract", "llm", "validate", "save"})
+
+    def test_batched_llm_stage(self):
+        with mock.patch.object(crawler, "get_html", fake_get_html):
+            stats = crawler.crawl(self.urls, FakeLLM(), self.pipeline_file, CrawlOptions(llm_batch_size=3))
+        self.assertEqual(stats[-1].processed, 5)
+        with open(self.pipeline_file, encoding="utf-8") as f:
+            self.assertIn("epsilon", f.read())
+
+    def test_resume_skips_finished_urls(self):
+        llm = FakeLLM()
+        with tempfile.TemporaryDirectory() as tmp:
+            state = StateStore(os.path.join(tmp, "state.db"))
+            with mock.patch.object(crawler, "get_html", fake_get_html):
+                crawler.crawl(self.urls, llm, self.pipeline_file, state=state)
+            self.assertEqual(state.get(self.urls[0])["status"], "done")
+            self.assertEqual(state.get(self.urls[2])["error"], "fetch_failed")
+            self.assertIn("fetch", state.get(self.urls[0])["timings"])
+
+            fetched = []
+            def recording_get_html(url):
+                fetched.append(url)
+                return fake_get_html(url.replace("missing", "found"))
+            with mock.patch.object(crawler, "get_html", recording_get_html):
+                crawler.crawl(self.urls, llm, self.pipeline_file, CrawlOptions(resume=True), state=state)
+            self.assertEqual(fetched, [self.urls[2], self.urls[5]])
+            self.assertEqual(state.summary(), {"done": 7})
+            state.close()
+
+    def test_incremental_run_reextracts_changed_pages_only(self):
+        calls = []
+
+        class CountingLLM(FakeLLM):
+            def get_company_info(self, text, fields=None):
+                calls.append(text)
+                return super().get_company_info(text, fields)
+
+        def updated_get_html(url):
+            html = fake_get_html(url)
+            if html and url.endswith("gamma"):
+                html = html.replace("We build gamma.", "Gamma was acquired by a large bank in a deal worth millions.")
+            return html
+
+        with tempfile.TemporaryDirectory() as tmp:
+            state = StateStore(os.path.join(tmp, "state.db"))
+            with mock.patch.object(crawler, "get_html", fake_get_html):
+                crawler.crawl(self.urls, CountingLLM(), self.pipeline_file, state=state)
+            self.assertEqual(len(calls), 5)
+
+            calls.clear()
+            with mock.patch.object(crawler, "get_html", updated_get_html):
+                stats = crawler.crawl(self.urls, CountingLLM(), self.pipeline_file,
+                                      CrawlOptions(incremental=True, llm_batch_size=2), state=state)
+            state.close()
+        self.assertEqual(len(calls), 1)
+        self.assertIn("acquired", calls[0])
+        self.assertEqual([stage.name for stage in stats], ["fetch", "extract", "fingerprint", "llm", "validate", "save"])
+        self.assertEqual(stats[-1].processed, 5)
+        with open(self.pipeline_file, encoding="utf-8") as f:
+            rows = f.read().strip().splitlines()
+        self.assertEqual(len(rows), 6)
+        self.assertTrue(any("epsilon" in row for row in rows))
+        results = {c["labels"]["result"]: c["value"] for c in crawler.metrics.summary()["counters"]
+                   if c["name"] == "incremental_pages_total"}
+        self.assertEqual(results, {"unchanged": 4, "changed": 1})
+
+    def test_incremental_needs_state(self):
+        with self.assertRaises(ValueError):
+            crawler.crawl(self.urls, FakeLLM(), self.pipeline_file, CrawlOptions(incremental=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
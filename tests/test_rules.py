@@ -0,0 +1,138 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import crawler
+from llms import LLMAPI
+from rules import extract_fields, fill_missing, resolved
+
+SOURCE = "https://www.examplevc.com/portfolio/acme-robotics/"
+
+JSON_LD_PAGE = '''<html><head><title>Acme Robotics | Example VC</title>
+<script type="application/ld+json">{"@context": "https://schema.org", "@graph": [
+  {"@type": "Organization", "name": "Example VC", "url": "https://www.examplevc.com/"},
+  {"@type": ["Organization"], "name": "Acme Robotics", "url": "https://acme.ai",
+   "description": "Acme Robotics builds warehouse robots &amp; picking software.",
+   "email": "mailto:hello@acme.ai", "address": {"addressCountry": "US", "addressLocality": "Boston"}}]}
+</script></head><body><p>Acme</p></body></html>'''
+
+OPENGRAPH_PAGE = '''<html><head>
+<meta property="og:site_name" content="Example VC">
+<meta property="og:title" content="Example VC - Acme Robotics">
+<meta name="description" content="Acme Robotics automates picking in warehouses.">
+</head><body></body></html>'''
+
+CONTENT = """Texts:
+Acme Robotics automates picking.
+
+Hyperlinks:
+Portfolio: https://www.examplevc.com/portfolio/
+LinkedIn: https://www.linkedin.com/company/acme-robotics
+Website: https://www.acmerobotics.com/about
+Contact: mailto:info@acmerobotics.com,team@examplevc.com"""
+
+
+class TestRules(unittest.TestCase):
+
+    def test_json_ld_organization_of_the_company(self):
+        fields, _ = extract_fields(JSON_LD_PAGE, "Texts:\nAcme\n\nHyperlinks:\n", SOURCE)
+        self.assertEqual(fields["name"], "Acme Robotics")
+        self.assertEqual(fields["url"], "https://acme.ai")
+        self.assertEqual(fields["description"], "Acme Robotics builds warehouse robots & picking software.")
+        self.assertEqual((fields["country"], fields["city"], fields["email"]), ("US", "Boston", "hello@acme.ai"))
+        self.assertTrue(resolved(fields))
+
+    def test_opengraph_and_links(self):
+        fields, guessed = extract_fields(OPENGRAPH_PAGE, CONTENT, SOURCE)
+        self.assertEqual(fields["name"], "Acme Robotics")
+        self.assertEqual(fields["description"], "Acme Robotics automates picking in warehouses.")
+        self.assertEqual((fields["url"], fields["email"], fields["country"]), (None, None, None))
+        self.assertEqual(guessed["url"], "https://www.acmerobotics.com")
+        self.assertEqual(guessed["email"], "info@acmerobotics.com")
+        self.assertFalse(resolved(fields))
+
+    def test_nothing_unreliable_is_taken(self):
+        page = '''<html><head><title>Portfolio | Example VC</title>
+        <meta name="description" content="We back bold founders."></head></html>'''
+        content = CONTENT.replace("Website: https://www.acmerobotics.com/about", "A: https://one.com\nB: https://two.com")
+        fields, guessed = extract_fields(page, content, SOURCE)
+        self.assertEqual((fields["name"], fields["description"], guessed["url"]), (None, None, None))
+        self.assertFalse(resolved(fields))
+
+    def test_rules_win_over_the_llm(self):
+        merged = fill_missing({"name": "Acme Robotics", "url": None}, {"name": "acme", "url": "https://acme.ai",
+                                                                       "city": "Boston"})
+        self.assertEqual((merged["name"], merged["url"], merged["city"]), ("Acme Robotics", "https://acme.ai", "Boston"))
+        self.assertIsNone(merged["email"])
+
+    def test_guesses_only_fill_what_the_llm_left_empty(self):
+        merged = fill_missing({}, {"url": "https://acme.ai", "email": None},
+                              {"url": "https://partner.com", "email": "info@acme.ai"})
+        self.assertEqual((merged["url"], merged["email"]), ("https://acme.ai", "info@acme.ai"))
+
+
+class CountingLLM(LLMAPI):
+
+    def __init__(self):
+        self.calls = 0
+        self.fields = []
+
+    def get_company_info(self, text, fields=None):
+        self.calls += 1
+        self.fields.append(fields)
+        return '{"url": "https://llm.example", "name": "LLM name", "description": null, ' \
+               '"country": "Germany", "city": null, "email": null}'
+
+
+class TestCrawlWithRules(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False).name
+
+    def tearDown(self):
+        os.remove(self.output)
+
+    def crawl(self, html, **options):
+        llm = CountingLLM()
+        with mock.patch.object(crawler, "get_html", lambda url: html):
+            stats = crawler.crawl([SOURCE], llm, self.output, crawler.CrawlOptions(**options))
+        self.asked = llm.fields
+        with open(self.output, encoding="utf-8") as f:
+            return llm.calls, f.read(), stats
+
+    def test_resolved_page_skips_the_llm(self):
+        calls, output, stats = self.crawl(JSON_LD_PAGE, llm_batch_size=2)
+        self.assertEqual(calls, 0)
+        self.assertEqual(stats[-1].processed, 1)
+        self.assertIn("https://acme.ai", output)
+
+    def test_llm_fills_missing_fields(self):
+        calls, output, _ = self.crawl(OPENGRAPH_PAGE)
+        self.assertEqual(calls, 1)
+        self.assertIn('"name": "Acme Robotics"', output)
+        self.assertIn('"country": "Germany"', output)
+
+    def test_partly_structured_page_still_asks_the_llm(self):
+        page = JSON_LD_PAGE.replace('"addressCountry": "US", ', "").replace(
+            "</body>", '<a href="https://partner.com">Partner</a></body>')
+        for batch_size in (1, 2):
+            calls, output, _ = self.crawl(page, llm_batch_size=batch_size)
+            self.assertEqual(calls, 1)
+            self.assertEqual(self.asked, [["country"]])
+            self.assertIn('"country": "Germany"', output)
+            self.assertIn('"url": "https://acme.ai/"', output)
+            self.assertNotIn("partner.com", output)
+            open(self.output, "w").close()
+
+    def test_without_rules(self):
+        calls, output, _ = self.crawl(JSON_LD_PAGE, rules=False)
+        self.assertEqual(calls, 1)
+        self.assertEqual(self.asked, [None])
+        self.assertIn("LLM name", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
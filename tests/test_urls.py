@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from urls import UrlIndex, canonical_url, dedup_urls
+
+
+class TestCanonicalUrl(unittest.TestCase):
+
+    def test_variants_share_a_canonical_url(self):
+        groups = [
+            ["http://www.craftventures.com/portfolio/replit", "https://craftventures.com/portfolio/replit/"],
+            ["http://streamlined.vc/companies/ipo", "http://www.streamlined.vc/companies/ipo#top"],
+            ["https://OSS.Capital/portfolio/spacedrive", "oss.capital/portfolio/spacedrive"],
+            ["https://vc.com/a?utm_source=x&b=2&a=1&fbclid=y", "https://vc.com:443/a/?a=1&b=2"],
+        ]
+        for group in groups:
+            with self.subTest(group=group):
+                self.assertEqual(len({canonical_url(url) for url in group}), 1)
+
+    def test_distinct_pages_stay_distinct(self):
+        self.assertNotEqual(canonical_url("https://vc.com/Portfolio/a"), canonical_url("https://vc.com/portfolio/a"))
+        self.assertNotEqual(canonical_url("https://vc.com/a?page=2"), canonical_url("https://vc.com/a"))
+        self.assertNotEqual(canonical_url("https://vc.com:8080/a"), canonical_url("https://vc.com/a"))
+
+    def test_dedup_urls_keeps_first(self):
+        self.assertEqual(dedup_urls(["https://www.vc.com/a/", "http://vc.com/a", "https://vc.com/b"]),
+                         ["https://www.vc.com/a/", "https://vc.com/b"])
+
+
+class TestUrlIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "urls.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unique_and_report(self):
+        index = UrlIndex(self.path)
+        urls = list(index.unique(["https://www.vc.com/a/", "http://vc.com/a", "vc.com/b", " ", "https://vc.com/b/"]))
+        self.assertEqual(urls, ["https://www.vc.com/a/", "http://vc.com/b"])
+        report = index.report()
+        self.assertEqual(report["duplicates"], 2)
+        self.assertEqual(report["fetches_avoided"], 2)
+        self.assertEqual(report["llm_calls_avoided"], 2)
+        index.close()
+
+    def test_unique_with_either_seen_set(self):
+        urls = ["https://A.com/x", "https://a.com/x#top", "a.com/y", "http://a.com/y", "https://a.com:443/x", " "]
+        for dedup in ("set", "bloom"):
+            index = UrlIndex(":memory:", dedup)
+            self.assertEqual(list(index.unique(urls)), ["https://A.com/x", "http://a.com/y"])
+            index.close()
+
+    def test_later_runs_reuse_first_spelling_and_redirects(self):
+        index = UrlIndex(self.path)
+        list(index.unique(["https://www.vc.com/a/", "https://vc.com/old"]))
+        index.add_redirect("https://vc.com/old", "https://vc.com/a")
+        self.assertTrue(index.is_duplicate("https://vc.com/old"))
+        self.assertEqual(index.report()["llm_calls_avoided"], 1)
+        index.close()
+
+        index = UrlIndex(self.path)
+        self.assertEqual(list(index.unique(["http://vc.com/a", "https://www.vc.com/old"])), ["https://www.vc.com/a/"])
+        self.assertEqual(index.report()["rewritten"], 1)
+        self.assertEqual(index.report()["duplicates"], 1)
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import crawler
+from classifier import PageGate
+from workqueue import QueueWorker, SQLiteQueue, export
+from test_pipeline import FakeLLM, fake_get_html
+
+
+class TestSQLiteQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.db")
+        self.queue = SQLiteQueue(self.path)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_leases_are_exclusive_and_acked_once(self):
+        self.assertEqual(self.queue.put(["https://a.com/1", "https://a.com/2", "https://a.com/1"]), 2)
+        other = SQLiteQueue(self.path)
+        first = self.queue.lease("w1", 1)
+        second = other.lease("w2", 5)
+        self.assertEqual([lease.url for lease in first + second], ["https://a.com/1", "https://a.com/2"])
+        self.assertEqual(other.lease("w2", 5), [])
+        self.assertTrue(self.queue.ack(first[0], "{}"))
+        self.assertFalse(self.queue.ack(first[0], "{}"))
+        self.assertFalse(self.queue.idle())
+        self.assertTrue(other.ack(second[0], "{}"))
+        self.assertTrue(self.queue.idle())
+        self.assertEqual(self.queue.counts(), {"done": 2})
+        other.close()
+
+    def test_expired_lease_goes_to_another_worker(self):
+        self.queue.put(["https://a.com/1"])
+        [stale] = self.queue.lease("w1", 1, visibility=0.05)
+        time.sleep(0.1)
+        [lease] = self.queue.lease("w2", 1)
+        self.assertEqual(lease.attempt, 2)
+        self.assertFalse(self.queue.ack(stale, "stale"))
+        self.assertTrue(self.queue.ack(lease, "fresh"))
+        self.assertEqual(list(self.queue.results()), ["fresh"])
+
+    def test_extended_lease_stays_hidden(self):
+        self.queue.put(["https://a.com/1"])
+        leases = self.queue.lease("w1", 1, visibility=0.1)
+        time.sleep(0.06)
+        self.assertEqual(self.queue.extend(leases, visibility=0.1), 1)
+        time.sleep(0.06)
+        self.assertEqual(self.queue.lease("w2", 1), [])
+
+    def test_failures_are_retried_up_to_max_attempts(self):
+        self.queue.put(["https://a.com/1", "https://a.com/2"])
+        for attempt in range(3):
+            [lease] = self.queue.lease("w1", 1)
+            self.assertEqual((lease.url, lease.attempt), ("https://a.com/1", attempt + 1))
+            self.assertTrue(self.queue.fail(lease, "fetch_failed"))
+        [lease] = self.queue.lease("w1", 1)
+        self.queue.fail(lease, "validate_failed")
+        self.assertEqual(self.queue.counts(), {"failed:fetch_failed": 1, "failed:validate_failed": 1})
+
+    def test_release_keeps_the_attempt(self):
+        self.queue.put(["https://a.com/1"])
+        self.queue.release(self.queue.lease("w1", 1))
+        self.assertEqual(self.queue.lease("w2", 1)[0].attempt, 1)
+
+    def test_host_rate_is_shared(self):
+        other = SQLiteQueue(self.path)
+        delays = [queue.reserve_host("vc.com", rate=2.0, burst=1.0) for queue in (self.queue, other, self.queue)]
+        self.assertEqual(delays[0], 0.0)
+        self.assertAlmostEqual(delays[1], 0.5, delta=0.05)
+        self.assertAlmostEqual(delays[2], 1.0, delta=0.05)
+        self.assertEqual(other.reserve_host("other.vc", rate=2.0, burst=1.0), 0.0)
+        other.close()
+
+
+class TestQueueWorkers(unittest.TestCase):
+
+    def test_gate_skips_finish_leased_urls(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteQueue(os.path.join(tmp, "queue.db"))
+            queue.put(["https://vc.com/portfolio/alpha", "https://vc.com/team", "https://vc.com/portfolio/"])
+            worker = QueueWorker(queue, batch=1, poll=0.05)
+            thread = threading.Thread(target=crawler.crawl, args=(worker.urls(), FakeLLM()),
+                                      kwargs=dict(sink=worker, on_dropped=worker.dropped, gate=PageGate()))
+            with mock.patch.object(crawler, "get_html", fake_get_html):
+                thread.start()
+                thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(queue.counts(), {"done": 1, "skipped:not_company_url": 2})
+            self.assertEqual(worker.report()["skipped"], 2)
+            queue.close()
+
+    def test_workers_share_one_backlog(self):
+        urls = [f"https://vc.com/portfolio/{name}" for name in
+                ("alpha", "beta", "missing1", "gamma", "delta", "epsilon", "zeta", "eta")]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "queue.db")
+            SQLiteQueue(path).put(urls)
+            workers = [QueueWorker(SQLiteQueue(path), worker_id=f"w{n}", batch=2, poll=0.05) for n in range(2)]
+            options = crawler.CrawlOptions(fetch_workers=1, llm_workers=2)
+            threads = [threading.Thread(target=crawler.crawl, args=(worker.urls(), FakeLLM(), "output.csv", options),
+                                        kwargs=dict(sink=worker, on_dropped=worker.dropped))
+                       for worker in workers]
+
+            def shared_get_html(url):
+                # no page is served before both workers hold leases, so one can't drain the queue alone
+                deadline = time.monotonic() + 5
+                while not all(worker.report()["leased"] for worker in workers) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                return fake_get_html(url)
+
+            with mock.patch.object(crawler, "get_html", shared_get_html):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            queue = SQLiteQueue(path)
+            self.assertEqual(queue.counts(), {"done": 7, "failed:fetch_failed": 1})
+            self.assertEqual(sum(worker.report()["acked"] for worker in workers), 7)
+            self.assertTrue(all(worker.report()["leased"] for worker in workers))
+            output = os.path.join(tmp, "companies.csv")
+            self.assertEqual(export(queue, output), 7)
+            with open(output, encoding="utf-8") as f:
+                rows = f.read().strip().splitlines()
+            self.assertEqual(len(rows), 8)
+            self.assertIn("alpha", rows[1])
+            queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
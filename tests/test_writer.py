@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from company import Company
+from crawler import save_to_csv
+from writer import RecordWriter
+
+
+def company(i, source="https://vc.com/portfolio"):
+    return Company(url=f"https://company{i}.com", name=f"Company {i}", source=f"{source}/{i}")
+
+
+class TestRecordWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_csv_matches_save_to_csv(self):
+        with RecordWriter(self.path("out.csv")) as writer:
+            for i in range(3):
+                writer.put(company(i))
+        for i in range(3):
+            save_to_csv(company(i), self.path("legacy.csv"))
+        with open(self.path("out.csv"), encoding="utf-8") as a, open(self.path("legacy.csv"), encoding="utf-8") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_concurrent_puts_and_dedup_across_runs(self):
+        filename = self.path("out.jsonl")
+        with RecordWriter(filename, batch_size=7) as writer:
+            threads = [threading.Thread(target=lambda n=n: [writer.put(company(i)) for i in range(n, 200, 4)])
+                       for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            writer.put(company(0))
+        self.assertEqual(writer.written, 200)
+        self.assertEqual(writer.duplicates, 1)
+
+        with RecordWriter(filename) as writer:
+            writer.put(company(5))
+            writer.put(company(5, source="https://other.vc/portfolio"))
+        self.assertEqual(writer.written, 1)
+
+        with open(filename, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 201)
+        self.assertEqual(rows[0]["url"], "https://company0.com/")
+
+    def test_rows_of_a_sink_that_is_not_durable_are_confirmed_on_close(self):
+        written = []
+        with mock.patch("writer._JSONLSink.durable", False):
+            with RecordWriter(self.path("out.jsonl"), batch_size=1, on_written=written.extend) as writer:
+                writer.put(company(0))
+                writer.put(company(1))
+                time.sleep(0.1)
+                self.assertEqual(written, [])
+        self.assertEqual(written, ["https://vc.com/portfolio/0", "https://vc.com/portfolio/1"])
+
+    def test_rows_are_confirmed_once_fsynced(self):
+        events = []
+        with mock.patch("writer.os.fsync", lambda fd: events.append("fsync")):
+            with RecordWriter(self.path("out.csv"), batch_size=1, flush_interval=0.01, fsync_interval=0.05,
+                              on_written=lambda sources: events.append(sources)) as writer:
+                writer.put(company(0))
+                deadline = time.monotonic() + 5
+                while ["https://vc.com/portfolio/0"] not in events and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                confirmed = events.index(["https://vc.com/portfolio/0"])  # before close, by a periodic fsync
+                self.assertEqual(events[confirmed - 1], "fsync")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            RecordWriter(self.path("out.xml"), format="xml")
+
+
+if __name__ == "__main__":
+    unittest.main()